@@ -0,0 +1,96 @@
+import itertools
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from backtesting import gerar_cortes
+from processos import contexto_pool_interno
+
+
+# Espaço de busca padrão dos priors do Prophet (mesmas faixas dos controles do formulário)
+ESPACO_PADRAO = {
+    'changepoint_prior_scale': [0.01, 0.05, 0.1, 0.3, 0.65, 1.0],
+    'seasonality_prior_scale': [1.0, 5.0, 10.0, 25.0, 50.0],
+    'seasonality_mode': ['additive', 'multiplicative']
+}
+
+
+def gerar_candidatos(espaco=None, n_candidatos=None, semente=0):
+    """Combinações da grade; com ``n_candidatos`` menor que a grade, sorteia uma amostra aleatória."""
+    espaco = espaco or ESPACO_PADRAO
+    nomes = list(espaco)
+    grade = [dict(zip(nomes, valores)) for valores in itertools.product(*(espaco[n] for n in nomes))]
+    if n_candidatos and n_candidatos < len(grade):
+        grade = random.Random(semente).sample(grade, int(n_candidatos))
+    return grade
+
+
+def _avaliar_candidato(indice, datas, valores, cortes, horizonte, parametros, cache_modelos):
+    """Erros do candidato nas dobras indicadas (roda no pool). Retorna ``(indice, metricas)``."""
+    from prophet import Prophet
+    erros = []
+    for corte in cortes:
+        df_treino = pd.DataFrame({'ds': datas[:corte], 'y': valores[:corte]})
+        if cache_modelos is None: modelo = Prophet(**parametros).fit(df_treino)
+        else: modelo = cache_modelos.ajustar(df_treino, parametros)
+        modelo.uncertainty_samples = 0
+        forecast = modelo.predict(pd.DataFrame({'ds': datas[corte:corte + horizonte]}))
+        erros.append(forecast['yhat'].to_numpy(dtype='float64') - valores[corte:corte + horizonte])
+    erros = np.concatenate(erros)
+    return indice, {'MAE': float(np.mean(np.abs(erros))), 'RMSE': float(np.sqrt(np.mean(erros ** 2)))}
+
+
+def busca_successive_halving(serie, candidatos, horizonte=3, min_treino=12, eta=3, dobras_iniciais=1,
+                             metrica='RMSE', max_workers=None, cache_modelos=None):
+    """Busca com *successive halving* sobre os candidatos, usando backtesting como orçamento.
+
+    Na primeira rodada todos os candidatos são avaliados nas ``dobras_iniciais`` dobras mais
+    recentes; a cada rodada só o melhor ``1/eta`` segue adiante e o número de dobras é
+    multiplicado por ``eta``, até restar um candidato ou esgotar as dobras. Os ajustes das
+    rodadas anteriores são reaproveitados pelo cache de modelos.
+
+    Retorna ``{'melhor', 'metricas', 'rodadas', 'ranking'}`` ou ``None`` se a série for
+    curta demais para o backtesting.
+    """
+    serie = serie.dropna()
+    datas = serie.index.to_numpy()
+    valores = serie.to_numpy(dtype='float64')
+    todos_cortes = gerar_cortes(len(valores), horizonte, min_treino)
+    if not todos_cortes or not candidatos:
+        return None
+
+    vivos = list(range(len(candidatos)))
+    metricas = {}
+    rodadas = []
+    n_dobras = max(1, int(dobras_iniciais))
+    print(f"\n--- Ajuste de hiperparâmetros: {len(candidatos)} candidatos, até {len(todos_cortes)} dobras ---")
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(), mp_context=contexto_pool_interno()) as executor:
+        while True:
+            n_dobras = min(n_dobras, len(todos_cortes))
+            cortes = todos_cortes[-n_dobras:]
+            futures = [executor.submit(_avaliar_candidato, i, datas, valores, cortes, horizonte, candidatos[i], cache_modelos)
+                       for i in vivos]
+            for future in futures:
+                try:
+                    indice, resultado = future.result()
+                except Exception as e:
+                    print(f"ERRO ao avaliar candidato: {e}")
+                    continue
+                metricas[indice] = dict(resultado, dobras=n_dobras)
+            # Candidatos que falharam ficam no fim da fila
+            vivos.sort(key=lambda i: metricas[i][metrica] if metricas.get(i, {}).get('dobras') == n_dobras else math.inf)
+            rodadas.append({'dobras': n_dobras, 'candidatos': len(vivos)})
+            if len(vivos) == 1 or n_dobras == len(todos_cortes):
+                break
+            vivos = vivos[:max(1, math.ceil(len(vivos) / eta))]
+            n_dobras *= eta
+
+    melhor = vivos[0]
+    if metricas.get(melhor, {}).get('dobras') != n_dobras:
+        return None
+    ranking = [dict(candidatos[i], **metricas[i]) for i in vivos[:5] if metricas.get(i, {}).get('dobras') == n_dobras]
+    return {'melhor': candidatos[melhor], 'metricas': metricas[melhor], 'rodadas': rodadas, 'ranking': ranking}
@@ -1,18 +1,25 @@
 import os
 import io
+import gzip
+import json
+import hashlib
 import uuid
-import pandas as pd
+import time
+import click
+from collections import Counter
 from flask import Flask, render_template, request, url_for, jsonify, send_from_directory, send_file, session, redirect, flash
 from werkzeug.utils import secure_filename
 from flask_babel import Babel, _
-from faturamento_forecast_class import FaturamentoForecast
-from deep_translator import GoogleTranslator
+from armazenamento import ArmazenamentoUploads
+from traducao import MemoriaTraducao
 import bleach
 from functools import wraps
 from datetime import datetime, timedelta
 from database import Database
-import requests
-from bs4 import BeautifulSoup
+from jobs import FilaJobs, FilaCheiaError, gravar_ao_concluir, relatar_progresso
+from imagens import ResolvedorImagens
+import instrumentacao
+from instrumentacao import etapa
 
 app = Flask(__name__)
 
@@ -37,17 +44,124 @@ babel.init_app(app, locale_selector=get_locale)
 UPLOAD_FOLDER = 'uploads'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Por quanto tempo (segundos) um upload sem referência é preservado: cobre o intervalo entre
+# o envio e a criação do job que vai usá-lo
+app.config['UPLOAD_RESERVA_SEGUNDOS'] = 3600
+
+# Cache colunar das planilhas já decodificadas (evita reler o XLSX a cada requisição)
+app.config['CACHE_FOLDER'] = 'cache'
+app.config['CACHE_DADOS_MAX_BYTES'] = 512 * 1024 * 1024
+app.config['CACHE_DADOS_MAX_IDADE'] = 7 * 24 * 3600  # 7 dias em segundos
+
+# Fila de processamento em segundo plano (treino do Prophet fora da thread da requisição)
+app.config['JOBS_MAX_WORKERS'] = 2
+# Processos web, cada um com a sua fila de JOBS_MAX_WORKERS processos. Sob o gunicorn, exporte
+# WEB_CONCURRENCY (o gunicorn também o usa como número de workers) para os núcleos serem divididos
+app.config['WEB_WORKERS'] = int(os.environ.get('WEB_CONCURRENCY', 1))
+app.config['JOBS_MAX_PENDENTES'] = 20
+# Executado ao iniciar cada processo da fila (importa Prophet/Plotly antes do primeiro job)
+app.config['JOBS_PRECARREGAR'] = ('faturamento_forecast_class:precarregar',)
+# Intervalo (segundos) com que as páginas consultam o progresso dos jobs em /api/jobs/<id>.
+# Consultas curtas, em vez de uma conexão aberta por página, não prendem os workers do servidor
+app.config['PROGRESSO_INTERVALO'] = 0.5
+# Meta de tempo de importação do app, em segundos (ver `flask tempo-importacao`)
+app.config['TEMPO_IMPORTACAO_META'] = 1.0
+# Processos usados para os ajustes por produto da previsão em lote (None = ver processos_por_job)
+app.config['LOTE_MAX_WORKERS'] = None
+
+# Cache de modelos Prophet ajustados (pula o ajuste do Stan para a mesma série e parâmetros)
+app.config['CACHE_MODELOS_MAX_BYTES'] = 256 * 1024 * 1024
+# Amostras usadas nos intervalos de confiança do Prophet quando o formulário não informa (0 = sem intervalo)
+app.config['PROPHET_UNCERTAINTY_SAMPLES'] = 1000
+
+# Backtesting com origem móvel: passos avaliados, tamanho mínimo do treino e processos usados nas dobras
+# (None = ver processos_por_job)
+app.config['BACKTEST_HORIZONTE'] = 3
+app.config['BACKTEST_MIN_TREINO'] = 12
+app.config['BACKTEST_MAX_WORKERS'] = None
+# Processos usados na busca de hiperparâmetros do modo de ajuste (None = ver processos_por_job)
+app.config['AJUSTE_MAX_WORKERS'] = None
+# Limite de candidatos sorteados da grade (None = grade completa)
+app.config['AJUSTE_MAX_CANDIDATOS'] = None
+
+# Backend da tradução automática (None = Google Tradutor; ver traducao.TradutorLocal para uso sem rede)
+app.config['TRADUCAO_BACKEND'] = None
+
+# Tamanho máximo de uma página de /api/historico/<tipo>
+app.config['HISTORICO_LIMITE_MAXIMO'] = 100
+
+# Respostas JSON/HTML a partir deste tamanho saem comprimidas (brotli, se instalado, ou gzip)
+app.config['COMPRESSAO_MIN_BYTES'] = 1024
+app.config['COMPRESSAO_NIVEL_GZIP'] = 6
+app.config['COMPRESSAO_NIVEL_BROTLI'] = 5
+# Validade no navegador do template do Plotly usado pelos gráficos (segundos)
+app.config['FIGURAS_TEMPLATE_MAX_AGE'] = 7 * 24 * 3600
+
+# Busca das imagens de produto: página de busca, timeouts (conexão, leitura) e validade do cache
+app.config['IMAGENS_URL_BUSCA'] = 'https://www.google.com/search'
+app.config['IMAGENS_TIMEOUT'] = (2, 4)
+app.config['IMAGENS_TTL'] = 7 * 24 * 3600
+app.config['IMAGENS_TTL_NEGATIVO'] = 24 * 3600
+# Perfil por amostragem das requisições mais lentas que o limiar (segundos); None desliga.
+# Os perfis (formato "collapsed" do flamegraph) vão para PERFIL_PASTA
+app.config['PERFIL_LIMIAR_SEGUNDOS'] = None
+app.config['PERFIL_INTERVALO'] = 0.005
+app.config['PERFIL_PASTA'] = os.path.join('cache', 'perfis')
+
+def obter_armazenamento():
+    return ArmazenamentoUploads(app.config['UPLOAD_FOLDER'], reserva_segundos=app.config['UPLOAD_RESERVA_SEGUNDOS'])
+
+def liberar_arquivos(derivados, orfaos):
+    # Apaga os arquivos gerados pela linha removida e os uploads sem nenhuma referência; um
+    # upload ainda reservado (o job dele pode não ter sido criado) fica para coletar_uploads_orfaos
+    armazenamento = obter_armazenamento()
+    for nome in derivados + [orfao for orfao in orfaos if not armazenamento.reservado(orfao)]:
+        armazenamento.remover(nome)
+
+def coletar_uploads_orfaos(job_id=None):
+    """Apaga os uploads sem referência no histórico, sem job ativo e com a reserva vencida.
+
+    Roda ao fim de cada job (a análise que falhou ou foi cancelada não deixa o upload para
+    trás) e na subida da fila.
+    """
+    armazenamento = obter_armazenamento()
+    em_uso = db.arquivos_em_uso()
+    for arquivo_id in armazenamento.listar():
+        if arquivo_id not in em_uso and not armazenamento.reservado(arquivo_id):
+            armazenamento.remover(arquivo_id)
+
+# pandas, Prophet, Plotly etc. (via faturamento_forecast_class e caches) são importados
+# dentro das funções que os usam, para que o processo web suba rápido; ver `flask tempo-importacao`
+def obter_cache_dados():
+    from cache_dados import CacheDados
+    return CacheDados(os.path.join(app.config['CACHE_FOLDER'], 'dados'),
+                      max_bytes=app.config['CACHE_DADOS_MAX_BYTES'],
+                      max_idade=app.config['CACHE_DADOS_MAX_IDADE'])
+
+def obter_cache_modelos():
+    from cache_modelos import CacheModelos
+    return CacheModelos(os.path.join(app.config['CACHE_FOLDER'], 'modelos'),
+                        max_bytes=app.config['CACHE_MODELOS_MAX_BYTES'])
+
+# Memória de traduções criada sob demanda (fica no diretório de cache)
+_memoria_traducao = None
+
+def obter_memoria_traducao():
+    global _memoria_traducao
+    if _memoria_traducao is None:
+        _memoria_traducao = MemoriaTraducao(os.path.join(app.config['CACHE_FOLDER'], 'traducoes.db'),
+                                            backend=app.config['TRADUCAO_BACKEND'])
+    return _memoria_traducao
 
 def auto_translate(text, target_lang):
     if not text or target_lang == 'pt':
         return text
-    try:
-        return GoogleTranslator(source='auto', target=target_lang).translate(text)
-    except Exception:
-        return text
+    # Não espera pela rede: textos ainda sem tradução saem no original e são traduzidos em lote depois
+    with etapa('traducao'):
+        return obter_memoria_traducao().traduzir(text, target_lang)
 
 # Função para usar Babel se possível, senão tradução automática
-from flask_babel import get_locale as babel_get_locale
+from flask_babel import get_locale as babel_get_locale, force_locale
 
 def smart_translate(text):
     lang = str(babel_get_locale())
@@ -121,12 +235,15 @@ def set_language(lang=None):
 @app.route('/')
 @login_required
 def index():
-    # Obtém o histórico de previsões e comparações
-    historico_previsoes = db.obter_historico_previsoes()
-    historico_comparacoes = db.obter_historico_comparacoes()
+    # Primeira página do histórico; as seguintes vêm de /api/historico/<tipo> pelo cursor
+    pagina_previsoes = db.listar_historico('previsoes', limite=10)
+    pagina_comparacoes = db.listar_historico('comparacoes', limite=10)
     return render_template('index.html', 
-                         historico_previsoes=historico_previsoes,
-                         historico_comparacoes=historico_comparacoes)
+                         historico_previsoes=[dict(zip(pagina_previsoes['colunas'], l)) for l in pagina_previsoes['linhas']],
+                         historico_comparacoes=[dict(zip(pagina_comparacoes['colunas'], l)) for l in pagina_comparacoes['linhas']],
+                         proximo_previsoes=pagina_previsoes['proximo'],
+                         proximo_comparacoes=pagina_comparacoes['proximo'],
+                         totais=db.contar_historico())
 
 @app.route('/home1')
 def home1():
@@ -194,65 +311,506 @@ def home1():
     ]
     return render_template('home1.html', categories=product_categories)
 
-@app.route('/analyze', methods=['GET', 'POST'])
-@login_required
-def analyze():
-    if request.method == 'GET':
-        return render_template('analyze.html')
-        
-    if 'file' not in request.files or request.files['file'].filename == '':
-        return redirect(request.url)
+def processos_por_job(chave):
+    """Processos dos pools internos de um job (ajustes, lote, backtesting): ``app.config[chave]``.
 
-    file = request.files['file']
-    file_id = f"{uuid.uuid4().hex}_{secure_filename(file.filename)}"
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], file_id)
-    file.seek(0)
-    file.save(file_path)
+    Com ``None``, os núcleos são divididos entre todos os jobs simultâneos (``JOBS_MAX_WORKERS``
+    em cada um dos ``WEB_WORKERS`` processos web), para que cada job não abra um processo por
+    núcleo e a máquina não fique com jobs × núcleos processos.
+    """
+    if app.config[chave] is not None:
+        return app.config[chave]
+    return max(1, (os.cpu_count() or 1) // (app.config['JOBS_MAX_WORKERS'] * app.config['WEB_WORKERS']))
 
-    file.seek(0)
-    file_bytes = io.BytesIO(file.read())
-    
-    # Sanitizar entradas do formulário
-    sanitized_form = sanitize_dict(request.form)
-    
+def montar_parametros_analise(file_id, hash_conteudo, nome_arquivo, sanitized_form):
+    """Reúne tudo que a análise precisa, sem depender da requisição (pode rodar em outro processo)."""
+    return {
+        'file_id': file_id,
+        'hash_conteudo': hash_conteudo,
+        'nome_arquivo': nome_arquivo,
+        'form': sanitized_form,
+        'idioma': str(babel_get_locale()),
+        'db_name': db.db_name,
+        'upload_folder': app.config['UPLOAD_FOLDER'],
+        'cache_folder': app.config['CACHE_FOLDER'],
+        'cache_dados_max_bytes': app.config['CACHE_DADOS_MAX_BYTES'],
+        'cache_dados_max_idade': app.config['CACHE_DADOS_MAX_IDADE'],
+        'cache_modelos_max_bytes': app.config['CACHE_MODELOS_MAX_BYTES'],
+        'prophet_uncertainty_samples': app.config['PROPHET_UNCERTAINTY_SAMPLES'],
+        'ajuste_max_workers': processos_por_job('AJUSTE_MAX_WORKERS'),
+        'ajuste_max_candidatos': app.config['AJUSTE_MAX_CANDIDATOS']
+    }
+
+def executar_analise(parametros, banco, ao_progresso=None):
+    """Roda o pipeline completo, salva o CSV da previsão e registra no histórico.
+
+    ``ao_progresso(etapa, segundos, results)`` é avisado ao fim de cada etapa. Retorna ``(results, forecast_id)``.
+    Em um job, o CSV e o histórico só são gravados quando ele conclui (ver ``jobs.gravar_ao_concluir``).
+    """
+    from faturamento_forecast_class import FaturamentoForecast
+    from cache_dados import CacheDados
+    from cache_modelos import CacheModelos
+    form = parametros['form']
+    file_id = parametros['file_id']
     forecast_instance = FaturamentoForecast(
-        file_input=file_bytes,
-        coluna_data=sanitized_form.get('col_data', 'EMISSÃO'),
-        coluna_valor=sanitized_form.get('col_valor', 'VALOR TOTAL'),
-        coluna_produto=sanitized_form.get('col_prod', 'DESCRIÇÃO MATERIAL'),
-        coluna_cliente=sanitized_form.get('col_cli', 'RAZÃO SOCIAL CLIENTE'),
-        translator=smart_translate
+        file_input=os.path.join(parametros['upload_folder'], file_id),
+        coluna_data=form.get('col_data', 'EMISSÃO'),
+        coluna_valor=form.get('col_valor', 'VALOR TOTAL'),
+        coluna_produto=form.get('col_prod', 'DESCRIÇÃO MATERIAL'),
+        coluna_cliente=form.get('col_cli', 'RAZÃO SOCIAL CLIENTE'),
+        translator=smart_translate,
+        file_id=file_id,
+        cache_dados=CacheDados(os.path.join(parametros['cache_folder'], 'dados'),
+                               max_bytes=parametros['cache_dados_max_bytes'],
+                               max_idade=parametros['cache_dados_max_idade']),
+        hash_conteudo=parametros['hash_conteudo'],
+        cache_modelos=CacheModelos(os.path.join(parametros['cache_folder'], 'modelos'),
+                                   max_bytes=parametros['cache_modelos_max_bytes']),
+        pasta_cubos=parametros['upload_folder']
     )
     
-    pipeline_params = {k: v for k, v in sanitized_form.items()}
+    pipeline_params = {k: v for k, v in form.items()}
     pipeline_params['test_ratio'] = float(pipeline_params.get('test_ratio', 0.2))
     pipeline_params['periodos_forecast'] = int(pipeline_params.get('periodos_forecast', 12))
     pipeline_params['prophet_changepoint_prior_scale'] = float(pipeline_params.get('prophet_changepoint_prior_scale', 0.65))
     pipeline_params['prophet_seasonality_prior_scale'] = float(pipeline_params.get('prophet_seasonality_prior_scale', 25.0))
+    pipeline_params['prophet_uncertainty_samples'] = int(pipeline_params.get('prophet_uncertainty_samples') or parametros.get('prophet_uncertainty_samples', 1000))
+    pipeline_params['ajuste_max_workers'] = parametros.get('ajuste_max_workers')
+    pipeline_params['ajuste_max_candidatos'] = parametros.get('ajuste_max_candidatos')
+    pipeline_params['modelo_tipo'] = (pipeline_params.get('modelo_tipo') or 'prophet').lower()
+    if pipeline_params['modelo_tipo'] == 'auto':
+        pipeline_params['selecoes_anteriores'] = banco.obter_selecoes([forecast_instance._serie_id(forecast_instance.SERIE_TOTAL)])
     
-    results = forecast_instance.executar_pipeline_completo(**pipeline_params)
+    with etapa('pipeline'):
+        results = forecast_instance.executar_pipeline_completo(ao_progresso=ao_progresso, **pipeline_params)
+    inicio_renderizacao = time.perf_counter()
+
+    # Na seleção automática, o histórico guarda o motor escolhido
+    if results.get('selecao'):
+        pipeline_params['modelo_tipo'] = results['selecao']['modelo']
+        gravar_ao_concluir(lambda: banco.salvar_selecoes(file_id, forecast_instance.selecoes))
+
+    # No modo de ajuste, o histórico guarda a configuração encontrada (e não a do formulário)
+    ajuste = results.get('ajuste')
+    if ajuste:
+        pipeline_params['prophet_changepoint_prior_scale'] = ajuste['melhor']['changepoint_prior_scale']
+        pipeline_params['prophet_seasonality_prior_scale'] = ajuste['melhor']['seasonality_prior_scale']
+        pipeline_params['prophet_seasonality_mode'] = ajuste['melhor']['seasonality_mode']
     
     # Salva o DataFrame da previsão para permitir o download futuro
+    forecast_id = None
     if results.get('previsao_futura_df') is not None and not results['previsao_futura_df'].empty:
-        # Usa o DataFrame interno (não traduzido) para salvar
-        internal_df_path = os.path.join(app.config['UPLOAD_FOLDER'], f"forecast_{file_id}.csv")
-        results['previsao_futura_df_interno'].to_csv(internal_df_path, index=True)
+        # Cada execução tem seu próprio CSV, ligado ao upload pela tabela de referências
+        forecast_id = uuid.uuid4().hex
+        arquivo_previsao = f"forecast_{forecast_id}.csv"
+
+        def salvar_previsao():
+            # Usa o DataFrame interno (não traduzido) para salvar
+            internal_df_path = os.path.join(parametros['upload_folder'], arquivo_previsao)
+            results['previsao_futura_df_interno'].to_csv(internal_df_path, index=True)
+
+            # Salva no histórico
+            previsao_id = banco.salvar_previsao(
+                nome_arquivo=parametros['nome_arquivo'],
+                periodo_forecast=pipeline_params['periodos_forecast'],
+                test_ratio=pipeline_params['test_ratio'],
+                prophet_changepoint_prior_scale=pipeline_params['prophet_changepoint_prior_scale'],
+                prophet_seasonality_prior_scale=pipeline_params['prophet_seasonality_prior_scale'],
+                coluna_data=form.get('col_data', 'EMISSÃO'),
+                coluna_valor=form.get('col_valor', 'VALOR TOTAL'),
+                coluna_produto=form.get('col_prod', 'DESCRIÇÃO MATERIAL'),
+                coluna_cliente=form.get('col_cli', 'RAZÃO SOCIAL CLIENTE'),
+                arquivo_id=file_id,
+                arquivo_previsao=arquivo_previsao,
+                prophet_seasonality_mode=pipeline_params.get('prophet_seasonality_mode'),
+                melhor_config=dict(ajuste['melhor'], metricas=ajuste['metricas']) if ajuste else None,
+                metricas=results.get('metricas'),
+                modelo_tipo=pipeline_params['modelo_tipo']
+            )
+            # Specs dos gráficos, para rever a previsão pelo histórico sem refazer o ajuste
+            banco.salvar_figuras('previsao', previsao_id, parametros['idioma'], {
+                'previsao_futura': results.get('previsao_futura_fig'),
+                'validacao': results.get('validacao_fig')
+            })
+        gravar_ao_concluir(salvar_previsao)
+
+    if ao_progresso is not None:
+        ao_progresso('renderizacao', time.perf_counter() - inicio_renderizacao, results)
+    return results, forecast_id
+
+def serializar_resultados(results, forecast_id, file_id):
+    # Somente o necessário para renderizar results.html, em formato JSON
+    df_display = results.get('previsao_futura_df')
+    previsao_futura = None
+    if df_display is not None and not df_display.empty:
+        previsao_futura = {
+            'index_name': df_display.index.name,
+            'columns': list(df_display.columns),
+            'index': [d.isoformat() for d in df_display.index],
+            'data': df_display.to_numpy().tolist()
+        }
+    return {
+        'kpis_gerais': results.get('kpis_gerais') or {},
+        'metricas': {k: float(v) for k, v in (results.get('metricas') or {}).items()},
+        'validacao_fig': results.get('validacao_fig'),
+        'previsao_futura_fig': results.get('previsao_futura_fig'),
+        'previsao_futura': previsao_futura,
+        'top_produtos_list': list(results.get('top_produtos_list') or []),
+        'ajuste': results.get('ajuste'),
+        'forecast_id': forecast_id,
+        'file_id': file_id
+    }
+
+# Seções da página de resultados, carregadas em paralelo: seção -> chaves do resultado serializado.
+# A seção fica pronta quando o resultado tem a primeira chave (a tabela espera o CSV salvo, para os links)
+SECOES_RESULTADO = {
+    'kpis': ('kpis_gerais',),
+    'produtos': ('top_produtos_list',),
+    'validacao': ('validacao_fig', 'metricas', 'ajuste'),
+    'previsao_futura': ('previsao_futura_fig',),
+    'tabela': ('forecast_id', 'previsao_futura'),
+}
+# Chaves publicadas no resultado parcial do job ao fim de cada etapa do pipeline
+CHAVES_POR_ETAPA = {
+    'kpis': ('kpis_gerais', 'top_produtos_list'),
+    'validacao': ('validacao_fig', 'metricas', 'ajuste'),
+    'previsao_futura': ('previsao_futura_fig', 'previsao_futura'),
+}
+
+def secoes_resultado(dados):
+    """Seções prontas de um resultado serializado (ver SECOES_RESULTADO)."""
+    return {secao: {chave: dados.get(chave) for chave in chaves}
+            for secao, chaves in SECOES_RESULTADO.items() if chaves[0] in dados}
+
+def tarefa_analise(parametros):
+    """Tarefa da fila de jobs: roda a análise em um processo filho, relatando cada etapa.
+
+    O resultado parcial (KPIs logo após a carga, depois os gráficos) é publicado a cada etapa,
+    para a página de resultados exibir cada seção assim que ela fica pronta.
+    """
+    inicio = time.perf_counter()
+    parcial = {'file_id': parametros['file_id']}
+
+    def progresso(nome, segundos, results):
+        publicar = None
+        if nome in CHAVES_POR_ETAPA:
+            serializado = serializar_resultados(results, None, parametros['file_id'])
+            parcial.update({chave: serializado[chave] for chave in CHAVES_POR_ETAPA[nome]})
+            publicar = parcial
+        relatar_progresso(nome, resultado_parcial=publicar, segundos=round(segundos, 3),
+                          decorrido=round(time.perf_counter() - inicio, 3))
+
+    with app.app_context(), force_locale(parametros['idioma']):
+        results, forecast_id = executar_analise(parametros, Database(parametros['db_name']), ao_progresso=progresso)
+        return serializar_resultados(results, forecast_id, parametros['file_id'])
+
+def instanciar_forecast_job(parametros):
+    """Recria o FaturamentoForecast de um job a partir dos parâmetros serializados."""
+    from faturamento_forecast_class import FaturamentoForecast
+    from cache_dados import CacheDados
+    from cache_modelos import CacheModelos
+    return FaturamentoForecast(
+        file_input=os.path.join(parametros['upload_folder'], parametros['file_id']),
+        coluna_data=parametros['coluna_data'],
+        coluna_valor=parametros['coluna_valor'],
+        coluna_produto=parametros['coluna_produto'],
+        coluna_cliente=parametros['coluna_cliente'],
+        file_id=parametros['file_id'],
+        cache_dados=CacheDados(os.path.join(parametros['cache_folder'], 'dados'),
+                               max_bytes=parametros['cache_dados_max_bytes'],
+                               max_idade=parametros['cache_dados_max_idade']),
+        hash_conteudo=parametros['hash_conteudo'],
+        cache_modelos=CacheModelos(os.path.join(parametros['cache_folder'], 'modelos'),
+                                   max_bytes=parametros['cache_modelos_max_bytes']),
+        pasta_cubos=parametros['upload_folder']
+    )
+
+def tarefa_lote_produtos(parametros):
+    """Tarefa da fila de jobs: previsão de todos os produtos (ou dos N maiores) de um arquivo."""
+    forecast_instance = instanciar_forecast_job(parametros)
+    if forecast_instance.carregar_dados() is None:
+        raise ValueError("Erro no carregamento dos dados.")
+    alteracoes = None
+    banco = Database(parametros['db_name'])
+    selecoes_anteriores = banco.obter_selecoes() if parametros.get('modelo_tipo') == 'auto' else None
+    if parametros.get('versao_base'):
+        # Atualização incremental: só os produtos alterados desde a versão base são reajustados
+        import pandas as pd
+        previsao_anterior = None
+        if parametros.get('previsao_anterior'):
+            caminho = os.path.join(parametros['upload_folder'], secure_filename(f"forecast_{parametros['previsao_anterior']}.csv"))
+            if os.path.exists(caminho):
+                previsao_anterior = pd.read_csv(caminho, parse_dates=['Data'], dtype={'Produto': str})
+        df_lote, ignorados, alteracoes = forecast_instance.atualizar_incremental(
+            parametros['versao_base'], delta=parametros.get('delta', False), previsao_anterior=previsao_anterior,
+            periodos=parametros['periodos'], max_workers=parametros['max_workers'],
+            modelo_tipo=parametros.get('modelo_tipo', 'prophet'), selecoes_anteriores=selecoes_anteriores)
+    else:
+        df_lote, ignorados = forecast_instance.prever_todos_produtos(
+            top_n=parametros.get('top_n'), periodos=parametros['periodos'], max_workers=parametros['max_workers'],
+            modelo_tipo=parametros.get('modelo_tipo', 'prophet'), selecoes_anteriores=selecoes_anteriores)
+    if df_lote is None:
+        raise ValueError("Coluna de produto não encontrada.")
+    # Tabela consolidada no mesmo formato dos downloads de previsão (/download/csv e /download/xlsx)
+    forecast_id = f"lote_{uuid.uuid4().hex}"
+
+    def salvar_lote():
+        df_lote.to_csv(os.path.join(parametros['upload_folder'], f"forecast_{forecast_id}.csv"), index=False)
+        if forecast_instance.selecoes:
+            banco.salvar_selecoes(parametros['file_id'], forecast_instance.selecoes)
+    gravar_ao_concluir(salvar_lote)
+    return {
+        'forecast_id': forecast_id,
+        'produtos': int(df_lote['Produto'].nunique()),
+        'ignorados': [str(p) for p in ignorados],
+        # Versão dos agregados, a usar como ``versao_base`` na próxima atualização incremental
+        'versao': forecast_instance.versao,
+        'alteracoes': alteracoes,
+        # Quantas séries ficaram com cada motor na seleção automática
+        'modelos': dict(Counter(r['modelo'] for r in forecast_instance.selecoes.values())) or None
+    }
+
+def tarefa_backtest(parametros):
+    """Tarefa da fila de jobs: backtesting da série agregada de uma previsão do histórico."""
+    forecast_instance = instanciar_forecast_job(parametros)
+    if forecast_instance.carregar_dados() is None:
+        raise ValueError("Erro no carregamento dos dados.")
+    if forecast_instance.agregar_dados() is None:
+        raise ValueError("Erro na agregação dos dados.")
+    resultado = forecast_instance.executar_backtest(
+        horizonte=parametros['horizonte'], min_treino=parametros['min_treino'],
+        max_workers=parametros['max_workers'], **parametros['prophet'])
+    if resultado is None:
+        raise ValueError("Série curta demais para o backtesting.")
+    gravar_ao_concluir(lambda: Database(parametros['db_name']).salvar_backtest(
+        parametros['previsao_id'],
+        {'horizonte': parametros['horizonte'], 'min_treino': parametros['min_treino'], **parametros['prophet']},
+        resultado))
+    return {'previsao_id': parametros['previsao_id'], 'dobras': resultado['dobras']}
+
+# Fila de jobs criada sob demanda (usa o ``db`` vigente, que os testes podem substituir)
+_fila_jobs = None
+
+def obter_fila_jobs():
+    global _fila_jobs
+    if _fila_jobs is None:
+        _fila_jobs = FilaJobs(db, max_workers=app.config['JOBS_MAX_WORKERS'],
+                              max_pendentes=app.config['JOBS_MAX_PENDENTES'],
+                              precarregar=app.config['JOBS_PRECARREGAR'],
+                              ao_terminar=coletar_uploads_orfaos)
+        _fila_jobs.registrar('analise', tarefa_analise)
+        _fila_jobs.registrar('lote_produtos', tarefa_lote_produtos)
+        _fila_jobs.registrar('backtest', tarefa_backtest)
+        _fila_jobs.retomar_interrompidos()
+        coletar_uploads_orfaos()
+    return _fila_jobs
+
+def iniciar_fila_jobs():
+    """Cria a fila de jobs e retoma os jobs interrompidos por uma queda do processo.
+
+    Chamado uma vez na subida do servidor (``wsgi.py`` ou ``python app.py``). Com o reloader
+    do servidor de desenvolvimento, o processo monitor não inicia a fila: só o processo filho,
+    que atende as requisições.
+    """
+    from werkzeug.serving import is_running_from_reloader
+    if app.debug and os.environ.get('FLASK_RUN_FROM_CLI') == 'true' and not is_running_from_reloader():
+        return None
+    return obter_fila_jobs()
+
+_amostrador_perfil = None
+
+def obter_amostrador_perfil():
+    global _amostrador_perfil
+    if _amostrador_perfil is None:
+        _amostrador_perfil = instrumentacao.AmostradorPerfil(intervalo=app.config['PERFIL_INTERVALO'])
+    return _amostrador_perfil
+
+@app.before_request
+def iniciar_instrumentacao():
+    instrumentacao.iniciar_coleta()
+    if app.config['PERFIL_LIMIAR_SEGUNDOS'] is not None:
+        obter_amostrador_perfil().acompanhar()
+
+# Registrado antes da compressão para rodar depois dela (o Flask chama os after_request em ordem inversa)
+@app.after_request
+def registrar_instrumentacao(response):
+    """Métricas da rota, cabeçalho Server-Timing e, acima do limiar, o perfil da requisição."""
+    coleta = instrumentacao.encerrar_coleta()
+    if coleta is None:
+        return response
+    total, pico = coleta.medicao.encerrar()
+    rota = request.url_rule.rule if request.url_rule else 'nao_encontrada'
+    instrumentacao.REGISTRO.observar('sohipren_requisicao_segundos',
+                                     {'rota': rota, 'metodo': request.method, 'status': str(response.status_code)}, total)
+    if pico is not None:
+        instrumentacao.REGISTRO.registrar_pico('sohipren_requisicao_memoria_pico_bytes', {'rota': rota}, pico)
+    response.headers['Server-Timing'] = coleta.server_timing(total)
+
+    limiar = app.config['PERFIL_LIMIAR_SEGUNDOS']
+    if limiar is not None:
+        pilhas = obter_amostrador_perfil().liberar()
+        if total >= limiar and pilhas:
+            caminho = instrumentacao.gravar_perfil(pilhas, app.config['PERFIL_PASTA'], f'{request.method}_{rota}')
+            print(f"   AVISO: requisição lenta ({total:.1f}s) em {request.method} {rota}; perfil em {caminho}")
+    return response
+
+_MIMETYPES_COMPRIMIVEIS = {'application/json', 'text/html', 'text/css', 'application/javascript', 'text/plain'}
+
+def _codificacao_aceita():
+    aceitas = request.accept_encodings
+    if aceitas['br']:
+        try:
+            import brotli  # opcional; sem ele, gzip
+            return 'br', brotli
+        except ImportError:
+            pass
+    if aceitas['gzip']:
+        return 'gzip', None
+    return None, None
+
+@app.after_request
+def otimizar_resposta(response):
+    """ETag nas respostas GET (304 quando o cliente já tem o conteúdo) e compressão gzip/brotli."""
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or 'Content-Encoding' in response.headers or response.mimetype not in _MIMETYPES_COMPRIMIVEIS):
+        return response
+    corpo = response.get_data()
+    codificacao, brotli = _codificacao_aceita() if len(corpo) >= app.config['COMPRESSAO_MIN_BYTES'] else (None, None)
+    if request.method in ('GET', 'HEAD'):
+        # Uma ETag por representação: a comprimida e a original não são intercambiáveis
+        etag = hashlib.sha1(corpo).hexdigest()
+        response.set_etag(f'{etag}-{codificacao}' if codificacao else etag)
+        response.make_conditional(request)
+        if response.status_code == 304:
+            return response
+    if codificacao:
+        if codificacao == 'br':
+            corpo = brotli.compress(corpo, quality=app.config['COMPRESSAO_NIVEL_BROTLI'])
+        else:
+            corpo = gzip.compress(corpo, compresslevel=app.config['COMPRESSAO_NIVEL_GZIP'])
+        response.set_data(corpo)
+        response.headers['Content-Encoding'] = codificacao
+    response.vary.add('Accept-Encoding')
+    return response
+
+def receber_upload():
+    """Grava o arquivo da requisição no armazenamento e retorna ``(file_id, hash, nome)``."""
+    file = request.files['file']
+    nome_arquivo = secure_filename(file.filename)
+    # Grava o upload pelo hash do conteúdo; reenvios do mesmo arquivo reaproveitam o blob. O envio
+    # reserva o blob até o job ser criado, e o job ativo o segura até terminar (ver coletar_uploads_orfaos)
+    file_id, hash_conteudo, _novo = obter_armazenamento().salvar(file.stream, nome_arquivo)
+    return file_id, hash_conteudo, nome_arquivo
+
+@app.route('/analyze', methods=['GET', 'POST'])
+@login_required
+def analyze():
+    if request.method == 'GET':
+        # O formulário parte da última configuração encontrada pelo modo de ajuste
+        return render_template('analyze.html', config_inicial=db.obter_melhor_config() or {})
         
-        # Salva no histórico
-        db.salvar_previsao(
-            nome_arquivo=secure_filename(file.filename),
-            periodo_forecast=pipeline_params['periodos_forecast'],
-            test_ratio=pipeline_params['test_ratio'],
-            prophet_changepoint_prior_scale=pipeline_params['prophet_changepoint_prior_scale'],
-            prophet_seasonality_prior_scale=pipeline_params['prophet_seasonality_prior_scale'],
-            coluna_data=sanitized_form.get('col_data', 'EMISSÃO'),
-            coluna_valor=sanitized_form.get('col_valor', 'VALOR TOTAL'),
-            coluna_produto=sanitized_form.get('col_prod', 'DESCRIÇÃO MATERIAL'),
-            coluna_cliente=sanitized_form.get('col_cli', 'RAZÃO SOCIAL CLIENTE'),
-            arquivo_id=file_id
-        )
+    if 'file' not in request.files or request.files['file'].filename == '':
+        return redirect(request.url)
+
+    file_id, hash_conteudo, nome_arquivo = receber_upload()
+    # Sanitizar entradas do formulário
+    sanitized_form = sanitize_dict(request.form)
+    parametros = montar_parametros_analise(file_id, hash_conteudo, nome_arquivo, sanitized_form)
+    # Sem JavaScript, o formulário também passa pela fila: a página de resultados acompanha o job
+    try:
+        job_id = obter_fila_jobs().submeter('analise', parametros)
+    except FilaCheiaError:
+        flash(_('Muitas análises em andamento. Tente novamente em instantes.'), 'warning')
+        return redirect(url_for('analyze'))
+    return redirect(url_for('resultado_analise', job_id=job_id))
+
+@app.route('/api/analises', methods=['POST'])
+@login_required
+def submeter_analise():
+    """/analyze em JSON: grava o upload, enfileira a análise e responde na hora com as URLs do job."""
+    if 'file' not in request.files or request.files['file'].filename == '':
+        return jsonify({'success': False, 'message': _('Nenhum arquivo enviado.')}), 400
+
+    file_id, hash_conteudo, nome_arquivo = receber_upload()
+    sanitized_form = sanitize_dict(request.form)
+    parametros = montar_parametros_analise(file_id, hash_conteudo, nome_arquivo, sanitized_form)
+    try:
+        job_id = obter_fila_jobs().submeter('analise', parametros)
+    except FilaCheiaError:
+        return jsonify({'success': False, 'message': _('Muitas análises em andamento. Tente novamente em instantes.')}), 429
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status_url': url_for('status_job', job_id=job_id),
+        'cancelar_url': url_for('cancelar_job', job_id=job_id),
+        'resultado_url': url_for('resultado_analise', job_id=job_id)
+    }), 202
 
-    return render_template('results.html', results=results, file_id=file_id)
+@app.route('/api/jobs/<job_id>')
+@login_required
+def status_job(job_id):
+    """Status e progresso do job; as páginas consultam esta rota a cada ``PROGRESSO_INTERVALO`` segundos."""
+    fila = obter_fila_jobs()
+    # O resultado da análise completa é grande e é servido por /analise/<job_id>: nem é lido aqui
+    job = fila.obter(job_id, com_resultado=False)
+    if job and job['tipo'] != 'analise':
+        job = fila.obter(job_id)
+    if not job:
+        return jsonify({'success': False, 'message': _('Job não encontrado.')}), 404
+    return jsonify({'success': True, 'job': {
+        'id': job['id'],
+        'tipo': job['tipo'],
+        'status': job['status'],
+        'erro': job['erro'],
+        'tentativas': job['tentativas'],
+        'data_criacao': job['data_criacao'],
+        'data_inicio': job['data_inicio'],
+        'data_fim': job['data_fim'],
+        'resultado': job['resultado'],
+        'progresso': job['progresso']
+    }})
+
+@app.route('/api/jobs/<job_id>/cancelar', methods=['POST'])
+@login_required
+def cancelar_job(job_id):
+    fila = obter_fila_jobs()
+    if not fila.obter(job_id):
+        return jsonify({'success': False, 'message': _('Job não encontrado.')}), 404
+    if not fila.cancelar(job_id):
+        return jsonify({'success': False, 'message': _('O job já terminou.')}), 409
+    return jsonify({'success': True})
+
+@app.route('/analise/<job_id>')
+@login_required
+def resultado_analise(job_id):
+    job = obter_fila_jobs().obter(job_id)
+    if not job or job['tipo'] != 'analise':
+        return _("Análise não encontrada."), 404
+    if job['status'] == 'erro':
+        flash(_('Erro ao executar a análise: %(erro)s', erro=job['erro']), 'danger')
+        return redirect(url_for('analyze'))
+    if job['status'] == 'cancelado':
+        flash(_('A análise foi cancelada.'), 'warning')
+        return redirect(url_for('analyze'))
+    # Só o esqueleto da página: as seções vêm de /api/analise/<job_id>/<secao> à medida que ficam prontas
+    return render_template('results.html', file_id=job['parametros']['file_id'], job_id=job_id)
+
+@app.route('/api/analise/<job_id>/<secao>')
+@login_required
+def secao_analise(job_id, secao):
+    """Uma seção da página de resultados; 202 enquanto o job ainda não a produziu."""
+    if secao not in SECOES_RESULTADO:
+        return jsonify({'success': False, 'message': _('Seção desconhecida.')}), 404
+    job = obter_fila_jobs().db.obter_campos_resultado_job(job_id, SECOES_RESULTADO[secao])
+    if not job or job['tipo'] != 'analise':
+        return jsonify({'success': False, 'message': _('Análise não encontrada.')}), 404
+    dados = secoes_resultado(job['campos']).get(secao)
+    if dados is not None:
+        return jsonify({'success': True, 'pronto': True, **dados})
+    if job['status'] in ('pendente', 'executando'):
+        return jsonify({'success': True, 'pronto': False}), 202
+    mensagem = job['erro'] if job['status'] == 'erro' else _('A análise foi cancelada.')
+    return jsonify({'success': False, 'message': mensagem}), 409
 
 @app.route('/download/csv/<file_id>')
 def download_csv(file_id):
@@ -265,6 +823,7 @@ def download_xlsx(file_id):
     csv_path = os.path.join(app.config['UPLOAD_FOLDER'], forecast_filename)
     if not os.path.exists(csv_path):
         return _("Arquivo não encontrado."), 404
+    import pandas as pd
     df = pd.read_csv(csv_path, index_col=0)
     output = io.BytesIO()
     with pd.ExcelWriter(output, engine='openpyxl') as writer:
@@ -277,21 +836,31 @@ def download_xlsx(file_id):
         download_name=_('previsao_faturamento.xlsx')
     )
 
+# Resolvedor de imagens criado sob demanda (cache no diretório de cache)
+_resolvedor_imagens = None
+
+def obter_resolvedor_imagens():
+    global _resolvedor_imagens
+    if _resolvedor_imagens is None:
+        _resolvedor_imagens = ResolvedorImagens(os.path.join(app.config['CACHE_FOLDER'], 'imagens.db'),
+                                                url_busca=app.config['IMAGENS_URL_BUSCA'],
+                                                timeout=app.config['IMAGENS_TIMEOUT'],
+                                                ttl=app.config['IMAGENS_TTL'],
+                                                ttl_negativo=app.config['IMAGENS_TTL_NEGATIVO'])
+    return _resolvedor_imagens
+
 def buscar_primeira_imagem_google(query):
-    # Sempre adiciona 'SOHIPREN' antes do termo de pesquisa
-    query_modificada = f"SOHIPREN {query}"
-    url = f"https://www.google.com/search?tbm=isch&q={query_modificada.replace(' ', '+')}"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3"
-    }
-    response = requests.get(url, headers=headers)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    imagens = soup.find_all('img')
-    for img in imagens:
-        src = img.get('src')
-        if src and src.startswith('http'):
-            return src
-    return None
+    # Sempre adiciona 'SOHIPREN' antes do termo de pesquisa (prefixo padrão do resolvedor)
+    return obter_resolvedor_imagens().buscar(query)
+
+@app.route('/api/imagem_produto')
+@login_required
+def imagem_produto():
+    """Imagem de um produto, buscada sob demanda pela página (não entra no tempo da previsão)."""
+    produto = sanitize_dict(request.args).get('produto')
+    if not produto:
+        return jsonify({'success': False, 'message': _('Informações ausentes.')}), 400
+    return jsonify({'success': True, 'produto': produto, 'url': buscar_primeira_imagem_google(produto)})
 
 @app.route('/api/compare_products', methods=['POST'])
 def compare_products():
@@ -306,30 +875,41 @@ def compare_products():
     if product_1 == product_2:
         return jsonify({'success': False, 'message': _('Por favor, selecione dois produtos diferentes.')}), 400
 
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], file_id)
+    armazenamento = obter_armazenamento()
+    file_path = armazenamento.caminho(file_id)
     if not os.path.exists(file_path):
         return jsonify({'success': False, 'message': _('Arquivo de dados não encontrado.')}), 404
         
+    from faturamento_forecast_class import FaturamentoForecast
     forecast_instance = FaturamentoForecast(
         file_input=file_path, 
         coluna_data=session.get('col_data', 'EMISSÃO'),
         coluna_valor=session.get('col_valor', 'VALOR TOTAL'), 
         coluna_produto=session.get('col_prod', 'DESCRIÇÃO MATERIAL'), 
         coluna_cliente=session.get('col_cli', 'RAZÃO SOCIAL CLIENTE'),
-        translator=smart_translate
+        translator=smart_translate,
+        file_id=file_id,
+        cache_dados=obter_cache_dados(),
+        hash_conteudo=armazenamento.hash_de(file_id),
+        cache_modelos=obter_cache_modelos(),
+        pasta_cubos=app.config['UPLOAD_FOLDER']
     )
+    # As imagens são buscadas em paralelo aos ajustes; as que não ficarem prontas a tempo
+    # vão como None e a página as pede depois em /api/imagem_produto
+    buscas_imagens = obter_resolvedor_imagens().agendar([product_1, product_2])
     forecast_instance.carregar_dados() 
     
     plot_json_1, plot_json_2 = forecast_instance.comparar_previsao_produtos(
-        nome_produto_1=product_1, nome_produto_2=product_2
+        nome_produto_1=product_1, nome_produto_2=product_2,
+        selecoes_anteriores=db.obter_selecoes([forecast_instance._serie_id(p) for p in (product_1, product_2)])
     )
+    db.salvar_selecoes(file_id, forecast_instance.selecoes)
 
-    # Buscar imagens em tempo real
-    img1 = buscar_primeira_imagem_google(product_1)
-    img2 = buscar_primeira_imagem_google(product_2)
+    imagens = ResolvedorImagens.coletar(buscas_imagens)
+    img1, img2 = imagens[product_1], imagens[product_2]
     
     if plot_json_1 and plot_json_2:
-        db.salvar_comparacao(
+        comparacao_id = db.salvar_comparacao(
             produto1=product_1,
             produto2=product_2,
             arquivo_id=file_id,
@@ -338,18 +918,170 @@ def compare_products():
             coluna_produto=session.get('col_prod', 'DESCRIÇÃO MATERIAL'),
             coluna_cliente=session.get('col_cli', 'RAZÃO SOCIAL CLIENTE')
         )
+        db.salvar_figuras('comparacao', comparacao_id, str(babel_get_locale()),
+                          {'produto1': plot_json_1, 'produto2': plot_json_2})
         return jsonify({'success': True, 'plot_json_1': plot_json_1, 'plot_json_2': plot_json_2, 'img1': img1, 'img2': img2})
     else:
         return jsonify({'success': False, 'message': _('Não foi possível gerar o gráfico de comparação.')})
 
+@app.route('/api/prever_produtos', methods=['POST'])
+@login_required
+def prever_produtos():
+    """Enfileira a previsão em lote de todos os produtos (ou dos ``top_n`` maiores) de um arquivo.
+
+    Com ``versao_base`` (a ``versao`` de um lote anterior) a previsão é incremental: ``file_id``
+    é a nova exportação completa ou, com ``delta``, só as linhas novas; ``previsao_anterior``
+    (o ``forecast_id`` daquele lote) fornece as linhas dos produtos que não mudaram.
+    """
+    sanitized_data = sanitize_dict(request.get_json() or {})
+    file_id = sanitized_data.get('file_id')
+    if not file_id:
+        return jsonify({'success': False, 'message': _('Informações ausentes.')}), 400
+    armazenamento = obter_armazenamento()
+    if not os.path.exists(armazenamento.caminho(file_id)):
+        return jsonify({'success': False, 'message': _('Arquivo de dados não encontrado.')}), 404
+
+    from modelos_estatisticos import MODELOS
+    modelo_tipo = (sanitized_data.get('modelo_tipo') or 'prophet').lower()
+    if modelo_tipo not in ('prophet', 'auto') and modelo_tipo not in MODELOS:
+        return jsonify({'success': False, 'message': _('Tipo de modelo desconhecido.')}), 400
+
+    top_n = sanitized_data.get('top_n')
+    parametros = {
+        'file_id': file_id,
+        'hash_conteudo': armazenamento.hash_de(file_id),
+        'coluna_data': session.get('col_data', 'EMISSÃO'),
+        'coluna_valor': session.get('col_valor', 'VALOR TOTAL'),
+        'coluna_produto': session.get('col_prod', 'DESCRIÇÃO MATERIAL'),
+        'coluna_cliente': session.get('col_cli', 'RAZÃO SOCIAL CLIENTE'),
+        'top_n': int(top_n) if top_n else None,
+        'periodos': int(sanitized_data.get('periodos', 12)),
+        'modelo_tipo': modelo_tipo,
+        'db_name': db.db_name,
+        'versao_base': secure_filename(sanitized_data.get('versao_base') or '') or None,
+        'delta': bool(sanitized_data.get('delta')),
+        'previsao_anterior': sanitized_data.get('previsao_anterior'),
+        'max_workers': processos_por_job('LOTE_MAX_WORKERS'),
+        'upload_folder': app.config['UPLOAD_FOLDER'],
+        'cache_folder': app.config['CACHE_FOLDER'],
+        'cache_dados_max_bytes': app.config['CACHE_DADOS_MAX_BYTES'],
+        'cache_dados_max_idade': app.config['CACHE_DADOS_MAX_IDADE'],
+        'cache_modelos_max_bytes': app.config['CACHE_MODELOS_MAX_BYTES']
+    }
+    try:
+        job_id = obter_fila_jobs().submeter('lote_produtos', parametros)
+    except FilaCheiaError:
+        return jsonify({'success': False, 'message': _('Muitas análises em andamento. Tente novamente em instantes.')}), 429
+    return jsonify({'success': True, 'job_id': job_id, 'status_url': url_for('status_job', job_id=job_id)}), 202
+
+@app.route('/api/historico/<tipo>')
+@login_required
+def listar_historico(tipo):
+    """Histórico paginado por cursor, com filtros na query string (ver ``FILTROS_HISTORICO``).
+
+    Resposta compacta: ``colunas`` uma vez e ``linhas`` como listas; ``proximo`` é o cursor
+    da página seguinte (``?cursor=...``) ou null na última.
+    """
+    if tipo not in ('previsoes', 'comparacoes'):
+        return jsonify({'success': False, 'message': _('Histórico não encontrado.')}), 404
+    filtros = sanitize_dict(request.args.to_dict())
+    cursor_pagina = filtros.pop('cursor', None)
+    try:
+        limite = min(max(int(filtros.pop('limite', 20)), 1), app.config['HISTORICO_LIMITE_MAXIMO'])
+        pagina = db.listar_historico(tipo, filtros=filtros, limite=limite, apos=cursor_pagina)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, **pagina})
+
 @app.route('/api/previsao/<int:previsao_id>')
 @login_required
 def obter_detalhes_previsao(previsao_id):
     previsao = db.obter_previsao_por_id(previsao_id)
     if not previsao:
         return jsonify({'success': False, 'message': _('Previsão não encontrada.')}), 404
+    # Backtesting já calculado para esta previsão, se houver (evita recalcular ao revisitar)
+    previsao['backtest'] = db.obter_backtest(previsao_id)
     return jsonify({'success': True, 'previsao': previsao})
 
+@app.route('/api/previsao/<int:previsao_id>/figuras')
+@login_required
+def figuras_previsao(previsao_id):
+    """Specs guardadas dos gráficos da previsão (previsão futura e validação)."""
+    figuras = db.obter_figuras('previsao', previsao_id, str(babel_get_locale()))
+    if not figuras:
+        return jsonify({'success': False, 'message': _('Gráficos não encontrados.')}), 404
+    return jsonify({'success': True, 'figuras': figuras})
+
+@app.route('/api/figuras/template/<nome>')
+def template_figura(nome):
+    """Template do Plotly referenciado pelas specs compactas; não muda, então fica no cache do navegador."""
+    from figuras import template_plotly
+    template = template_plotly(nome)
+    if template is None:
+        return jsonify({'success': False, 'message': _('Template não encontrado.')}), 404
+    resposta = jsonify(template)
+    resposta.cache_control.public = True
+    resposta.cache_control.max_age = app.config['FIGURAS_TEMPLATE_MAX_AGE']
+    return resposta
+
+@app.route('/metrics')
+def metricas():
+    """Métricas de etapas e rotas no formato de texto do Prometheus (inclui as dos jobs já concluídos)."""
+    return app.response_class(instrumentacao.REGISTRO.exportar(),
+                              content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/selecao_modelos/<file_id>')
+@login_required
+def selecao_modelos_arquivo(file_id):
+    """Motor escolhido, perfil e erros de holdout de cada série avaliada com o arquivo."""
+    return jsonify({'success': True, 'selecoes': db.obter_selecoes(arquivo_id=secure_filename(file_id))})
+
+@app.route('/api/previsao/<int:previsao_id>/backtest', methods=['GET', 'POST'])
+@login_required
+def backtest_previsao(previsao_id):
+    """GET devolve o backtesting salvo; POST enfileira um novo com os parâmetros da previsão."""
+    previsao = db.obter_previsao_por_id(previsao_id)
+    if not previsao:
+        return jsonify({'success': False, 'message': _('Previsão não encontrada.')}), 404
+    if request.method == 'GET':
+        backtest = db.obter_backtest(previsao_id)
+        if backtest is None:
+            return jsonify({'success': False, 'message': _('Backtesting ainda não executado.')}), 404
+        return jsonify({'success': True, 'backtest': backtest})
+
+    armazenamento = obter_armazenamento()
+    if not previsao['arquivo_id'] or not os.path.exists(armazenamento.caminho(previsao['arquivo_id'])):
+        return jsonify({'success': False, 'message': _('Arquivo de dados não encontrado.')}), 404
+    sanitized_data = sanitize_dict(request.get_json(silent=True) or {})
+    parametros = {
+        'previsao_id': previsao_id,
+        'db_name': db.db_name,
+        'file_id': previsao['arquivo_id'],
+        'hash_conteudo': armazenamento.hash_de(previsao['arquivo_id']),
+        'coluna_data': previsao['coluna_data'],
+        'coluna_valor': previsao['coluna_valor'],
+        'coluna_produto': previsao['coluna_produto'],
+        'coluna_cliente': previsao['coluna_cliente'],
+        'horizonte': int(sanitized_data.get('horizonte') or app.config['BACKTEST_HORIZONTE']),
+        'min_treino': int(sanitized_data.get('min_treino') or app.config['BACKTEST_MIN_TREINO']),
+        'max_workers': processos_por_job('BACKTEST_MAX_WORKERS'),
+        'prophet': {
+            'prophet_seasonality_mode': previsao['seasonality_mode'],
+            'prophet_changepoint_prior_scale': previsao['changepoint_scale'],
+            'prophet_seasonality_prior_scale': previsao['seasonality_scale']
+        },
+        'upload_folder': app.config['UPLOAD_FOLDER'],
+        'cache_folder': app.config['CACHE_FOLDER'],
+        'cache_dados_max_bytes': app.config['CACHE_DADOS_MAX_BYTES'],
+        'cache_dados_max_idade': app.config['CACHE_DADOS_MAX_IDADE'],
+        'cache_modelos_max_bytes': app.config['CACHE_MODELOS_MAX_BYTES']
+    }
+    try:
+        job_id = obter_fila_jobs().submeter('backtest', parametros)
+    except FilaCheiaError:
+        return jsonify({'success': False, 'message': _('Muitas análises em andamento. Tente novamente em instantes.')}), 429
+    return jsonify({'success': True, 'job_id': job_id, 'status_url': url_for('status_job', job_id=job_id)}), 202
+
 @app.route('/api/comparacao/<int:comparacao_id>')
 @login_required
 def obter_detalhes_comparacao(comparacao_id):
@@ -365,26 +1097,49 @@ def refazer_comparacao(comparacao_id):
     if not comparacao:
         return jsonify({'success': False, 'message': _('Comparação não encontrada.')}), 404
 
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], comparacao['arquivo_id'])
+    # Os gráficos de uma comparação não mudam: usa os guardados quando houver
+    figuras = db.obter_figuras('comparacao', comparacao_id, str(babel_get_locale()))
+    if figuras.get('produto1') and figuras.get('produto2'):
+        return jsonify({
+            'success': True,
+            'plot_json_1': figuras['produto1'],
+            'plot_json_2': figuras['produto2'],
+            'produto1': comparacao['produto1'],
+            'produto2': comparacao['produto2']
+        })
+
+    armazenamento = obter_armazenamento()
+    file_path = armazenamento.caminho(comparacao['arquivo_id'])
     if not os.path.exists(file_path):
         return jsonify({'success': False, 'message': _('Arquivo de dados não encontrado.')}), 404
 
+    from faturamento_forecast_class import FaturamentoForecast
     forecast_instance = FaturamentoForecast(
         file_input=file_path,
         coluna_data=comparacao['coluna_data'],
         coluna_valor=comparacao['coluna_valor'],
         coluna_produto=comparacao['coluna_produto'],
         coluna_cliente=comparacao['coluna_cliente'],
-        translator=smart_translate
+        translator=smart_translate,
+        file_id=comparacao['arquivo_id'],
+        cache_dados=obter_cache_dados(),
+        hash_conteudo=armazenamento.hash_de(comparacao['arquivo_id']),
+        cache_modelos=obter_cache_modelos(),
+        pasta_cubos=app.config['UPLOAD_FOLDER']
     )
     forecast_instance.carregar_dados()
 
+    series = [forecast_instance._serie_id(p) for p in (comparacao['produto1'], comparacao['produto2'])]
     plot_json_1, plot_json_2 = forecast_instance.comparar_previsao_produtos(
         nome_produto_1=comparacao['produto1'],
-        nome_produto_2=comparacao['produto2']
+        nome_produto_2=comparacao['produto2'],
+        selecoes_anteriores=db.obter_selecoes(series)
     )
+    db.salvar_selecoes(comparacao['arquivo_id'], forecast_instance.selecoes)
 
     if plot_json_1 and plot_json_2:
+        db.salvar_figuras('comparacao', comparacao_id, str(babel_get_locale()),
+                          {'produto1': plot_json_1, 'produto2': plot_json_2})
         return jsonify({
             'success': True,
             'plot_json_1': plot_json_1,
@@ -395,6 +1150,11 @@ def refazer_comparacao(comparacao_id):
     else:
         return jsonify({'success': False, 'message': _('Não foi possível gerar o gráfico de comparação.')})
 
+@app.route('/api/cache/modelos')
+@login_required
+def estatisticas_cache_modelos():
+    return jsonify({'success': True, 'estatisticas': obter_cache_modelos().estatisticas()})
+
 @app.route('/admin')
 @login_required
 def admin_area():
@@ -404,7 +1164,7 @@ def admin_area():
 @login_required
 def delete_previsao(previsao_id):
     try:
-        db.deletar_previsao(previsao_id)
+        liberar_arquivos(*db.deletar_previsao(previsao_id))
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
@@ -413,15 +1173,35 @@ def delete_previsao(previsao_id):
 @login_required
 def delete_comparacao(comparacao_id):
     try:
-        db.deletar_comparacao(comparacao_id)
+        liberar_arquivos(*db.deletar_comparacao(comparacao_id))
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
+@app.cli.command('tempo-importacao')
+@click.option('--modulo', default='app', show_default=True, help='Módulo a importar.')
+@click.option('--limite', default=15, show_default=True, help='Quantos módulos listar.')
+@click.option('--meta', type=float, default=None, help='Tempo máximo em segundos (padrão: TEMPO_IMPORTACAO_META).')
+def tempo_importacao(modulo, limite, meta):
+    """Mede o tempo de importação (python -X importtime) e falha se passar da meta."""
+    from tempo_importacao import medir_importacao, resumir
+    meta = app.config['TEMPO_IMPORTACAO_META'] if meta is None else meta
+    total, maiores = resumir(medir_importacao(modulo), modulo, limite)
+    click.echo(f"{'acumulado (s)':>14}  {'próprio (s)':>12}  módulo")
+    for medicao in maiores:
+        click.echo(f"{medicao['acumulado']:>14.3f}  {medicao['proprio']:>12.3f}  {'  ' * medicao['nivel']}{medicao['modulo']}")
+    click.echo(f"\nImportação de '{modulo}': {total:.3f} s (meta: {meta:.3f} s)")
+    if meta and total > meta:
+        raise click.ClickException(f"Tempo de importação acima da meta ({total:.3f} s > {meta:.3f} s).")
+
 if __name__ == '__main__':
     print("""
 ✅ Proteção XSS ativa: Entradas do usuário são sanitizadas com bleach.clean()
 🛡️ Nunca use |safe em variáveis vindas do usuário sem sanitização!
 🧪 Sugestão: Valide também no frontend para experiência mais segura.
 """)
+    from werkzeug.serving import is_running_from_reloader
+    # debug=True liga o reloader: a fila sobe no processo filho, que atende as requisições
+    if is_running_from_reloader():
+        iniciar_fila_jobs()
     app.run(debug=True, host='0.0.0.0') 
\ No newline at end of file
@@ -0,0 +1,85 @@
+import glob
+import hashlib
+import os
+import re
+import time
+import uuid
+
+from werkzeug.utils import secure_filename
+
+
+class ArmazenamentoUploads:
+    """Armazena as planilhas enviadas pelo hash SHA-256 do conteúdo.
+
+    O identificador do arquivo é ``<sha256><extensão>``, de modo que enviar o mesmo
+    arquivo duas vezes reaproveita o mesmo blob (e as entradas de cache ligadas a ele).
+    Cada envio reserva o blob por ``reserva_segundos`` (pela data de modificação): até o
+    job que vai usá-lo ser criado, nenhuma limpeza o apaga.
+    """
+
+    TAMANHO_BLOCO = 1024 * 1024
+    PADRAO_ID = re.compile(r'^([0-9a-f]{64})(\.[a-z0-9]+)?$')
+
+    def __init__(self, diretorio, reserva_segundos=3600):
+        self.diretorio = diretorio
+        self.reserva_segundos = reserva_segundos
+        os.makedirs(self.diretorio, exist_ok=True)
+
+    def caminho(self, arquivo_id):
+        return os.path.join(self.diretorio, secure_filename(arquivo_id))
+
+    def hash_de(self, arquivo_id):
+        """Retorna o SHA-256 embutido no identificador, ou ``None`` para uploads antigos."""
+        match = self.PADRAO_ID.match(arquivo_id or '')
+        return match.group(1) if match else None
+
+    def salvar(self, stream, nome_arquivo):
+        """Grava o stream calculando o hash durante a escrita.
+
+        Retorna ``(arquivo_id, sha256, novo)``; ``novo`` é False quando o conteúdo já existia.
+        """
+        sha = hashlib.sha256()
+        tmp_path = os.path.join(self.diretorio, f'.tmp-{uuid.uuid4().hex}')
+        try:
+            with open(tmp_path, 'wb') as destino:
+                for bloco in iter(lambda: stream.read(self.TAMANHO_BLOCO), b''):
+                    sha.update(bloco)
+                    destino.write(bloco)
+            digest = sha.hexdigest()
+            extensao = os.path.splitext(secure_filename(nome_arquivo))[1].lower()
+            arquivo_id = f"{digest}{extensao}"
+            destino_final = self.caminho(arquivo_id)
+            if os.path.exists(destino_final):
+                os.remove(tmp_path)
+                # Conteúdo repetido: renova a reserva do blob existente
+                os.utime(destino_final)
+                return arquivo_id, digest, False
+            os.replace(tmp_path, destino_final)
+            return arquivo_id, digest, True
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def listar(self):
+        """Identificadores dos blobs no diretório (sem uploads antigos nem arquivos derivados)."""
+        return [nome for nome in os.listdir(self.diretorio) if self.PADRAO_ID.match(nome)]
+
+    def reservado(self, arquivo_id):
+        """True se o blob foi enviado (ou reenviado) há menos de ``reserva_segundos``."""
+        try:
+            modificado = os.path.getmtime(self.caminho(arquivo_id))
+        except OSError:
+            return False
+        return time.time() - modificado < self.reserva_segundos
+
+    def remover(self, nome):
+        """Remove um blob ou arquivo derivado (ex.: CSV de previsão) do diretório de uploads.
+
+        Ao remover um blob, remove também os cubos de agregação persistidos junto a ele.
+        """
+        caminho = self.caminho(nome)
+        cubos = glob.glob(os.path.join(self.diretorio, f"cubo_{glob.escape(secure_filename(nome))}_*.npz"))
+        for alvo in [caminho] + cubos:
+            if os.path.isfile(alvo):
+                os.remove(alvo)
@@ -0,0 +1,95 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from processos import contexto_pool_interno
+
+
+def gerar_cortes(n_periodos, horizonte, min_treino, passo=1, max_dobras=None):
+    """Índices de corte da validação com janela expansível.
+
+    Cada corte ``c`` treina em ``[0, c)`` e avalia em ``[c, c + horizonte)``; só entram
+    dobras com o horizonte completo, para que todos os passos tenham o mesmo número de
+    amostras. Com ``max_dobras``, ficam os cortes mais recentes.
+    """
+    cortes = list(range(min_treino, n_periodos - horizonte + 1, passo))
+    if max_dobras:
+        cortes = cortes[-int(max_dobras):]
+    return cortes
+
+
+def _executar_dobra(datas, valores, corte, horizonte, parametros, cache_modelos):
+    """Ajusta o Prophet até o corte e prevê os ``horizonte`` períodos seguintes (roda no pool)."""
+    from prophet import Prophet
+    df_treino = pd.DataFrame({'ds': datas[:corte], 'y': valores[:corte]})
+    if cache_modelos is None: modelo = Prophet(**parametros).fit(df_treino)
+    else: modelo = cache_modelos.ajustar(df_treino, parametros)
+    # Só o yhat entra nas métricas; dispensa a amostragem dos intervalos
+    modelo.uncertainty_samples = 0
+    forecast = modelo.predict(pd.DataFrame({'ds': datas[corte:corte + horizonte]}))
+    return corte, forecast['yhat'].to_numpy(dtype='float64')
+
+
+def _metricas(erros, reais):
+    absolutos = np.abs(erros)
+    com_valor = reais != 0
+    mape = float(np.mean(absolutos[com_valor] / np.abs(reais[com_valor])) * 100) if com_valor.any() else None
+    return {
+        'MAE': float(absolutos.mean()),
+        'RMSE': float(np.sqrt(np.mean(erros ** 2))),
+        'MAPE': mape,
+        'n': int(erros.size)
+    }
+
+
+def executar_backtest(serie, parametros, horizonte=3, min_treino=12, passo=1, max_dobras=None,
+                      max_workers=None, cache_modelos=None):
+    """Validação cruzada com origem móvel sobre uma série agregada (índice de datas).
+
+    As dobras são ajustadas em paralelo em um pool de processos. Retorna um dicionário
+    serializável em JSON com os erros por passo do horizonte (``por_horizonte``), o
+    resumo de todas as dobras (``geral``) e as datas de corte usadas (último período de
+    treino de cada dobra), ou ``None`` se a série for curta demais para ao menos uma dobra.
+    """
+    serie = serie.dropna()
+    datas = serie.index.to_numpy()
+    valores = serie.to_numpy(dtype='float64')
+    cortes = gerar_cortes(len(valores), horizonte, min_treino, passo, max_dobras)
+    if not cortes:
+        return None
+
+    print(f"\n--- Backtesting: {len(cortes)} dobras, horizonte de {horizonte} períodos ---")
+    previsoes = np.full((len(cortes), horizonte), np.nan)
+    posicao = {corte: i for i, corte in enumerate(cortes)}
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(), mp_context=contexto_pool_interno()) as executor:
+        futures = [executor.submit(_executar_dobra, datas, valores, corte, horizonte, parametros, cache_modelos)
+                   for corte in cortes]
+        for future in futures:
+            try:
+                corte, yhat = future.result()
+            except Exception as e:
+                print(f"ERRO em dobra do backtesting: {e}")
+                continue
+            previsoes[posicao[corte]] = yhat
+
+    # Matriz dobra x passo com os valores reais correspondentes a cada previsão
+    reais = valores[np.add.outer(np.array(cortes), np.arange(horizonte))]
+    validas = ~np.isnan(previsoes).any(axis=1)
+    if not validas.any():
+        return None
+    erros = previsoes[validas] - reais[validas]
+
+    por_horizonte = []
+    for passo_h in range(horizonte):
+        linha = {'horizonte': passo_h + 1}
+        linha.update(_metricas(erros[:, passo_h], reais[validas][:, passo_h]))
+        por_horizonte.append(linha)
+
+    return {
+        'dobras': int(validas.sum()),
+        'cortes': [pd.Timestamp(datas[c - 1]).isoformat() for c, ok in zip(cortes, validas) if ok],
+        'por_horizonte': por_horizonte,
+        'geral': _metricas(erros.ravel(), reais[validas].ravel())
+    }
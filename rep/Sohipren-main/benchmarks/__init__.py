@@ -0,0 +1 @@
+# Benchmarks do pipeline de previsão: gerador de dados sintéticos, execução e orçamentos
@@ -0,0 +1,41 @@
+import click
+
+from benchmarks.executar import (CENARIOS, HISTORICO, ORCAMENTOS, PADRAO, PASTA_DADOS, carregar_orcamentos,
+                                 medir_cenario, orcamentos_de, registrar_historico, verificar_orcamentos)
+
+
+@click.command()
+@click.argument('cenarios', nargs=-1, type=click.Choice(sorted(CENARIOS)))
+@click.option('--pasta-dados', default=PASTA_DADOS, show_default=True, help='Onde ficam as planilhas geradas.')
+@click.option('--semente', default=0, show_default=True, help='Semente do gerador.')
+@click.option('--historico', default=HISTORICO, show_default=True, help='JSON com o histórico das execuções.')
+@click.option('--orcamentos', default=ORCAMENTOS, show_default=True, help='JSON com os orçamentos por cenário e passo.')
+@click.option('--atualizar-orcamentos', is_flag=True, help='Grava os orçamentos a partir desta execução.')
+@click.option('--margem', default=1.5, show_default=True, help='Folga sobre o medido ao atualizar os orçamentos.')
+def main(cenarios, pasta_dados, semente, historico, orcamentos, atualizar_orcamentos, margem):
+    """Mede os passos do pipeline nos CENARIOS (padrão: pequeno e medio) e confere os orçamentos."""
+    import json
+    resultados = []
+    for nome in cenarios or PADRAO:
+        click.echo(f"--- Cenário '{nome}': {CENARIOS[nome]} ---")
+        resultado = medir_cenario(nome, pasta_dados=pasta_dados, semente=semente)
+        for passo, medido in resultado['passos'].items():
+            pico = (medido['pico_rss_bytes'] or 0) / 2 ** 20
+            click.echo(f"{passo:>32}  {medido['segundos']:>9.3f} s  {pico:>8.0f} MB")
+        resultados.append(resultado)
+    registrar_historico(resultados, historico)
+
+    if atualizar_orcamentos:
+        novos = orcamentos_de(resultados, margem, carregar_orcamentos(orcamentos))
+        with open(orcamentos, 'w', encoding='utf-8') as f:
+            json.dump(novos, f, ensure_ascii=False, indent=1)
+        click.echo(f"Orçamentos atualizados em {orcamentos}")
+        return
+    violacoes = [v for resultado in resultados for v in verificar_orcamentos(resultado, carregar_orcamentos(orcamentos))]
+    if violacoes:
+        raise click.ClickException("Passos acima do orçamento:\n" + '\n'.join(violacoes))
+    click.echo("Todos os passos dentro do orçamento.")
+
+
+if __name__ == '__main__':
+    main()
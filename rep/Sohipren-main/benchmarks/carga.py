@@ -0,0 +1,343 @@
+import io
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import click
+import numpy as np
+
+from benchmarks.gerador import gerar_faturamento, gravar_planilha
+
+
+# Operações de cada usuário virtual e seu peso no sorteio (o login é feito uma vez por usuário)
+PESOS_PADRAO = {'analise': 1, 'comparacao': 2, 'historico': 5, 'download': 2, 'exclusao': 1}
+NIVEIS_PADRAO = (1, 2, 4, 8)
+
+_FILE_ID = re.compile(r'data-file-id="([^"]+)"')
+# Intervalo entre as consultas ao status do job da análise (segundos)
+INTERVALO_JOB = 0.2
+
+
+class ClienteTeste:
+    """Transporte em processo: um test client do Flask (com seus cookies) por usuário virtual."""
+
+    def __init__(self, app):
+        self.cliente = app.test_client()
+
+    def requisitar(self, metodo, caminho, dados=None, json=None, arquivo=None):
+        if arquivo is not None:
+            dados = dict(dados or {}, file=(io.BytesIO(arquivo[1]), arquivo[0]))
+        resposta = self.cliente.open(caminho, method=metodo, data=dados, json=json,
+                                     content_type='multipart/form-data' if arquivo is not None else None)
+        return resposta.status_code, resposta.get_data()
+
+
+class ClienteHTTP:
+    """Transporte HTTP para um app já iniciado (ex.: ``flask run --with-threads`` ou gunicorn)."""
+
+    def __init__(self, url_base, timeout=600):
+        import requests
+        self.url_base = url_base.rstrip('/')
+        self.timeout = timeout
+        self.sessao = requests.Session()
+
+    def requisitar(self, metodo, caminho, dados=None, json=None, arquivo=None):
+        arquivos = {'file': (arquivo[0], arquivo[1])} if arquivo is not None else None
+        resposta = self.sessao.request(metodo, self.url_base + caminho, data=dados, json=json, files=arquivos,
+                                       timeout=self.timeout, allow_redirects=False)
+        return resposta.status_code, resposta.content
+
+
+@contextmanager
+def app_em_processo(pasta=None):
+    """O app do Flask com banco, uploads e caches em ``pasta`` (temporária por padrão) e sem rede.
+
+    A tradução usa o backend local e a busca de imagens aponta para uma porta fechada. Ao sair,
+    restaura a configuração e o banco originais do módulo.
+    """
+    import app as app_module
+    from database import Database
+    from traducao import TradutorLocal
+
+    with tempfile.TemporaryDirectory() as temporaria:
+        pasta = pasta or temporaria
+        app = app_module.app
+        chaves = ('UPLOAD_FOLDER', 'CACHE_FOLDER', 'TRADUCAO_BACKEND', 'IMAGENS_URL_BUSCA')
+        originais = ({chave: app.config.get(chave) for chave in chaves}, app_module.db,
+                     app_module._memoria_traducao, app_module._resolvedor_imagens, app_module._fila_jobs)
+        app.config.update(UPLOAD_FOLDER=os.path.join(pasta, 'uploads'), CACHE_FOLDER=os.path.join(pasta, 'cache'),
+                          TRADUCAO_BACKEND=TradutorLocal(), IMAGENS_URL_BUSCA='http://127.0.0.1:9/buscar')
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+        app_module.db = Database(os.path.join(pasta, 'carga.db'))
+        # A fila de jobs é a do banco temporário (as análises rodam nela)
+        app_module._memoria_traducao = app_module._resolvedor_imagens = app_module._fila_jobs = None
+        try:
+            yield app
+        finally:
+            if app_module._fila_jobs is not None:
+                app_module._fila_jobs.encerrar()
+            app_module.db.fechar()
+            (config, app_module.db, app_module._memoria_traducao, app_module._resolvedor_imagens,
+             app_module._fila_jobs) = originais
+            app.config.update(config)
+
+
+def _sucesso(status, corpo, esperado=(200,)):
+    if status not in esperado:
+        return False
+    if corpo[:1] == b'{':
+        try:
+            return json.loads(corpo).get('success', True) is not False
+        except ValueError:
+            return False
+    return True
+
+
+class UsuarioVirtual:
+    """Sessão de um usuário: login e depois operações sorteadas pelos pesos.
+
+    Cada usuário acompanha as próprias previsões (criadas pelo upload em ``/api/analises``) para
+    comparar produtos, baixar e excluir sem depender das dos outros.
+    """
+
+    def __init__(self, indice, cliente, planilha, produtos, registrar, formulario, usuario='admin', senha='123', semente=0):
+        self.indice = indice
+        self.cliente = cliente
+        self.planilha = planilha
+        self.produtos = produtos
+        self.registrar = registrar
+        self.formulario = formulario
+        self.credenciais = {'username': usuario, 'password': senha}
+        self.rng = random.Random(semente * 1000 + indice)
+        self.previsoes = []
+        self.uploads = 0
+
+    def _chamar(self, rota, metodo, caminho, esperado=(200,), **kwargs):
+        inicio = time.perf_counter()
+        try:
+            status, corpo = self.cliente.requisitar(metodo, caminho, **kwargs)
+        except Exception:
+            status, corpo = None, b''
+        ok = status is not None and _sucesso(status, corpo, esperado)
+        self.registrar(rota, time.perf_counter() - inicio, ok)
+        return corpo if ok else None
+
+    def login(self):
+        # Sucesso é o redirecionamento; a página de login de novo (200) é senha recusada
+        return self._chamar('POST /login', 'POST', '/login', esperado=(302,), dados=self.credenciais) is not None
+
+    def analise(self):
+        # Como o navegador: envia para a fila, acompanha o job e abre a página de resultados
+        self.uploads += 1
+        nome = f'carga_u{self.indice}_{self.uploads}.xlsx'
+        corpo = self._chamar('POST /api/analises', 'POST', '/api/analises', esperado=(202,),
+                             dados=dict(self.formulario), arquivo=(nome, self.planilha))
+        if corpo is None:
+            return
+        job_id = json.loads(corpo)['job_id']
+        inicio = time.perf_counter()
+        while True:
+            try:
+                status, corpo = self.cliente.requisitar('GET', f'/api/jobs/{job_id}')
+            except Exception:
+                status = None
+            job = json.loads(corpo)['job'] if status == 200 else {'status': 'erro'}
+            if job['status'] not in ('pendente', 'executando'):
+                break
+            time.sleep(INTERVALO_JOB)
+        # Do envio ao fim do job, com a espera na fila
+        self.registrar('job analise', time.perf_counter() - inicio, job['status'] == 'concluido')
+        if job['status'] != 'concluido':
+            return
+        pagina = self._chamar('GET /analise/<job_id>', 'GET', f'/analise/{job_id}')
+        tabela = self._chamar('GET /api/analise/<job_id>/<secao>', 'GET', f'/api/analise/{job_id}/tabela')
+        file_id = _FILE_ID.search(pagina.decode('utf-8', 'replace')) if pagina else None
+        forecast_id = json.loads(tabela).get('forecast_id') if tabela else None
+        # O id no histórico vem pelo filtro de nome (único por usuário e upload)
+        corpo = self._chamar('GET /api/historico/<tipo>', 'GET', f'/api/historico/previsoes?nome_arquivo={nome}&limite=1')
+        linhas = json.loads(corpo)['linhas'] if corpo else []
+        if file_id and forecast_id and linhas:
+            self.previsoes.append({'id': linhas[0][0], 'file_id': file_id.group(1), 'forecast_id': forecast_id})
+
+    def _previsao(self):
+        if not self.previsoes:
+            self.analise()
+        return self.rng.choice(self.previsoes) if self.previsoes else None
+
+    def comparacao(self):
+        previsao = self._previsao()
+        if previsao is None: return
+        produto_1, produto_2 = self.rng.sample(self.produtos, 2)
+        self._chamar('POST /api/compare_products', 'POST', '/api/compare_products',
+                     json={'product_1': produto_1, 'product_2': produto_2, 'file_id': previsao['file_id']})
+
+    def historico(self):
+        tipo = self.rng.choice(('previsoes', 'comparacoes'))
+        self._chamar('GET /api/historico/<tipo>', 'GET', f'/api/historico/{tipo}?limite=20')
+
+    def download(self):
+        previsao = self._previsao()
+        if previsao is None: return
+        formato = self.rng.choice(('csv', 'xlsx'))
+        self._chamar(f'GET /download/{formato}/<file_id>', 'GET', f"/download/{formato}/{previsao['forecast_id']}")
+
+    def exclusao(self):
+        # Só exclui previsões próprias e mantém uma, para as comparações e downloads seguintes
+        if len(self.previsoes) < 2:
+            self.analise()
+            return
+        previsao = self.previsoes.pop(0)
+        self._chamar('POST /api/delete_previsao/<id>', 'POST', f"/api/delete_previsao/{previsao['id']}")
+
+
+def _percentil(valores, p):
+    return float(np.percentile(valores, p)) * 1000 if valores else None
+
+
+def resumir(registros, segundos):
+    """Por rota (e no total): requisições, vazão (req/s), taxa de erros e latências p50/p95/p99 (ms)."""
+    por_rota = {}
+    for rota, duracao, ok in registros:
+        por_rota.setdefault(rota, []).append((duracao, ok))
+    por_rota['total'] = [(duracao, ok) for _, duracao, ok in registros]
+    resumo = {}
+    for rota, medidas in por_rota.items():
+        duracoes = [duracao for duracao, _ in medidas]
+        erros = sum(1 for _, ok in medidas if not ok)
+        resumo[rota] = {'requisicoes': len(medidas), 'erros': erros,
+                        'taxa_erros': erros / len(medidas) if medidas else 0.0,
+                        'vazao': len(medidas) / segundos if segundos else 0.0,
+                        'p50_ms': _percentil(duracoes, 50), 'p95_ms': _percentil(duracoes, 95),
+                        'p99_ms': _percentil(duracoes, 99)}
+    return resumo
+
+
+def executar_carga(fabrica_cliente, usuarios, duracao=30.0, iteracoes=None, pesos=None, planilhas=None,
+                   produtos=None, formulario=None, semente=0):
+    """Roda ``usuarios`` usuários virtuais em paralelo (uma thread cada) e resume as latências.
+
+    Cada usuário faz login e repete operações sorteadas por ``pesos`` até ``duracao``
+    segundos ou ``iteracoes`` operações. ``fabrica_cliente()`` cria o transporte de cada
+    usuário; ``planilhas`` (bytes XLSX) são distribuídas entre os usuários.
+    """
+    pesos = pesos or PESOS_PADRAO
+    operacoes, pesos_lista = list(pesos), [pesos[op] for op in pesos]
+    registros, lock = [], threading.Lock()
+
+    def registrar(rota, segundos, ok):
+        with lock:
+            registros.append((rota, segundos, ok))
+
+    def sessao(indice):
+        usuario = UsuarioVirtual(indice, fabrica_cliente(), planilhas[indice % len(planilhas)], produtos,
+                                 registrar, formulario or {}, semente=semente)
+        if not usuario.login():
+            return
+        feitas = 0
+        while (iteracoes is None or feitas < iteracoes) and (duracao is None or time.perf_counter() < fim):
+            getattr(usuario, usuario.rng.choices(operacoes, weights=pesos_lista)[0])()
+            feitas += 1
+
+    inicio = time.perf_counter()
+    fim = inicio + duracao if duracao is not None else None
+    threads = [threading.Thread(target=sessao, args=(i,), name=f'usuario-{i}') for i in range(usuarios)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    return resumir(registros, time.perf_counter() - inicio)
+
+
+def curva_saturacao(fabrica_cliente, niveis=NIVEIS_PADRAO, **kwargs):
+    """``executar_carga`` em cada nível de concorrência; retorna ``[{'usuarios', 'resumo'}]``."""
+    return [{'usuarios': usuarios, 'resumo': executar_carga(fabrica_cliente, usuarios, **kwargs)} for usuarios in niveis]
+
+
+def joelho(curva, ganho_minimo=0.1, piora_p95=1.5):
+    """Primeiro nível em que a vazão total cresce menos que ``ganho_minimo`` e o p95 piora
+    mais que ``piora_p95`` vezes em relação ao nível anterior (``None`` se não saturou)."""
+    for anterior, atual in zip(curva, curva[1:]):
+        a, b = anterior['resumo']['total'], atual['resumo']['total']
+        if b['vazao'] < a['vazao'] * (1 + ganho_minimo) and (b['p95_ms'] or 0) > (a['p95_ms'] or 0) * piora_p95:
+            return atual['usuarios']
+    return None
+
+
+def planilhas_de_carga(quantidade=4, linhas=5000, produtos=20, meses=36, semente=0):
+    """``quantidade`` planilhas XLSX diferentes (sementes seguidas) e os produtos mais vendidos.
+
+    Planilhas distintas evitam que todos os uploads caiam no mesmo blob e nos mesmos caches.
+    """
+    arquivos, mais_vendidos = [], None
+    with tempfile.TemporaryDirectory() as pasta:
+        for i in range(quantidade):
+            df = gerar_faturamento(linhas, produtos, clientes=max(produtos * 2, 10), meses=meses, semente=semente + i)
+            if mais_vendidos is None:
+                mais_vendidos = df.groupby('DESCRIÇÃO MATERIAL', observed=True)['VALOR TOTAL'].sum().nlargest(10).index.tolist()
+            caminho = gravar_planilha(df, os.path.join(pasta, f'carga_{i}.xlsx'))
+            with open(caminho, 'rb') as f:
+                arquivos.append(f.read())
+    return arquivos, [str(p) for p in mais_vendidos]
+
+
+def _imprimir(resumo, echo):
+    echo(f"{'rota':<34} {'req':>6} {'req/s':>7} {'erros':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for rota, r in sorted(resumo.items(), key=lambda item: item[0] == 'total'):
+        echo(f"{rota:<34} {r['requisicoes']:>6} {r['vazao']:>7.2f} {r['taxa_erros']:>6.1%} "
+             f"{r['p50_ms'] or 0:>9.0f} {r['p95_ms'] or 0:>9.0f} {r['p99_ms'] or 0:>9.0f}")
+
+
+@click.command()
+@click.option('--url', default=None, help='App já iniciado (ex.: http://127.0.0.1:5000); sem ele, roda em processo.')
+@click.option('--usuarios', default=','.join(map(str, NIVEIS_PADRAO)), show_default=True,
+              help='Níveis de concorrência da curva de saturação, separados por vírgula.')
+@click.option('--duracao', default=30.0, show_default=True, help='Segundos por nível.')
+@click.option('--pesos', default=','.join(f'{op}={peso}' for op, peso in PESOS_PADRAO.items()), show_default=True,
+              help='Mistura de operações (analise, comparacao, historico, download, exclusao).')
+@click.option('--linhas', default=5000, show_default=True, help='Linhas de cada planilha enviada.')
+@click.option('--produtos', default=20, show_default=True, help='Produtos de cada planilha enviada.')
+@click.option('--planilhas', default=4, show_default=True, help='Quantas planilhas diferentes os usuários enviam.')
+@click.option('--modelo', default='prophet', show_default=True, help='modelo_tipo do formulário de análise.')
+@click.option('--saida', default=None, help='Grava a curva completa em JSON.')
+def main(url, usuarios, duracao, pesos, linhas, produtos, planilhas, modelo, saida):
+    """Gera carga com uma mistura realista de rotas e mede a saturação por concorrência."""
+    pesos = {op: float(peso) for op, peso in (par.split('=') for par in pesos.split(','))}
+    desconhecidas = set(pesos) - set(PESOS_PADRAO)
+    if desconhecidas:
+        raise click.BadParameter(f"operações desconhecidas: {', '.join(sorted(desconhecidas))}", param_hint='--pesos')
+    arquivos, mais_vendidos = planilhas_de_carga(planilhas, linhas, produtos)
+    parametros = dict(duracao=duracao, pesos=pesos, planilhas=arquivos, produtos=mais_vendidos,
+                      formulario={'modelo_tipo': modelo, 'periodos_forecast': '12'})
+    niveis = [int(n) for n in usuarios.split(',')]
+
+    def medir(fabrica):
+        curva = []
+        for nivel in niveis:
+            click.echo(f"\n--- {nivel} usuário(s) simultâneo(s), {duracao:.0f} s ---")
+            curva.append({'usuarios': nivel, 'resumo': executar_carga(fabrica, nivel, **parametros)})
+            _imprimir(curva[-1]['resumo'], click.echo)
+        return curva
+
+    if url:
+        curva = medir(lambda: ClienteHTTP(url))
+    else:
+        with app_em_processo() as app:
+            curva = medir(lambda: ClienteTeste(app))
+
+    click.echo(f"\n{'usuários':>9} {'req/s':>8} {'p95 ms':>9} {'p99 ms':>9} {'erros':>7}")
+    for ponto in curva:
+        total = ponto['resumo']['total']
+        click.echo(f"{ponto['usuarios']:>9} {total['vazao']:>8.2f} {total['p95_ms'] or 0:>9.0f} "
+                   f"{total['p99_ms'] or 0:>9.0f} {total['taxa_erros']:>6.1%}")
+    saturacao = joelho(curva)
+    click.echo(f"Saturação a partir de {saturacao} usuários." if saturacao else "Sem saturação nos níveis medidos.")
+    if saida:
+        with open(saida, 'w', encoding='utf-8') as f:
+            json.dump({'niveis': curva, 'saturacao': saturacao}, f, ensure_ascii=False, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.gerador import arquivo_cenario
+from instrumentacao import REGISTRO, pico_rss
+
+
+# Cenários: tamanho da planilha (linhas, produtos, clientes, meses de histórico) e formato
+CENARIOS = {
+    'pequeno': {'linhas': 10_000, 'produtos': 10, 'clientes': 50, 'meses': 36, 'formato': 'xlsx'},
+    'medio': {'linhas': 100_000, 'produtos': 500, 'clientes': 1_000, 'meses': 48, 'formato': 'xlsx'},
+    'medio_csv': {'linhas': 100_000, 'produtos': 500, 'clientes': 1_000, 'meses': 48, 'formato': 'csv'},
+    'historico_longo': {'linhas': 100_000, 'produtos': 50, 'clientes': 200, 'meses': 120, 'formato': 'csv'},
+    'muitos_clientes': {'linhas': 200_000, 'produtos': 200, 'clientes': 50_000, 'meses': 36, 'formato': 'csv'},
+    'grande': {'linhas': 1_000_000, 'produtos': 5_000, 'clientes': 20_000, 'meses': 60, 'formato': 'csv'},
+    'grande_xlsx': {'linhas': 1_000_000, 'produtos': 5_000, 'clientes': 20_000, 'meses': 60, 'formato': 'xlsx'},
+}
+PADRAO = ('pequeno', 'medio')
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PASTA_DADOS = os.path.join(tempfile.gettempdir(), 'sohipren_benchmarks')
+HISTORICO = os.path.join(RAIZ, 'benchmarks', 'historico.json')
+ORCAMENTOS = os.path.join(RAIZ, 'benchmarks', 'orcamentos.json')
+
+
+def _medir(passos, nome, funcao):
+    """Executa um passo e guarda o tempo, o RSS máximo do processo e as etapas instrumentadas."""
+    REGISTRO.drenar()
+    inicio = time.perf_counter()
+    funcao()
+    segundos = time.perf_counter() - inicio
+    etapas = {dict(rotulos)['etapa']: round(valores[-1], 4)
+              for metrica, rotulos, valores in REGISTRO.drenar()['histogramas'] if metrica == 'sohipren_etapa_segundos'}
+    passos[nome] = {'segundos': round(segundos, 4), 'pico_rss_bytes': pico_rss(), 'etapas': etapas}
+    print(f"   [benchmark] {nome}: {segundos:.3f} s")
+
+
+def executar_passos(arquivo, pasta_trabalho):
+    """Passos do pipeline sobre ``arquivo``, sem caches (a frio) e sem rede.
+
+    A tradução passa pela memória de traduções com o backend local (como no idioma 'en'
+    do app) e a busca de imagens da comparação aponta para uma porta fechada, então as
+    conexões são recusadas na hora, como nos testes.
+    """
+    from faturamento_forecast_class import FaturamentoForecast
+    from imagens import ResolvedorImagens
+    from traducao import MemoriaTraducao, TradutorLocal
+
+    memoria = MemoriaTraducao(os.path.join(pasta_trabalho, 'traducoes.db'), backend=TradutorLocal())
+    resolvedor = ResolvedorImagens(os.path.join(pasta_trabalho, 'imagens.db'), url_busca='http://127.0.0.1:9/buscar')
+    forecast = FaturamentoForecast(arquivo, 'EMISSÃO', 'VALOR TOTAL', 'DESCRIÇÃO MATERIAL', 'RAZÃO SOCIAL CLIENTE',
+                                   translator=lambda texto: memoria.traduzir(texto, 'en'))
+
+    passos = {}
+    _medir(passos, 'carregar_dados', forecast.carregar_dados)
+    _medir(passos, 'agregar_dados', forecast.agregar_dados)
+    _medir(passos, 'treinar_modelo_prophet', lambda: forecast.treinar_modelo_prophet(dados_teste_ratio=0.2))
+    _medir(passos, 'fazer_previsao_futura_prophet', lambda: forecast.fazer_previsao_futura_prophet(periodos=12))
+
+    def comparar():
+        produtos = list(forecast._totais_produto().nlargest(2).index)
+        buscas = resolvedor.agendar(produtos)
+        forecast.comparar_previsao_produtos(*produtos)
+        ResolvedorImagens.coletar(buscas)
+    _medir(passos, 'comparar_previsao_produtos', comparar)
+    return passos
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def medir_cenario(nome, pasta_dados=PASTA_DADOS, semente=0):
+    """Gera (ou reaproveita) o arquivo do cenário e mede os passos em um processo novo.
+
+    O processo novo isola o RSS máximo de cada cenário e os imports a frio.
+    """
+    parametros = dict(CENARIOS[nome])
+    formato = parametros.pop('formato')
+    inicio = time.perf_counter()
+    arquivo = arquivo_cenario(pasta_dados, formato=formato, semente=semente, **parametros)
+    geracao = time.perf_counter() - inicio
+
+    with tempfile.TemporaryDirectory() as pasta_trabalho:
+        saida = os.path.join(pasta_trabalho, 'resultado.json')
+        processo = subprocess.run([sys.executable, '-m', 'benchmarks.executar', arquivo, pasta_trabalho, saida],
+                                  cwd=RAIZ, capture_output=True, text=True)
+        if processo.returncode != 0:
+            raise RuntimeError(f"Falha no cenário '{nome}':\n{processo.stderr[-2000:]}")
+        with open(saida, encoding='utf-8') as f:
+            passos = json.load(f)
+
+    return {'cenario': nome, 'parametros': CENARIOS[nome], 'semente': semente,
+            'data': datetime.now().isoformat(timespec='seconds'), 'commit': _commit(),
+            'python': platform.python_version(), 'plataforma': platform.platform(),
+            'geracao_segundos': round(geracao, 3), 'passos': passos}
+
+
+def registrar_historico(resultados, caminho=HISTORICO):
+    """Acrescenta os resultados ao histórico em JSON (uma lista de execuções)."""
+    historico = []
+    if os.path.exists(caminho):
+        with open(caminho, encoding='utf-8') as f:
+            historico = json.load(f)
+    historico.extend(resultados)
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(historico, f, ensure_ascii=False, indent=1)
+
+
+def carregar_orcamentos(caminho=ORCAMENTOS):
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def verificar_orcamentos(resultado, orcamentos):
+    """Passos do resultado acima do orçamento do cenário (tempo em s, pico de RSS em MB).
+
+    Retorna uma lista de mensagens; passos ou cenários sem orçamento não são cobrados.
+    """
+    violacoes = []
+    orcamento_cenario = orcamentos.get(resultado['cenario'], {})
+    for passo, medido in resultado['passos'].items():
+        limite = orcamento_cenario.get(passo)
+        if not limite:
+            continue
+        if 'segundos' in limite and medido['segundos'] > limite['segundos']:
+            violacoes.append(f"{resultado['cenario']}/{passo}: {medido['segundos']:.2f} s > orçamento de {limite['segundos']:.2f} s")
+        pico_mb = (medido.get('pico_rss_bytes') or 0) / 2 ** 20
+        if 'pico_rss_mb' in limite and pico_mb > limite['pico_rss_mb']:
+            violacoes.append(f"{resultado['cenario']}/{passo}: {pico_mb:.0f} MB > orçamento de {limite['pico_rss_mb']:.0f} MB")
+    return violacoes
+
+
+# Orçamento mínimo de tempo por passo; abaixo disso a medição é só ruído do relógio
+PISO_SEGUNDOS = 0.1
+
+
+def orcamentos_de(resultados, margem=1.5, orcamentos=None):
+    """Orçamentos a partir de uma execução: o medido vezes ``margem``, somado aos já existentes."""
+    orcamentos = {cenario: dict(passos) for cenario, passos in (orcamentos or {}).items()}
+    for resultado in resultados:
+        orcamentos[resultado['cenario']] = {
+            passo: {'segundos': max(round(medido['segundos'] * margem, 2), PISO_SEGUNDOS),
+                    **({'pico_rss_mb': round((medido['pico_rss_bytes'] / 2 ** 20) * margem)} if medido.get('pico_rss_bytes') else {})}
+            for passo, medido in resultado['passos'].items()}
+    return orcamentos
+
+
+if __name__ == '__main__':
+    # Processo filho de medir_cenario: arquivo, pasta de trabalho e caminho do JSON de saída
+    arquivo, pasta_trabalho, saida = sys.argv[1:4]
+    resultado = executar_passos(arquivo, pasta_trabalho)
+    with open(saida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f)
@@ -0,0 +1,102 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+
+# Colunas no formato das planilhas de faturamento (as quatro primeiras são as do formulário)
+COLUNAS = ('EMISSÃO', 'VALOR TOTAL', 'DESCRIÇÃO MATERIAL', 'RAZÃO SOCIAL CLIENTE',
+           'NOTA FISCAL', 'QUANTIDADE', 'VALOR UNITÁRIO')
+
+# Muda quando a distribuição gerada muda, para não reaproveitar arquivos antigos
+VERSAO_GERADOR = 1
+
+
+def _popularidade(n, expoente, rng):
+    """Pesos do tipo Zipf (poucos itens concentram o volume), em ordem aleatória."""
+    pesos = 1.0 / np.arange(1, n + 1) ** expoente
+    return rng.permutation(pesos / pesos.sum())
+
+
+def gerar_faturamento(linhas, produtos, clientes=200, meses=36, inicio='2021-01-01', semente=0):
+    """Notas de faturamento sintéticas e reprodutíveis (mesma ``semente``, mesmo resultado).
+
+    A venda por produto segue uma popularidade do tipo Zipf (cauda longa de itens com
+    vendas esporádicas); cada produto tem preço, tendência, amplitude e fase da
+    sazonalidade anual próprios, e parte dos produtos é lançada ou descontinuada no meio
+    do período, o que dá históricos de tamanhos diferentes. Os clientes também seguem uma
+    popularidade do tipo Zipf. Linhas ordenadas pela data de emissão.
+    """
+    rng = np.random.default_rng(semente)
+    linhas, produtos, clientes, meses = int(linhas), int(produtos), int(clientes), int(meses)
+
+    preco = rng.lognormal(mean=4.0, sigma=1.0, size=produtos)
+    tendencia = rng.normal(0.005, 0.02, size=produtos)
+    amplitude = rng.uniform(0.0, 0.6, size=produtos)
+    fase = rng.uniform(0, 12, size=produtos)
+    lancamento = np.where(rng.random(produtos) < 0.25, rng.integers(0, max(meses // 2, 1), produtos), 0)
+    descontinuado = np.where(rng.random(produtos) < 0.1, rng.integers(meses // 2, meses, produtos) + 1, meses)
+    descontinuado = np.maximum(descontinuado, lancamento + 1)
+
+    # Peso de cada mês para cada produto: tendência x sazonalidade, zero fora do período de venda
+    t = np.arange(meses)
+    pesos_meses = (1 + tendencia[:, None]) ** t[None, :] * (1 + amplitude[:, None] * np.sin(2 * np.pi * (t[None, :] + fase[:, None]) / 12))
+    pesos_meses *= (t[None, :] >= lancamento[:, None]) & (t[None, :] < descontinuado[:, None])
+    pesos_meses /= pesos_meses.sum(axis=1, keepdims=True)
+
+    produto = rng.choice(produtos, size=linhas, p=_popularidade(produtos, 1.1, rng))
+    mes = np.empty(linhas, dtype='int64')
+    # Sorteio do mês produto a produto (agrupado), para não montar uma matriz linhas x meses
+    ordem = np.argsort(produto, kind='stable')
+    contagens = np.bincount(produto, minlength=produtos)
+    fim = np.cumsum(contagens)
+    for p in np.flatnonzero(contagens):
+        mes[ordem[fim[p] - contagens[p]:fim[p]]] = rng.choice(meses, size=contagens[p], p=pesos_meses[p])
+
+    inicios_meses = pd.date_range(inicio, periods=meses, freq='MS')
+    dias = (rng.random(linhas) * inicios_meses.days_in_month.to_numpy()[mes]).astype('int64')
+    emissao = inicios_meses.to_numpy()[mes] + dias.astype('timedelta64[D]')
+    cliente = rng.choice(clientes, size=linhas, p=_popularidade(clientes, 1.0, rng))
+    quantidade = 1 + rng.poisson(3, size=linhas)
+    unitario = np.round(preco[produto] * rng.lognormal(0, 0.05, size=linhas), 2)
+
+    df = pd.DataFrame({
+        'EMISSÃO': emissao,
+        'VALOR TOTAL': np.round(quantidade * unitario, 2),
+        'DESCRIÇÃO MATERIAL': pd.Categorical.from_codes(produto, [f'MATERIAL {i:05d}' for i in range(produtos)]),
+        'RAZÃO SOCIAL CLIENTE': pd.Categorical.from_codes(cliente, [f'CLIENTE {j:05d} LTDA' for j in range(clientes)]),
+        'QUANTIDADE': quantidade,
+        'VALOR UNITÁRIO': unitario,
+    }).sort_values('EMISSÃO', kind='stable', ignore_index=True)
+    df['NOTA FISCAL'] = np.arange(100001, 100001 + linhas)
+    return df[list(COLUNAS)]
+
+
+def gravar_planilha(df, caminho):
+    """Grava ``.csv`` (``;``, vírgula decimal e datas dd/mm/aaaa, como os exports do ERP) ou ``.xlsx``."""
+    if caminho.lower().endswith('.csv'):
+        df.to_csv(caminho, sep=';', decimal=',', index=False, date_format='%d/%m/%Y', encoding='utf-8')
+        return caminho
+    from openpyxl import Workbook
+    # Modo write_only grava em streaming; com o pandas, 1M de linhas passaria de vários GB de memória
+    wb = Workbook(write_only=True)
+    planilha = wb.create_sheet('FATURAMENTO')
+    planilha.append(list(df.columns))
+    # astype(object) dá Timestamps (subclasse de datetime), que o openpyxl grava como data
+    colunas = [df[c].astype(object).to_numpy() for c in df.columns]
+    for linha in zip(*colunas):
+        planilha.append(list(linha))
+    wb.save(caminho)
+    return caminho
+
+
+def arquivo_cenario(pasta, formato='xlsx', semente=0, **parametros):
+    """Caminho do arquivo do cenário em ``pasta``, gerado só se ainda não existir."""
+    os.makedirs(pasta, exist_ok=True)
+    partes = '_'.join(f'{chave}{parametros[chave]}' for chave in sorted(parametros))
+    caminho = os.path.join(pasta, f'faturamento_v{VERSAO_GERADOR}_{partes}_s{semente}.{formato}')
+    if not os.path.exists(caminho):
+        temporario = caminho + '.parcial.' + formato
+        gravar_planilha(gerar_faturamento(semente=semente, **parametros), temporario)
+        os.replace(temporario, caminho)
+    return caminho
@@ -0,0 +1,311 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# Arquivos de trava abertos neste processo. Um processo criado por fork (ex.: os pools de ajuste
+# dentro de um job) herdaria a trava com o descritor e a manteria enquanto vivesse; o filho fecha sua cópia.
+_travas_abertas = set()
+
+
+def _fechar_travas_herdadas():
+    for arquivo in list(_travas_abertas):
+        arquivo.close()
+    _travas_abertas.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_fechar_travas_herdadas)
+
+
+def _tentar_travar(arquivo):
+    """Trava exclusiva e não bloqueante sobre ``arquivo``; o sistema a libera quando o arquivo é fechado
+    (inclusive se o processo morrer no meio da gravação)."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(arquivo.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _dtype_codigos(n_categorias):
+    """Menor inteiro que comporta os códigos, o mesmo que o pandas usa internamente; gravados
+    nesse tipo, os códigos mapeados entram no ``Categorical`` sem cópia."""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categorias < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+class CacheDados:
+    """Cache colunar dos dados já tratados de cada planilha enviada.
+
+    Cada entrada é um diretório com uma coluna por arquivo ``.npy`` (datas já em
+    ``datetime64``, valores já numéricos e textos codificados como categorias), de
+    forma que as leituras seguintes mapeiam os arquivos em memória em vez de
+    decodificar o XLSX novamente.
+
+    O diretório é compartilhado pelos workers do mesmo servidor: as páginas mapeadas
+    ficam no cache do sistema operacional, então vários processos usam a mesma cópia
+    dos dados. ``trava(chave)`` garante que só um processo monta cada entrada enquanto
+    os outros esperam por ela.
+    """
+
+    TAMANHO_BLOCO = 1024 * 1024
+    # Tempo máximo de espera por outro processo montando a mesma entrada; depois disso monta também
+    ESPERA_MAXIMA = 600
+    INTERVALO_ESPERA = 0.05
+
+    def __init__(self, diretorio, max_bytes=512 * 1024 * 1024, max_idade=7 * 24 * 3600):
+        self.diretorio = diretorio
+        self.max_bytes = max_bytes
+        self.max_idade = max_idade
+        os.makedirs(self.diretorio, exist_ok=True)
+
+    @classmethod
+    def hash_conteudo(cls, file_input):
+        """Calcula o SHA-256 do arquivo (caminho ou BytesIO) lendo em blocos."""
+        sha = hashlib.sha256()
+        if isinstance(file_input, io.BytesIO):
+            posicao = file_input.tell()
+            file_input.seek(0)
+            for bloco in iter(lambda: file_input.read(cls.TAMANHO_BLOCO), b''):
+                sha.update(bloco)
+            file_input.seek(posicao)
+        else:
+            with open(file_input, 'rb') as f:
+                for bloco in iter(lambda: f.read(cls.TAMANHO_BLOCO), b''):
+                    sha.update(bloco)
+        return sha.hexdigest()
+
+    @staticmethod
+    def gerar_chave(file_id, hash_conteudo, colunas):
+        """Chave da entrada: arquivo, conteúdo e mapeamento de colunas escolhido."""
+        colunas_normalizadas = {k: (v or '').strip().lower() for k, v in colunas.items()}
+        base = json.dumps({'file_id': file_id, 'hash': hash_conteudo, 'colunas': colunas_normalizadas}, sort_keys=True)
+        return hashlib.sha256(base.encode('utf-8')).hexdigest()
+
+    def _caminho(self, chave):
+        return os.path.join(self.diretorio, chave)
+
+    def _caminho_trava(self, nome):
+        pasta = os.path.join(self.diretorio, 'travas')
+        os.makedirs(pasta, exist_ok=True)
+        return os.path.join(pasta, f'{nome}.lock')
+
+    @contextmanager
+    def trava(self, chave, espera=None):
+        """Trava exclusiva entre processos para montar a entrada ``chave``.
+
+        Retorna ``True`` se a trava foi obtida, ou ``False`` se outro processo a manteve
+        por mais de ``espera`` segundos (``ESPERA_MAXIMA`` por padrão); ``espera=0`` não espera.
+        """
+        espera = self.ESPERA_MAXIMA if espera is None else espera
+        limite = time.monotonic() + espera
+        with open(self._caminho_trava(chave), 'a+b') as arquivo:
+            _travas_abertas.add(arquivo)
+            try:
+                obtida = _tentar_travar(arquivo)
+                while not obtida and time.monotonic() < limite:
+                    time.sleep(self.INTERVALO_ESPERA)
+                    obtida = _tentar_travar(arquivo)
+                if obtida:
+                    os.utime(arquivo.name, None)
+                else:
+                    print(f"   AVISO: tempo de espera pela entrada de cache esgotado ({chave}).")
+                yield obtida
+            finally:
+                _travas_abertas.discard(arquivo)
+
+    def carregar(self, chave):
+        """Retorna ``(df, colunas)`` mapeando a entrada em memória, ou ``None`` se não existir."""
+        caminho = self._caminho(chave)
+        meta_path = os.path.join(caminho, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            dados = {}
+            for i, info in enumerate(meta['campos']):
+                arr = np.load(os.path.join(caminho, f'{i}.npy'), mmap_mode='r')
+                if info['tipo'] == 'categoria':
+                    dados[info['nome']] = pd.Categorical.from_codes(arr, categories=info['categorias'])
+                else:
+                    dados[info['nome']] = arr
+            df = pd.DataFrame(dados, copy=False)
+            # Marca o último acesso para a política de expiração
+            os.utime(meta_path, None)
+            return df, meta['colunas']
+        except Exception as e:
+            print(f"   AVISO: entrada de cache inválida ({chave}): {e}")
+            shutil.rmtree(caminho, ignore_errors=True)
+            return None
+
+    def salvar(self, chave, df, colunas):
+        """Grava o DataFrame tratado em formato colunar. ``colunas`` mapeia papel -> nome real."""
+        tmp = os.path.join(self.diretorio, f'tmp-{uuid.uuid4().hex}')
+        os.makedirs(tmp)
+        try:
+            campos = []
+            for i, (papel, nome) in enumerate(colunas.items()):
+                serie = df[nome]
+                if papel == 'data':
+                    arr = serie.to_numpy(dtype='datetime64[ns]')
+                    info = {'nome': nome, 'tipo': 'data'}
+                elif papel == 'valor':
+                    arr = serie.to_numpy(dtype='float64')
+                    info = {'nome': nome, 'tipo': 'valor'}
+                else:
+                    cat = pd.Categorical(serie)
+                    arr = cat.codes
+                    info = {'nome': nome, 'tipo': 'categoria', 'categorias': cat.categories.tolist()}
+                np.save(os.path.join(tmp, f'{i}.npy'), arr)
+                campos.append(info)
+            self._finalizar(tmp, chave, colunas, campos)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        self.limpar()
+
+    def _finalizar(self, tmp, chave, colunas, campos):
+        """Grava ``meta.json`` (com o tamanho da entrada, usado na limpeza) e publica a entrada."""
+        tamanho = sum(e.stat().st_size for e in os.scandir(tmp) if e.is_file())
+        with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'colunas': colunas, 'campos': campos, 'criado_em': time.time(), 'bytes': tamanho}, f, default=str)
+        try:
+            os.rename(tmp, self._caminho(chave))
+        except OSError:
+            # Outro processo gravou a mesma entrada primeiro
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def salvar_blocos(self, chave, blocos, descrever):
+        """Versão em streaming de ``salvar`` para blocos já tipados (ver ingestao.LeitorPlanilha).
+
+        ``blocos`` gera dicionários papel -> array (datas ``datetime64[ns]``, valores ``float64``
+        e códigos ``int32``); ``descrever()`` é chamado no fim e retorna ``(colunas, categorias)``.
+        Cada coluna é anexada a um arquivo bruto e só ao final ganha o cabeçalho ``.npy``, de modo
+        que a memória usada não depende do tamanho da planilha.
+        """
+        tmp = os.path.join(self.diretorio, f'tmp-{uuid.uuid4().hex}')
+        os.makedirs(tmp)
+        try:
+            brutos, tipos, total = {}, {}, 0
+            try:
+                for bloco in blocos:
+                    for papel, arr in bloco.items():
+                        if papel not in brutos:
+                            brutos[papel] = open(os.path.join(tmp, f'{papel}.bin'), 'wb')
+                            tipos[papel] = arr.dtype
+                        brutos[papel].write(np.ascontiguousarray(arr, dtype=tipos[papel]).tobytes())
+                    total += len(bloco['data'])
+            finally:
+                for f in brutos.values(): f.close()
+            if total == 0:
+                raise ValueError("Nenhuma linha com data válida no arquivo.")
+
+            colunas, categorias = descrever()
+            campos = []
+            for i, (papel, nome) in enumerate(colunas.items()):
+                bruto = os.path.join(tmp, f'{papel}.bin')
+                destino_dtype = tipos[papel]
+                if papel not in ('data', 'valor'):
+                    destino_dtype = _dtype_codigos(len(categorias[papel]))
+                with open(os.path.join(tmp, f'{i}.npy'), 'wb') as destino:
+                    np.lib.format.write_array_header_1_0(destino, {
+                        'descr': np.lib.format.dtype_to_descr(destino_dtype), 'fortran_order': False, 'shape': (total,)})
+                    with open(bruto, 'rb') as origem:
+                        if destino_dtype == tipos[papel]:
+                            shutil.copyfileobj(origem, destino, self.TAMANHO_BLOCO)
+                        else:
+                            # Códigos reduzidos ao tipo do pandas bloco a bloco
+                            passo = self.TAMANHO_BLOCO // tipos[papel].itemsize * tipos[papel].itemsize
+                            for bloco in iter(lambda: origem.read(passo), b''):
+                                destino.write(np.frombuffer(bloco, dtype=tipos[papel]).astype(destino_dtype).tobytes())
+                os.remove(bruto)
+                if papel in ('data', 'valor'):
+                    campos.append({'nome': nome, 'tipo': papel})
+                else:
+                    campos.append({'nome': nome, 'tipo': 'categoria', 'categorias': categorias[papel]})
+            self._finalizar(tmp, chave, colunas, campos)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        self.limpar()
+
+    def remover(self, chave):
+        shutil.rmtree(self._caminho(chave), ignore_errors=True)
+
+    def limpar(self):
+        """Remove entradas sem acesso há mais de ``max_idade`` e, depois, as menos usadas até caber em ``max_bytes``.
+
+        Só um processo limpa por vez; os demais seguem sem esperar. Entradas removidas
+        enquanto outro processo as mapeia continuam válidas para ele até serem fechadas.
+        """
+        with self.trava('limpeza', espera=0) as obtida:
+            if obtida:
+                self._limpar()
+
+    def _limpar(self):
+        agora = time.time()
+        entradas = []
+        for nome in os.listdir(self.diretorio):
+            caminho = os.path.join(self.diretorio, nome)
+            meta_path = os.path.join(caminho, 'meta.json')
+            if not os.path.isdir(caminho):
+                continue
+            if not os.path.exists(meta_path):
+                # Sobras de gravações interrompidas
+                if nome.startswith('tmp-') and agora - os.path.getmtime(caminho) > 3600:
+                    shutil.rmtree(caminho, ignore_errors=True)
+                continue
+            ultimo_acesso = os.path.getmtime(meta_path)
+            if agora - ultimo_acesso > self.max_idade:
+                shutil.rmtree(caminho, ignore_errors=True)
+                continue
+            try:
+                with open(meta_path, encoding='utf-8') as f:
+                    tamanho = json.load(f)['bytes']
+            except (OSError, ValueError, KeyError):
+                # Entradas gravadas antes do tamanho ir para o meta.json
+                tamanho = sum(e.stat().st_size for e in os.scandir(caminho) if e.is_file())
+            entradas.append((ultimo_acesso, tamanho, caminho))
+
+        total = sum(tamanho for _, tamanho, _ in entradas)
+        for _, tamanho, caminho in sorted(entradas):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(caminho, ignore_errors=True)
+            total -= tamanho
+
+        # Travas de entradas que já não existem (e que ninguém está usando)
+        pasta_travas = os.path.join(self.diretorio, 'travas')
+        for nome in os.listdir(pasta_travas):
+            chave = nome[:-len('.lock')]
+            caminho = os.path.join(pasta_travas, nome)
+            if chave == 'limpeza' or os.path.exists(self._caminho(chave)) or agora - os.path.getmtime(caminho) < 3600:
+                continue
+            with open(caminho, 'a+b') as arquivo:
+                if not _tentar_travar(arquivo):
+                    continue
+                try:
+                    os.remove(caminho)
+                except OSError:
+                    pass
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import sqlite3
+import uuid
+
+import numpy as np
+
+
+class CacheModelos:
+    """Cache de modelos Prophet já ajustados, serializados em JSON no disco.
+
+    A chave combina o hash da série agregada (datas e valores) com todos os parâmetros
+    do ajuste; um acerto pula o ajuste do Stan e vai direto para o ``predict``. A remoção
+    segue a ordem de uso (LRU) até o total caber em ``max_bytes``. Os contadores de
+    acertos/erros ficam em um SQLite no próprio diretório, para somar todos os processos.
+
+    Ajustes identificados por ``serie`` (ex.: o produto) lembram o último modelo da série;
+    quando a série muda (novos meses), o novo ajuste parte dos parâmetros desse modelo
+    (*warm start*) em vez do chute inicial padrão do Prophet.
+    """
+
+    def __init__(self, diretorio, max_bytes=256 * 1024 * 1024):
+        self.diretorio = diretorio
+        self.max_bytes = max_bytes
+        os.makedirs(self.diretorio, exist_ok=True)
+        self._db_contadores = os.path.join(self.diretorio, 'contadores.db')
+
+    @staticmethod
+    def gerar_chave(df_prophet, parametros):
+        """Hash das colunas ``ds``/``y`` e dos parâmetros do ajuste."""
+        import prophet
+        sha = hashlib.sha256()
+        sha.update(df_prophet['ds'].to_numpy(dtype='datetime64[ns]').view('int64').tobytes())
+        sha.update(np.ascontiguousarray(df_prophet['y'].to_numpy(dtype='float64')).tobytes())
+        sha.update(json.dumps(parametros, sort_keys=True, default=str).encode('utf-8'))
+        sha.update(prophet.__version__.encode('utf-8'))
+        return sha.hexdigest()
+
+    def _caminho(self, chave):
+        return os.path.join(self.diretorio, f'{chave}.json')
+
+    def _incrementar(self, contador):
+        conn = sqlite3.connect(self._db_contadores, timeout=10)
+        conn.execute('CREATE TABLE IF NOT EXISTS contadores (nome TEXT PRIMARY KEY, valor INTEGER NOT NULL)')
+        conn.execute('INSERT INTO contadores (nome, valor) VALUES (?, 1) '
+                     'ON CONFLICT(nome) DO UPDATE SET valor = valor + 1', (contador,))
+        conn.commit()
+        conn.close()
+
+    def _registrar_ultimo(self, serie, chave):
+        conn = sqlite3.connect(self._db_contadores, timeout=10)
+        conn.execute('CREATE TABLE IF NOT EXISTS ultimos_modelos (serie TEXT PRIMARY KEY, chave TEXT NOT NULL)')
+        conn.execute('INSERT OR REPLACE INTO ultimos_modelos (serie, chave) VALUES (?, ?)', (serie, chave))
+        conn.commit()
+        conn.close()
+
+    def modelo_anterior(self, serie):
+        """Último modelo ajustado para ``serie``, ou ``None`` (sem contar acerto/erro do cache)."""
+        from prophet.serialize import model_from_json
+        conn = sqlite3.connect(self._db_contadores, timeout=10)
+        try:
+            row = conn.execute('SELECT chave FROM ultimos_modelos WHERE serie = ?', (serie,)).fetchone()
+        except sqlite3.OperationalError:
+            row = None
+        conn.close()
+        if row is None:
+            return None
+        try:
+            with open(self._caminho(row[0]), encoding='utf-8') as f:
+                return model_from_json(f.read())
+        except Exception:
+            # Removido pela política LRU (ou inválido): ajuste a frio
+            return None
+
+    def obter(self, chave):
+        from prophet.serialize import model_from_json
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, encoding='utf-8') as f:
+                modelo = model_from_json(f.read())
+        except FileNotFoundError:
+            self._incrementar('misses')
+            return None
+        except Exception as e:
+            print(f"   AVISO: modelo em cache inválido ({chave}): {e}")
+            os.remove(caminho)
+            self._incrementar('misses')
+            return None
+        # Atualiza o instante de uso para a política LRU
+        os.utime(caminho, None)
+        self._incrementar('hits')
+        return modelo
+
+    def salvar(self, chave, modelo):
+        from prophet.serialize import model_to_json
+        tmp = os.path.join(self.diretorio, f'.tmp-{uuid.uuid4().hex}')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(model_to_json(modelo))
+        os.replace(tmp, self._caminho(chave))
+        self.limpar()
+
+    def ajustar(self, df_prophet, parametros, serie=None):
+        """Retorna o modelo do cache ou ajusta um novo ``Prophet(**parametros)`` e o guarda.
+
+        Com ``serie``, um erro de cache parte do último modelo da mesma série (ver
+        ``parametros_iniciais``).
+        """
+        from prophet import Prophet
+        chave = self.gerar_chave(df_prophet, parametros)
+        modelo = self.obter(chave)
+        if modelo is None:
+            anterior = self.modelo_anterior(serie) if serie is not None else None
+            if anterior is not None:
+                # O Prophet descarta sozinho os parâmetros de formato incompatível (ex.: outro nº de changepoints)
+                modelo = Prophet(**parametros).fit(df_prophet, init=parametros_iniciais(anterior))
+                self._incrementar('warm_starts')
+            else:
+                modelo = Prophet(**parametros).fit(df_prophet)
+            self.salvar(chave, modelo)
+        if serie is not None:
+            self._registrar_ultimo(serie, chave)
+        return modelo
+
+    def limpar(self):
+        entradas = []
+        for entrada in os.scandir(self.diretorio):
+            if entrada.is_file() and entrada.name.endswith('.json') and not entrada.name.startswith('.'):
+                stat = entrada.stat()
+                entradas.append((stat.st_mtime, stat.st_size, entrada.path))
+        total = sum(tamanho for _, tamanho, _ in entradas)
+        for _, tamanho, caminho in sorted(entradas):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                pass
+            total -= tamanho
+
+    def estatisticas(self):
+        contadores = {'hits': 0, 'misses': 0, 'warm_starts': 0}
+        if os.path.exists(self._db_contadores):
+            conn = sqlite3.connect(self._db_contadores, timeout=10)
+            try:
+                contadores.update(dict(conn.execute('SELECT nome, valor FROM contadores').fetchall()))
+            except sqlite3.OperationalError:
+                pass
+            conn.close()
+        modelos = [e for e in os.scandir(self.diretorio)
+                   if e.is_file() and e.name.endswith('.json') and not e.name.startswith('.')]
+        total = contadores['hits'] + contadores['misses']
+        return {
+            'hits': contadores['hits'],
+            'misses': contadores['misses'],
+            'taxa_acerto': contadores['hits'] / total if total else 0.0,
+            'warm_starts': contadores['warm_starts'],
+            'modelos': len(modelos),
+            'bytes': sum(e.stat().st_size for e in modelos),
+            'max_bytes': self.max_bytes
+        }
+
+
+def parametros_iniciais(modelo):
+    """Parâmetros ajustados de ``modelo`` no formato do ``init`` do ``Prophet.fit`` (*warm start*)."""
+    parametros = {nome: float(modelo.params[nome][0][0]) for nome in ('k', 'm', 'sigma_obs')}
+    parametros.update({nome: modelo.params[nome][0] for nome in ('delta', 'beta')})
+    return parametros
@@ -0,0 +1,308 @@
+import json
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+
+def _realocar(arr, deslocamento, n_meses, colunas=None, n_colunas=0):
+    """Copia ``arr`` (meses [x categorias]) para uma grade de ``n_meses``, com as colunas remapeadas."""
+    if arr.ndim == 1:
+        saida = np.zeros(n_meses, dtype=arr.dtype)
+        saida[deslocamento:deslocamento + len(arr)] = arr
+        return saida
+    saida = np.zeros((n_meses, n_colunas), dtype=arr.dtype)
+    saida[deslocamento:deslocamento + len(arr), colunas] = arr
+    return saida
+
+
+class CuboAgregacao:
+    """Agregados mensais pré-calculados por produto e por cliente, em arrays NumPy.
+
+    Produtos e clientes são codificados como categorias (``produtos``/``clientes``). Os
+    totais por mês, por (mês, produto) e por (mês, cliente) ficam em arrays densos; o
+    cruzamento produto x cliente, que costuma ser muito esparso, fica em formato
+    coordenado ordenado pelo par, com offsets por par. Qualquer série é obtida por
+    fatiamento, sem filtrar nem reamostrar o DataFrame original.
+    """
+
+    def __init__(self, inicio, total, por_produto, contagem_produto, por_cliente, contagem_cliente,
+                 par_chaves, par_inicio, par_mes, par_valor, produtos, clientes, colunas):
+        self.inicio = np.datetime64(inicio, 'M')
+        self.total = total
+        self.por_produto = por_produto
+        self.contagem_produto = contagem_produto
+        self.por_cliente = por_cliente
+        self.contagem_cliente = contagem_cliente
+        self.par_chaves = par_chaves
+        self.par_inicio = par_inicio
+        self.par_mes = par_mes
+        self.par_valor = par_valor
+        self.produtos = list(produtos)
+        self.clientes = list(clientes)
+        self.colunas = colunas
+        self._codigo_produto = {p: i for i, p in enumerate(self.produtos)}
+        self._codigo_cliente = {c: i for i, c in enumerate(self.clientes)}
+
+    @property
+    def periodos(self):
+        """Índice de fim de mês, igual ao de ``resample('M')``."""
+        meses = self.inicio + np.arange(len(self.total))
+        return pd.DatetimeIndex(((meses + 1).astype('datetime64[D]') - np.timedelta64(1, 'D')).astype('datetime64[ns]'))
+
+    @staticmethod
+    def _codificar(serie):
+        if serie is None:
+            return None, []
+        cat = serie.array if isinstance(serie.dtype, pd.CategoricalDtype) else pd.Categorical(serie)
+        return np.asarray(cat.codes, dtype='int64'), list(cat.categories)
+
+    @classmethod
+    def construir(cls, df, coluna_data, coluna_valor, coluna_produto=None, coluna_cliente=None):
+        """Monta o cubo com uma única passada (``bincount``) sobre as colunas tratadas."""
+        meses_abs = df[coluna_data].to_numpy(dtype='datetime64[ns]').astype('datetime64[M]')
+        valores = df[coluna_valor].to_numpy(dtype='float64')
+        codigos_p, produtos = cls._codificar(df[coluna_produto] if coluna_produto else None)
+        codigos_c, clientes = cls._codificar(df[coluna_cliente] if coluna_cliente else None)
+        colunas = {'data': coluna_data, 'valor': coluna_valor, 'produto': coluna_produto, 'cliente': coluna_cliente}
+        return cls._de_codigos(meses_abs, valores, codigos_p, produtos, codigos_c, clientes, colunas)
+
+    @classmethod
+    def _de_codigos(cls, meses_abs, valores, codigos_p, produtos, codigos_c, clientes, colunas, contagens=None):
+        """Núcleo de ``construir``; ``contagens`` permite partir de linhas já pré-agregadas."""
+        inicio = meses_abs.min()
+        mes = (meses_abs - inicio).astype('int64')
+        n_meses = int(mes.max()) + 1
+        n_p, n_c = len(produtos), len(clientes)
+
+        total = np.bincount(mes, weights=valores, minlength=n_meses)
+
+        def por_dimensao(codigos, n):
+            if codigos is None or n == 0:
+                return np.zeros((n_meses, 0)), np.zeros((n_meses, 0), dtype='int32')
+            validos = codigos >= 0
+            idx = mes[validos] * n + codigos[validos]
+            soma = np.bincount(idx, weights=valores[validos], minlength=n_meses * n).reshape(n_meses, n)
+            pesos = contagens[validos] if contagens is not None else None
+            contagem = np.bincount(idx, weights=pesos, minlength=n_meses * n).reshape(n_meses, n).astype('int32')
+            return soma, contagem
+
+        por_produto, contagem_produto = por_dimensao(codigos_p, n_p)
+        por_cliente, contagem_cliente = por_dimensao(codigos_c, n_c)
+
+        if codigos_p is not None and codigos_c is not None and n_p and n_c:
+            validos = (codigos_p >= 0) & (codigos_c >= 0)
+            pares = cls._pares(codigos_p[validos] * n_c + codigos_c[validos], mes[validos], valores[validos], n_meses)
+        else:
+            pares = cls._pares(np.zeros(0, dtype='int64'), np.zeros(0, dtype='int64'), np.zeros(0), n_meses)
+
+        return cls(inicio, total, por_produto, contagem_produto, por_cliente, contagem_cliente,
+                   *pares, produtos, clientes, colunas)
+
+    @staticmethod
+    def _pares(par, mes, valores, n_meses):
+        """Soma por (par, mês) no formato coordenado: ``(par_chaves, par_inicio, par_mes, par_valor)``."""
+        chave = par.astype('int64') * n_meses + mes
+        chaves_unicas, inverso = np.unique(chave, return_inverse=True)
+        par_valor = np.bincount(inverso, weights=valores, minlength=len(chaves_unicas))
+        pares = chaves_unicas // n_meses
+        par_mes = (chaves_unicas % n_meses).astype('int32')
+        par_chaves, par_inicio = np.unique(pares, return_index=True)
+        return par_chaves, np.append(par_inicio, len(pares)), par_mes, par_valor
+
+    def _grade(self, outro):
+        """Início e número de meses do intervalo que cobre os dois cubos."""
+        inicio = min(self.inicio, outro.inicio)
+        fim = max(self.inicio + len(self.total), outro.inicio + len(outro.total))
+        return inicio, int((fim - inicio).astype('int64'))
+
+    def mesclar(self, outro):
+        """Novo cubo com a soma dos dois, ex.: os agregados já salvos mais um arquivo só com as linhas novas.
+
+        Trabalha direto nos arrays agregados (meses realinhados, categorias novas acrescentadas
+        no fim), sem voltar às linhas de nenhum dos arquivos.
+        """
+        inicio, n_meses = self._grade(outro)
+        produtos = self.produtos + [p for p in outro.produtos if p not in self._codigo_produto]
+        clientes = self.clientes + [c for c in outro.clientes if c not in self._codigo_cliente]
+        codigo_p = {p: i for i, p in enumerate(produtos)}
+        codigo_c = {c: i for i, c in enumerate(clientes)}
+        n_p, n_c = len(produtos), len(clientes)
+
+        soma = {nome: 0 for nome in ('total', 'por_produto', 'contagem_produto', 'por_cliente', 'contagem_cliente')}
+        par, par_mes, par_valor = [], [], []
+        for cubo in (self, outro):
+            deslocamento = int((cubo.inicio - inicio).astype('int64'))
+            mapa_p = np.array([codigo_p[p] for p in cubo.produtos], dtype='int64')
+            mapa_c = np.array([codigo_c[c] for c in cubo.clientes], dtype='int64')
+            soma['total'] = soma['total'] + _realocar(cubo.total, deslocamento, n_meses)
+            for nome, mapa, n in (('por_produto', mapa_p, n_p), ('contagem_produto', mapa_p, n_p),
+                                  ('por_cliente', mapa_c, n_c), ('contagem_cliente', mapa_c, n_c)):
+                soma[nome] = soma[nome] + _realocar(getattr(cubo, nome), deslocamento, n_meses, mapa, n)
+            if len(cubo.par_chaves):
+                chaves = np.repeat(cubo.par_chaves, np.diff(cubo.par_inicio))
+                n_c_cubo = len(cubo.clientes)
+                par.append(mapa_p[chaves // n_c_cubo] * n_c + mapa_c[chaves % n_c_cubo])
+                par_mes.append(cubo.par_mes.astype('int64') + deslocamento)
+                par_valor.append(cubo.par_valor)
+        if par:
+            pares = self._pares(np.concatenate(par), np.concatenate(par_mes), np.concatenate(par_valor), n_meses)
+        else:
+            pares = self._pares(np.zeros(0, dtype='int64'), np.zeros(0, dtype='int64'), np.zeros(0), n_meses)
+        return CuboAgregacao(inicio, soma['total'], soma['por_produto'], soma['contagem_produto'],
+                             soma['por_cliente'], soma['contagem_cliente'], *pares, produtos, clientes, self.colunas)
+
+    def diferenca(self, anterior, tolerancia=1e-6):
+        """``(produtos, meses)`` que mudaram em relação ao cubo ``anterior``.
+
+        ``produtos`` são os produtos deste cubo cuja série mensal (valores ou número de
+        lançamentos) difere da anterior, inclusive os que não existiam; ``meses`` são os fins
+        de mês (``periodos``) em que o total mudou.
+        """
+        inicio, n_meses = self._grade(anterior)
+        deslocamento = int((self.inicio - inicio).astype('int64'))
+        deslocamento_anterior = int((anterior.inicio - inicio).astype('int64'))
+        n_p = len(self.produtos)
+        comuns = np.array([i for i, p in enumerate(anterior.produtos) if p in self._codigo_produto], dtype='int64')
+        destino = np.array([self._codigo_produto[anterior.produtos[i]] for i in comuns], dtype='int64')
+        todos = np.arange(n_p)
+
+        atual = _realocar(self.por_produto, deslocamento, n_meses, todos, n_p)
+        antes = _realocar(anterior.por_produto[:, comuns], deslocamento_anterior, n_meses, destino, n_p)
+        mudou = ~np.isclose(atual, antes, rtol=0, atol=tolerancia).all(axis=0)
+        mudou |= (_realocar(self.contagem_produto, deslocamento, n_meses, todos, n_p) !=
+                  _realocar(anterior.contagem_produto[:, comuns], deslocamento_anterior, n_meses, destino, n_p)).any(axis=0)
+        total_mudou = ~np.isclose(_realocar(self.total, deslocamento, n_meses),
+                                  _realocar(anterior.total, deslocamento_anterior, n_meses), rtol=0, atol=tolerancia)
+        meses = inicio + np.flatnonzero(total_mudou)
+        fins_de_mes = ((meses + 1).astype('datetime64[D]') - np.timedelta64(1, 'D')).astype('datetime64[ns]')
+        return [self.produtos[i] for i in np.flatnonzero(mudou)], pd.DatetimeIndex(fins_de_mes)
+
+    def salvar(self, caminho):
+        meta = {'inicio': str(self.inicio), 'produtos': self.produtos, 'clientes': self.clientes, 'colunas': self.colunas}
+        tmp = f"{caminho}.{uuid.uuid4().hex}.tmp.npz"
+        np.savez(tmp, total=self.total, por_produto=self.por_produto, contagem_produto=self.contagem_produto,
+                 por_cliente=self.por_cliente, contagem_cliente=self.contagem_cliente,
+                 par_chaves=self.par_chaves, par_inicio=self.par_inicio, par_mes=self.par_mes,
+                 par_valor=self.par_valor, meta=np.array(json.dumps(meta, default=str)))
+        os.replace(tmp, caminho)
+
+    @classmethod
+    def carregar(cls, caminho):
+        if not os.path.exists(caminho):
+            return None
+        with np.load(caminho, allow_pickle=False) as dados:
+            meta = json.loads(str(dados['meta']))
+            return cls(meta['inicio'], dados['total'], dados['por_produto'], dados['contagem_produto'],
+                       dados['por_cliente'], dados['contagem_cliente'], dados['par_chaves'],
+                       dados['par_inicio'], dados['par_mes'], dados['par_valor'],
+                       meta['produtos'], meta['clientes'], meta['colunas'])
+
+    def _serie(self, valores, contagem=None):
+        # Recorta do primeiro ao último mês com lançamentos, como o resample do recorte faria
+        serie = pd.Series(valores, index=self.periodos, name=self.colunas['valor'])
+        serie.index.name = self.colunas['data']
+        if contagem is not None:
+            meses_com_dados = np.flatnonzero(contagem)
+            if len(meses_com_dados) == 0:
+                return serie.iloc[0:0]
+            serie = serie.iloc[meses_com_dados[0]:meses_com_dados[-1] + 1]
+        return serie
+
+    def serie_total(self):
+        return self._serie(self.total)
+
+    def serie_produto(self, produto):
+        codigo = self._codigo_produto.get(produto)
+        if codigo is None:
+            return None
+        return self._serie(self.por_produto[:, codigo], self.contagem_produto[:, codigo])
+
+    def serie_cliente(self, cliente):
+        codigo = self._codigo_cliente.get(cliente)
+        if codigo is None:
+            return None
+        return self._serie(self.por_cliente[:, codigo], self.contagem_cliente[:, codigo])
+
+    def serie_produto_cliente(self, produto, cliente):
+        codigo_p = self._codigo_produto.get(produto)
+        codigo_c = self._codigo_cliente.get(cliente)
+        if codigo_p is None or codigo_c is None:
+            return None
+        chave = codigo_p * len(self.clientes) + codigo_c
+        posicao = np.searchsorted(self.par_chaves, chave)
+        if posicao >= len(self.par_chaves) or self.par_chaves[posicao] != chave:
+            return None
+        inicio, fim = self.par_inicio[posicao], self.par_inicio[posicao + 1]
+        valores = np.zeros(len(self.total))
+        contagem = np.zeros(len(self.total), dtype='int32')
+        valores[self.par_mes[inicio:fim]] = self.par_valor[inicio:fim]
+        contagem[self.par_mes[inicio:fim]] = 1
+        return self._serie(valores, contagem)
+
+    def totais_produto(self):
+        return pd.Series(self.por_produto.sum(axis=0), index=self.produtos)
+
+    def matriz_produtos(self, produtos=None):
+        """Matriz produto x mês; NaN fora do intervalo de vendas de cada produto."""
+        matriz = pd.DataFrame(self.por_produto.T, index=self.produtos, columns=self.periodos)
+        com_dados = self.contagem_produto.T > 0
+        dentro_intervalo = np.maximum.accumulate(com_dados, axis=1) & np.maximum.accumulate(com_dados[:, ::-1], axis=1)[:, ::-1]
+        matriz = matriz.where(dentro_intervalo)
+        if produtos is not None:
+            matriz = matriz.loc[[p for p in produtos if p in self._codigo_produto]]
+        return matriz
+
+
+class AcumuladorCubo:
+    """Monta um ``CuboAgregacao`` a partir de blocos, sem guardar as linhas.
+
+    Cada bloco é reduzido a somas e contagens por (mês, produto, cliente); as reduções
+    parciais são compactadas de tempos em tempos, então a memória depende do número de
+    combinações distintas, e não do número de linhas do arquivo.
+    """
+
+    def __init__(self, limite_compactacao=200000):
+        self.limite_compactacao = limite_compactacao
+        self._partes = []
+        self._linhas = 0
+
+    @staticmethod
+    def _reduzir(chaves, soma, contagem):
+        unicas, inverso = np.unique(chaves, axis=0, return_inverse=True)
+        inverso = inverso.ravel()
+        return unicas, np.bincount(inverso, weights=soma), np.bincount(inverso, weights=contagem)
+
+    def adicionar(self, bloco):
+        """Incorpora um bloco ``papel -> array`` (ver ingestao.LeitorPlanilha)."""
+        n = len(bloco['data'])
+        if n == 0: return
+        sem_codigo = np.full(n, -1, dtype='int64')
+        chaves = np.column_stack([
+            bloco['data'].astype('datetime64[M]').astype('int64'),
+            bloco.get('produto', sem_codigo).astype('int64'),
+            bloco.get('cliente', sem_codigo).astype('int64')])
+        self._partes.append(self._reduzir(chaves, bloco['valor'], np.ones(n)))
+        self._linhas += len(self._partes[-1][0])
+        if self._linhas > self.limite_compactacao:
+            self._compactar()
+
+    def _compactar(self):
+        if len(self._partes) <= 1: return
+        chaves = np.concatenate([p[0] for p in self._partes])
+        soma = np.concatenate([p[1] for p in self._partes])
+        contagem = np.concatenate([p[2] for p in self._partes])
+        self._partes = [self._reduzir(chaves, soma, contagem)]
+        self._linhas = len(self._partes[0][0])
+
+    def finalizar(self, produtos, clientes, colunas):
+        """Cubo final; ``produtos``/``clientes`` são as categorias na ordem dos códigos."""
+        self._compactar()
+        if not self._partes: return None
+        chaves, soma, contagem = self._partes[0]
+        meses_abs = chaves[:, 0].astype('datetime64[M]')
+        codigos_p = chaves[:, 1] if colunas.get('produto') else None
+        codigos_c = chaves[:, 2] if colunas.get('cliente') else None
+        return CuboAgregacao._de_codigos(meses_abs, soma, codigos_p, produtos or [], codigos_c, clientes or [],
+                                         colunas, contagens=contagem)
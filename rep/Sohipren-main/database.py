@@ -1,199 +1,621 @@
+import atexit
+import base64
+import math
+import os
 import sqlite3
-from datetime import datetime
+import json
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
 
-class Database:
-    def __init__(self, db_name='historico.db'):
-        self.db_name = db_name
-        self.criar_tabelas()
 
-    def criar_tabelas(self):
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        # Tabela para previsões
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS previsoes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            data_criacao TIMESTAMP,
-            nome_arquivo TEXT,
-            periodo_forecast INTEGER,
-            test_ratio REAL,
-            prophet_changepoint_prior_scale REAL,
-            prophet_seasonality_prior_scale REAL,
-            coluna_data TEXT,
-            coluna_valor TEXT,
-            coluna_produto TEXT,
-            coluna_cliente TEXT,
-            arquivo_id TEXT
-        )
-        ''')
-        
-        # Tabela para comparações
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS comparacoes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            data_criacao TIMESTAMP,
-            produto1 TEXT,
-            produto2 TEXT,
-            arquivo_id TEXT,
-            coluna_data TEXT,
-            coluna_valor TEXT,
-            coluna_produto TEXT,
-            coluna_cliente TEXT
-        )
-        ''')
-        
-        conn.commit()
+class PoolConexoes:
+    """Conexões SQLite reaproveitadas entre chamadas, para um arquivo de banco.
+
+    Cada thread retira uma conexão ociosa (ou abre uma nova) e a devolve ao final; dentro
+    da mesma thread a retirada é reentrante, para que várias operações compartilhem a
+    transação de ``Database.em_lote``. As conexões abrem em modo WAL (leitores não
+    bloqueiam o escritor) com os ``PRAGMAS`` abaixo, e o cache de *statements* do sqlite3
+    evita recompilar as consultas repetidas. Depois de um ``fork`` (processos da fila de
+    jobs), as conexões herdadas são abandonadas sem fechar e o filho abre as suas.
+    """
+
+    PRAGMAS = (
+        'PRAGMA synchronous = NORMAL',   # seguro em WAL; o fsync fica para o checkpoint
+        'PRAGMA cache_size = -16000',    # ~16 MB de páginas por conexão
+        'PRAGMA mmap_size = 268435456',  # leituras via mmap (até 256 MB)
+        'PRAGMA temp_store = MEMORY'
+    )
+
+    def __init__(self, caminho, max_ociosas=8, timeout=30):
+        self.caminho = caminho
+        self.max_ociosas = max_ociosas
+        self.timeout = timeout
+        self._iniciar_estado()
+
+    def _iniciar_estado(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._ociosas = []
+        self._identidade = None
+
+    def _identidade_arquivo(self):
+        try:
+            estado = os.stat(self.caminho)
+        except OSError:
+            return None
+        return estado.st_dev, estado.st_ino
+
+    def _abrir(self):
+        conn = sqlite3.connect(self.caminho, timeout=self.timeout, check_same_thread=False, cached_statements=256)
+        conn.execute('PRAGMA journal_mode = WAL')
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _retirar(self):
+        identidade = self._identidade_arquivo()
+        with self._lock:
+            # Arquivo apagado ou substituído: as conexões ociosas apontam para o antigo
+            if identidade != self._identidade:
+                descartadas, self._ociosas = self._ociosas, []
+                for conn in descartadas:
+                    conn.close()
+            if self._ociosas:
+                return self._ociosas.pop()
+        conn = self._abrir()
+        with self._lock:
+            self._identidade = self._identidade_arquivo()
+        return conn
+
+    def _devolver(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if len(self._ociosas) < self.max_ociosas:
+                self._ociosas.append(conn)
+                return
         conn.close()
-        self.migrate_db()
 
-    def migrate_db(self):
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+    @contextmanager
+    def conexao(self):
+        if self._pid != os.getpid():
+            self._iniciar_estado()
+        atual = getattr(self._local, 'conexao', None)
+        if atual is not None:
+            yield atual
+            return
+        conn = self._retirar()
+        self._local.conexao = conn
+        try:
+            yield conn
+        finally:
+            self._local.conexao = None
+            self._devolver(conn)
 
-        # Verifica se as colunas existem na tabela previsoes
-        cursor.execute("PRAGMA table_info(previsoes)")
-        colunas = [col[1] for col in cursor.fetchall()]
-        
-        # Adiciona as novas colunas se não existirem
-        novas_colunas = {
+    def fechar(self):
+        """Fecha as conexões ociosas (as em uso são fechadas ao serem devolvidas)."""
+        if self._pid != os.getpid():
+            return
+        with self._lock:
+            ociosas, self._ociosas = self._ociosas, []
+            self._identidade = None
+        for conn in ociosas:
+            conn.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def obter_pool(caminho):
+    """Pool compartilhado por todas as instâncias de ``Database`` do mesmo arquivo."""
+    chave = os.path.abspath(caminho)
+    with _pools_lock:
+        if chave not in _pools:
+            _pools[chave] = PoolConexoes(caminho)
+        return _pools[chave]
+
+
+@atexit.register
+def _fechar_pools():
+    # Fechar a última conexão faz o checkpoint e remove os arquivos -wal/-shm
+    for pool in list(_pools.values()):
+        pool.fechar()
+
+
+def _migracao_tabelas(cursor):
+    """Versão 1: tabelas do histórico, colunas adicionadas ao longo do tempo e referências."""
+    # Tabela para previsões
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS previsoes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        data_criacao TIMESTAMP,
+        nome_arquivo TEXT,
+        periodo_forecast INTEGER,
+        test_ratio REAL,
+        prophet_changepoint_prior_scale REAL,
+        prophet_seasonality_prior_scale REAL,
+        coluna_data TEXT,
+        coluna_valor TEXT,
+        coluna_produto TEXT,
+        coluna_cliente TEXT,
+        arquivo_id TEXT
+    )
+    ''')
+    
+    # Tabela para comparações
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS comparacoes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        data_criacao TIMESTAMP,
+        produto1 TEXT,
+        produto2 TEXT,
+        arquivo_id TEXT,
+        coluna_data TEXT,
+        coluna_valor TEXT,
+        coluna_produto TEXT,
+        coluna_cliente TEXT
+    )
+    ''')
+
+    # Bancos antigos podem não ter as colunas criadas depois da primeira versão
+    novas_colunas = {
+        'previsoes': {
             'coluna_data': 'TEXT',
             'coluna_valor': 'TEXT',
             'coluna_produto': 'TEXT',
             'coluna_cliente': 'TEXT',
-            'arquivo_id': 'TEXT'
-        }
-        
-        for coluna, tipo in novas_colunas.items():
-            if coluna not in colunas:
-                cursor.execute(f'ALTER TABLE previsoes ADD COLUMN {coluna} {tipo}')
-        
-        # Verifica se as colunas existem na tabela comparacoes
-        cursor.execute("PRAGMA table_info(comparacoes)")
-        colunas = [col[1] for col in cursor.fetchall()]
-        
-        # Adiciona as novas colunas se não existirem
-        novas_colunas = {
+            'arquivo_id': 'TEXT',
+            'prophet_seasonality_mode': 'TEXT',
+            'melhor_config': 'TEXT'
+        },
+        'comparacoes': {
             'coluna_data': 'TEXT',
             'coluna_valor': 'TEXT',
             'coluna_produto': 'TEXT',
             'coluna_cliente': 'TEXT'
         }
-        
-        for coluna, tipo in novas_colunas.items():
+    }
+    for tabela, colunas_tabela in novas_colunas.items():
+        cursor.execute(f"PRAGMA table_info({tabela})")
+        colunas = [col[1] for col in cursor.fetchall()]
+        for coluna, tipo in colunas_tabela.items():
             if coluna not in colunas:
-                cursor.execute(f'ALTER TABLE comparacoes ADD COLUMN {coluna} {tipo}')
-        
-        conn.commit()
-        conn.close()
+                cursor.execute(f'ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo}')
+    
+    # Tabela de referências aos arquivos enviados (contagem de referências para limpeza)
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='referencias_arquivo'")
+    tabela_referencias_existe = cursor.fetchone() is not None
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS referencias_arquivo (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        arquivo_id TEXT NOT NULL,
+        tipo TEXT NOT NULL,
+        ref_id INTEGER NOT NULL,
+        arquivo_derivado TEXT
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_referencias_arquivo ON referencias_arquivo (arquivo_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_referencias_ref ON referencias_arquivo (tipo, ref_id)')
+    if not tabela_referencias_existe:
+        # Registra as referências das linhas criadas antes da tabela existir
+        cursor.execute('''
+        INSERT INTO referencias_arquivo (arquivo_id, tipo, ref_id, arquivo_derivado)
+        SELECT arquivo_id, 'previsao', id, 'forecast_' || arquivo_id || '.csv'
+        FROM previsoes WHERE arquivo_id IS NOT NULL
+        ''')
+        cursor.execute('''
+        INSERT INTO referencias_arquivo (arquivo_id, tipo, ref_id, arquivo_derivado)
+        SELECT arquivo_id, 'comparacao', id, NULL
+        FROM comparacoes WHERE arquivo_id IS NOT NULL
+        ''')
+
+    # Tabela da fila de processamento em segundo plano
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        tipo TEXT NOT NULL,
+        status TEXT NOT NULL,
+        parametros TEXT,
+        resultado TEXT,
+        erro TEXT,
+        pid_servidor INTEGER,
+        tentativas INTEGER DEFAULT 0,
+        data_criacao TIMESTAMP,
+        data_inicio TIMESTAMP,
+        data_fim TIMESTAMP
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)')
+
+    # Resultados de backtesting (erros por horizonte) ligados à previsão avaliada
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS backtests (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        previsao_id INTEGER NOT NULL,
+        data_criacao TIMESTAMP,
+        parametros TEXT,
+        resultado TEXT
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_backtests_previsao ON backtests (previsao_id)')
+
+
+def _migracao_indices(cursor):
+    """Versão 2: índices das listagens do histórico (ordem por data) e das buscas por arquivo."""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_previsoes_data ON previsoes (data_criacao)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_previsoes_arquivo ON previsoes (arquivo_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_comparacoes_data ON comparacoes (data_criacao)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_comparacoes_arquivo ON comparacoes (arquivo_id)')
+
+
+def _migracao_metricas(cursor):
+    """Versão 3: resumo das métricas de validação de cada previsão, para as listagens."""
+    cursor.execute("PRAGMA table_info(previsoes)")
+    colunas = [col[1] for col in cursor.fetchall()]
+    for coluna in ('mae', 'rmse', 'r2'):
+        if coluna not in colunas:
+            cursor.execute(f'ALTER TABLE previsoes ADD COLUMN {coluna} REAL')
+
+
+def _migracao_figuras(cursor):
+    """Versão 4: specs dos gráficos de cada previsão/comparação, por idioma (ver figuras.py)."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS figuras (
+        tipo TEXT NOT NULL,
+        ref_id INTEGER NOT NULL,
+        nome TEXT NOT NULL,
+        idioma TEXT NOT NULL,
+        spec TEXT NOT NULL,
+        data_criacao TIMESTAMP,
+        PRIMARY KEY (tipo, ref_id, nome, idioma)
+    )
+    ''')
+
+
+def _migracao_modelo_tipo(cursor):
+    """Versão 5: motor de previsão usado ('prophet' ou um dos modelos_estatisticos.MODELOS)."""
+    cursor.execute("PRAGMA table_info(previsoes)")
+    if 'modelo_tipo' not in [col[1] for col in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE previsoes ADD COLUMN modelo_tipo TEXT NOT NULL DEFAULT 'prophet'")
+
+
+def _migracao_selecao_modelos(cursor):
+    """Versão 6: motor escolhido para cada série pela seleção automática (ver selecao_modelos.py)."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS selecao_modelos (
+        serie TEXT PRIMARY KEY,
+        arquivo_id TEXT,
+        classe TEXT NOT NULL,
+        modelo TEXT NOT NULL,
+        erros TEXT,
+        tempos TEXT,
+        n INTEGER,
+        data_criacao TIMESTAMP
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_selecao_modelos_arquivo ON selecao_modelos (arquivo_id)')
+
+
+def _migracao_progresso_jobs(cursor):
+    """Versão 7: etapas já concluídas de cada job (lista JSON), para acompanhar o progresso."""
+    cursor.execute("PRAGMA table_info(jobs)")
+    if 'progresso' not in [col[1] for col in cursor.fetchall()]:
+        cursor.execute('ALTER TABLE jobs ADD COLUMN progresso TEXT')
+
+
+def _migracao_assinatura_selecoes(cursor):
+    """Versão 8: impressão digital dos dados em que cada escolha de motor foi feita."""
+    cursor.execute("PRAGMA table_info(selecao_modelos)")
+    if 'assinatura' not in [col[1] for col in cursor.fetchall()]:
+        cursor.execute('ALTER TABLE selecao_modelos ADD COLUMN assinatura TEXT')
+
+
+# Migrações em ordem; a versão do banco (PRAGMA user_version) é quantas já foram aplicadas.
+# Novas alterações de esquema entram sempre no fim da lista.
+MIGRACOES = (_migracao_tabelas, _migracao_indices, _migracao_metricas, _migracao_figuras, _migracao_modelo_tipo,
+             _migracao_selecao_modelos, _migracao_progresso_jobs, _migracao_assinatura_selecoes)
+
+
+def _dia(valor):
+    return date.fromisoformat(valor).isoformat()
+
+
+def _dia_seguinte(valor):
+    return (date.fromisoformat(valor) + timedelta(days=1)).isoformat()
+
+
+# Colunas das listagens do histórico: nome no JSON -> coluna da tabela
+COLUNAS_HISTORICO = {
+    'previsoes': {
+        'id': 'id', 'data': 'data_criacao', 'arquivo': 'nome_arquivo', 'periodo': 'periodo_forecast',
+        'test_ratio': 'test_ratio', 'changepoint_scale': 'prophet_changepoint_prior_scale',
+        'seasonality_scale': 'prophet_seasonality_prior_scale', 'seasonality_mode': 'prophet_seasonality_mode',
+        'coluna_data': 'coluna_data', 'coluna_valor': 'coluna_valor', 'coluna_produto': 'coluna_produto',
+        'coluna_cliente': 'coluna_cliente', 'arquivo_id': 'arquivo_id', 'mae': 'mae', 'rmse': 'rmse', 'r2': 'r2',
+        'modelo_tipo': 'modelo_tipo'
+    },
+    'comparacoes': {
+        'id': 'id', 'data': 'data_criacao', 'produto1': 'produto1', 'produto2': 'produto2',
+        'arquivo_id': 'arquivo_id', 'coluna_data': 'coluna_data', 'coluna_valor': 'coluna_valor',
+        'coluna_produto': 'coluna_produto', 'coluna_cliente': 'coluna_cliente'
+    }
+}
+
+# Filtros aceitos pelas listagens: nome -> (condição SQL, conversão do valor recebido).
+# Datas são dias (AAAA-MM-DD) e o intervalo inclui os dois extremos.
+_FILTROS_COMUNS = {
+    'arquivo_id': ('arquivo_id = ?', str),
+    'data_inicio': ('data_criacao >= ?', _dia),
+    'data_fim': ('data_criacao < ?', _dia_seguinte),
+    'coluna_data': ('coluna_data = ?', str),
+    'coluna_valor': ('coluna_valor = ?', str),
+    'coluna_produto': ('coluna_produto = ?', str),
+    'coluna_cliente': ('coluna_cliente = ?', str)
+}
+FILTROS_HISTORICO = {
+    'previsoes': dict(_FILTROS_COMUNS, **{
+        'nome_arquivo': ("nome_arquivo LIKE '%' || ? || '%'", str),
+        'periodo_min': ('periodo_forecast >= ?', int),
+        'periodo_max': ('periodo_forecast <= ?', int),
+        'changepoint_min': ('prophet_changepoint_prior_scale >= ?', float),
+        'changepoint_max': ('prophet_changepoint_prior_scale <= ?', float),
+        'seasonality_min': ('prophet_seasonality_prior_scale >= ?', float),
+        'seasonality_max': ('prophet_seasonality_prior_scale <= ?', float),
+        'seasonality_mode': ('prophet_seasonality_mode = ?', str),
+        'rmse_max': ('rmse <= ?', float),
+        'modelo_tipo': ('modelo_tipo = ?', str)
+    }),
+    'comparacoes': dict(_FILTROS_COMUNS, **{
+        'produto': ('? IN (produto1, produto2)', str)
+    })
+}
+
+
+def _codificar_cursor(data_criacao, ref_id):
+    return base64.urlsafe_b64encode(json.dumps([data_criacao, ref_id]).encode()).decode().rstrip('=')
+
+
+def _decodificar_cursor(cursor_pagina):
+    try:
+        bruto = base64.urlsafe_b64decode(cursor_pagina + '=' * (-len(cursor_pagina) % 4))
+        data_criacao, ref_id = json.loads(bruto)
+        return str(data_criacao), int(ref_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Cursor de paginação inválido: {cursor_pagina}") from e
+
+
+def _metrica(metricas, nome):
+    valor = (metricas or {}).get(nome)
+    if valor is None or not math.isfinite(float(valor)):
+        return None
+    return float(valor)
+
+
+class Database:
+    def __init__(self, db_name='historico.db'):
+        self.db_name = db_name
+        self._pool = obter_pool(db_name)
+        # O esquema é conferido no primeiro acesso, e não ao construir (o app cria o seu na importação)
+        self._esquema_conferido = False
+
+    def _conferir_esquema(self):
+        if not self._esquema_conferido:
+            self.criar_tabelas()
+
+    @contextmanager
+    def _cursor(self):
+        """Cursor de uma conexão do pool; confirma a transação ao sair (salvo dentro de ``em_lote``)."""
+        self._conferir_esquema()
+        with self._pool.conexao() as conn:
+            em_transacao = conn.in_transaction
+            try:
+                yield conn.cursor()
+            except BaseException:
+                # BaseException: inclui o JobCancelado lançado no meio de uma operação
+                if not em_transacao:
+                    conn.rollback()
+                raise
+            if not em_transacao and conn.in_transaction:
+                conn.commit()
+
+    @contextmanager
+    def em_lote(self):
+        """Agrupa várias gravações em uma única transação (um único commit ao final).
+
+        Uso: ``with db.em_lote(): db.salvar_comparacao(...); db.atualizar_job(...)``.
+        Em caso de exceção nada é gravado. Blocos aninhados fazem parte do mais externo.
+        """
+        self._conferir_esquema()
+        with self._pool.conexao() as conn:
+            if conn.in_transaction:
+                yield self
+                return
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                yield self
+            except BaseException:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+            conn.commit()
+
+    def criar_tabelas(self):
+        """Aplica as migrações pendentes; com o banco atualizado custa só a leitura do ``user_version``."""
+        with self._pool.conexao() as conn:
+            if conn.execute('PRAGMA user_version').fetchone()[0] >= len(MIGRACOES):
+                self._esquema_conferido = True
+                return
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Relê dentro da transação: outro processo pode ter migrado nesse meio-tempo
+                versao = conn.execute('PRAGMA user_version').fetchone()[0]
+                cursor = conn.cursor()
+                for numero, migracao in enumerate(MIGRACOES[versao:], start=versao + 1):
+                    migracao(cursor)
+                    print(f"   Banco {self.db_name}: migração {numero} ({migracao.__name__}) aplicada.")
+                cursor.execute(f'PRAGMA user_version = {len(MIGRACOES)}')
+            except Exception:
+                conn.rollback()
+                raise
+            conn.commit()
+        self._esquema_conferido = True
+
+    def fechar(self):
+        """Fecha as conexões ociosas deste banco (ex.: antes de apagar o arquivo)."""
+        self._pool.fechar()
 
     def salvar_previsao(self, nome_arquivo, periodo_forecast, test_ratio, 
                        prophet_changepoint_prior_scale, prophet_seasonality_prior_scale,
-                       coluna_data, coluna_valor, coluna_produto, coluna_cliente, arquivo_id):
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-        INSERT INTO previsoes (data_criacao, nome_arquivo, periodo_forecast, 
-                             test_ratio, prophet_changepoint_prior_scale, 
-                             prophet_seasonality_prior_scale, coluna_data, coluna_valor,
-                             coluna_produto, coluna_cliente, arquivo_id)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (datetime.now(), nome_arquivo, periodo_forecast, test_ratio,
-              prophet_changepoint_prior_scale, prophet_seasonality_prior_scale,
-              coluna_data, coluna_valor, coluna_produto, coluna_cliente, arquivo_id))
-        previsao_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+                       coluna_data, coluna_valor, coluna_produto, coluna_cliente, arquivo_id,
+                       arquivo_previsao=None, prophet_seasonality_mode=None, melhor_config=None,
+                       metricas=None, modelo_tipo='prophet'):
+        with self._cursor() as cursor:
+            cursor.execute('''
+            INSERT INTO previsoes (data_criacao, nome_arquivo, periodo_forecast, 
+                                 test_ratio, prophet_changepoint_prior_scale, 
+                                 prophet_seasonality_prior_scale, coluna_data, coluna_valor,
+                                 coluna_produto, coluna_cliente, arquivo_id, prophet_seasonality_mode,
+                                 melhor_config, mae, rmse, r2, modelo_tipo)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (datetime.now(), nome_arquivo, periodo_forecast, test_ratio,
+                  prophet_changepoint_prior_scale, prophet_seasonality_prior_scale,
+                  coluna_data, coluna_valor, coluna_produto, coluna_cliente, arquivo_id,
+                  prophet_seasonality_mode, json.dumps(melhor_config) if melhor_config else None,
+                  _metrica(metricas, 'MAE'), _metrica(metricas, 'RMSE'), _metrica(metricas, 'R²'), modelo_tipo))
+            previsao_id = cursor.lastrowid
+            self._adicionar_referencia(cursor, arquivo_id, 'previsao', previsao_id, arquivo_previsao)
         return previsao_id
 
     def salvar_comparacao(self, produto1, produto2, arquivo_id, coluna_data, coluna_valor,
                          coluna_produto, coluna_cliente):
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
+        with self._cursor() as cursor:
+            cursor.execute('''
+            INSERT INTO comparacoes (data_criacao, produto1, produto2, arquivo_id,
+                                   coluna_data, coluna_valor, coluna_produto, coluna_cliente)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (datetime.now(), produto1, produto2, arquivo_id,
+                  coluna_data, coluna_valor, coluna_produto, coluna_cliente))
+            comparacao_id = cursor.lastrowid
+            self._adicionar_referencia(cursor, arquivo_id, 'comparacao', comparacao_id)
+        return comparacao_id
+
+    def salvar_comparacoes(self, comparacoes):
+        """Grava várias comparações (dicionários com os argumentos de ``salvar_comparacao``) em uma transação."""
+        with self.em_lote():
+            return [self.salvar_comparacao(**comparacao) for comparacao in comparacoes]
+
+    def _adicionar_referencia(self, cursor, arquivo_id, tipo, ref_id, arquivo_derivado=None):
+        if not arquivo_id: return
         cursor.execute('''
-        INSERT INTO comparacoes (data_criacao, produto1, produto2, arquivo_id,
-                               coluna_data, coluna_valor, coluna_produto, coluna_cliente)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (datetime.now(), produto1, produto2, arquivo_id,
-              coluna_data, coluna_valor, coluna_produto, coluna_cliente))
-        
-        conn.commit()
-        conn.close()
+        INSERT INTO referencias_arquivo (arquivo_id, tipo, ref_id, arquivo_derivado)
+        VALUES (?, ?, ?, ?)
+        ''', (arquivo_id, tipo, ref_id, arquivo_derivado))
+
+    def _liberar_referencias(self, cursor, tipo, ref_id):
+        """Remove as referências de uma linha do histórico.
+
+        Retorna ``(derivados, orfaos)``: arquivos gerados pela linha e arquivos enviados
+        que ficaram sem nenhuma referência e podem ser apagados.
+        """
+        cursor.execute('SELECT arquivo_id, arquivo_derivado FROM referencias_arquivo WHERE tipo = ? AND ref_id = ?',
+                       (tipo, ref_id))
+        linhas = cursor.fetchall()
+        cursor.execute('DELETE FROM referencias_arquivo WHERE tipo = ? AND ref_id = ?', (tipo, ref_id))
+        derivados = [derivado for _, derivado in linhas if derivado]
+        orfaos = []
+        for arquivo_id in {arquivo_id for arquivo_id, _ in linhas}:
+            # Um job pendente ou em execução também segura o arquivo (ex.: outra análise do mesmo conteúdo)
+            cursor.execute('''
+            SELECT EXISTS (SELECT 1 FROM referencias_arquivo WHERE arquivo_id = ?)
+                OR EXISTS (SELECT 1 FROM jobs WHERE status IN ('pendente', 'executando')
+                           AND json_extract(parametros, '$.file_id') = ?)
+            ''', (arquivo_id, arquivo_id))
+            if not cursor.fetchone()[0]:
+                orfaos.append(arquivo_id)
+        return derivados, orfaos
+
+    def arquivos_em_uso(self):
+        """Uploads que a limpeza não pode apagar: referenciados pelo histórico ou por um job ativo."""
+        with self._cursor() as cursor:
+            cursor.execute('''
+            SELECT arquivo_id FROM referencias_arquivo
+            UNION
+            SELECT json_extract(parametros, '$.file_id') FROM jobs
+            WHERE status IN ('pendente', 'executando')
+            ''')
+            em_uso = {row[0] for row in cursor.fetchall() if row[0]}
+        return em_uso
+
+    def listar_historico(self, tipo, filtros=None, limite=20, apos=None):
+        """Página do histórico (``'previsoes'`` ou ``'comparacoes'``), da mais recente para a mais antiga.
+
+        A paginação é por chave: ``apos`` é o cursor devolvido pela página anterior e a
+        consulta continua de ``(data_criacao, id)`` da última linha pelo índice de data, sem
+        OFFSET. ``filtros`` usa os nomes de ``FILTROS_HISTORICO`` (valores vazios são
+        ignorados). Retorna ``{'colunas', 'linhas', 'proximo'}``, com as linhas como listas na
+        ordem de ``colunas``; ``proximo`` é ``None`` na última página.
+        Lança ``ValueError`` para filtro desconhecido, valor inválido ou cursor corrompido.
+        """
+        colunas = COLUNAS_HISTORICO[tipo]
+        condicoes, valores = [], []
+        for nome, valor in (filtros or {}).items():
+            if nome not in FILTROS_HISTORICO[tipo]:
+                raise ValueError(f"Filtro desconhecido: {nome}")
+            if valor is None or valor == '':
+                continue
+            condicao, converter = FILTROS_HISTORICO[tipo][nome]
+            condicoes.append(condicao)
+            valores.append(converter(valor))
+        if apos:
+            condicoes.append('(data_criacao, id) < (?, ?)')
+            valores.extend(_decodificar_cursor(apos))
+        where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ''
+        with self._cursor() as cursor:
+            cursor.execute(f'''
+            SELECT {', '.join(colunas.values())}
+            FROM {tipo}
+            {where}
+            ORDER BY data_criacao DESC, id DESC
+            LIMIT ?
+            ''', (*valores, limite + 1))
+            linhas = cursor.fetchall()
+
+        proximo = None
+        if len(linhas) > limite:
+            linhas = linhas[:limite]
+            proximo = _codificar_cursor(linhas[-1][1], linhas[-1][0])
+        return {'colunas': list(colunas), 'linhas': [list(linha) for linha in linhas], 'proximo': proximo}
+
+    def contar_historico(self):
+        """Total de previsões e de comparações registradas."""
+        with self._cursor() as cursor:
+            previsoes = cursor.execute('SELECT COUNT(*) FROM previsoes').fetchone()[0]
+            comparacoes = cursor.execute('SELECT COUNT(*) FROM comparacoes').fetchone()[0]
+        return {'previsoes': previsoes, 'comparacoes': comparacoes}
 
     def obter_historico_previsoes(self, limite=10):
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-        SELECT id, data_criacao, nome_arquivo, periodo_forecast, test_ratio,
-               prophet_changepoint_prior_scale, prophet_seasonality_prior_scale,
-               coluna_data, coluna_valor, coluna_produto, coluna_cliente, arquivo_id
-        FROM previsoes
-        ORDER BY data_criacao DESC
-        LIMIT ?
-        ''', (limite,))
-        
-        previsoes = cursor.fetchall()
-        conn.close()
-        
-        return [{
-            'id': row[0],
-            'data': row[1],
-            'arquivo': row[2],
-            'periodo': row[3],
-            'test_ratio': row[4],
-            'changepoint_scale': row[5],
-            'seasonality_scale': row[6],
-            'coluna_data': row[7],
-            'coluna_valor': row[8],
-            'coluna_produto': row[9],
-            'coluna_cliente': row[10],
-            'arquivo_id': row[11]
-        } for row in previsoes]
+        pagina = self.listar_historico('previsoes', limite=limite)
+        return [dict(zip(pagina['colunas'], linha)) for linha in pagina['linhas']]
 
     def obter_historico_comparacoes(self, limite=10):
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-        SELECT id, data_criacao, produto1, produto2, arquivo_id,
-               coluna_data, coluna_valor, coluna_produto, coluna_cliente
-        FROM comparacoes
-        ORDER BY data_criacao DESC
-        LIMIT ?
-        ''', (limite,))
-        
-        comparacoes = cursor.fetchall()
-        conn.close()
-        
-        return [{
-            'id': row[0],
-            'data': row[1],
-            'produto1': row[2],
-            'produto2': row[3],
-            'arquivo_id': row[4],
-            'coluna_data': row[5],
-            'coluna_valor': row[6],
-            'coluna_produto': row[7],
-            'coluna_cliente': row[8]
-        } for row in comparacoes]
+        pagina = self.listar_historico('comparacoes', limite=limite)
+        return [dict(zip(pagina['colunas'], linha)) for linha in pagina['linhas']]
 
     def obter_previsao_por_id(self, previsao_id):
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-        SELECT id, data_criacao, nome_arquivo, periodo_forecast, test_ratio,
-               prophet_changepoint_prior_scale, prophet_seasonality_prior_scale,
-               coluna_data, coluna_valor, coluna_produto, coluna_cliente, arquivo_id
-        FROM previsoes
-        WHERE id = ?
-        ''', (previsao_id,))
-        
-        row = cursor.fetchone()
-        conn.close()
+        with self._cursor() as cursor:
+            cursor.execute('''
+            SELECT id, data_criacao, nome_arquivo, periodo_forecast, test_ratio,
+                   prophet_changepoint_prior_scale, prophet_seasonality_prior_scale,
+                   coluna_data, coluna_valor, coluna_produto, coluna_cliente, arquivo_id,
+                   prophet_seasonality_mode, melhor_config, mae, rmse, r2, modelo_tipo
+            FROM previsoes
+            WHERE id = ?
+            ''', (previsao_id,))
+
+            row = cursor.fetchone()
         
         if row:
             return {
@@ -208,23 +630,36 @@ class Database:
                 'coluna_valor': row[8],
                 'coluna_produto': row[9],
                 'coluna_cliente': row[10],
-                'arquivo_id': row[11]
+                'arquivo_id': row[11],
+                'seasonality_mode': row[12],
+                'melhor_config': json.loads(row[13]) if row[13] else None,
+                'metricas': {'MAE': row[14], 'RMSE': row[15], 'R²': row[16]},
+                'modelo_tipo': row[17]
             }
         return None
 
+    def obter_melhor_config(self):
+        """Configuração da previsão ajustada mais recente, usada como ponto de partida do formulário."""
+        with self._cursor() as cursor:
+            cursor.execute('''
+            SELECT melhor_config FROM previsoes
+            WHERE melhor_config IS NOT NULL
+            ORDER BY data_criacao DESC
+            LIMIT 1
+            ''')
+            row = cursor.fetchone()
+        return json.loads(row[0]) if row else None
+
     def obter_comparacao_por_id(self, comparacao_id):
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-        SELECT id, data_criacao, produto1, produto2, arquivo_id,
-               coluna_data, coluna_valor, coluna_produto, coluna_cliente
-        FROM comparacoes
-        WHERE id = ?
-        ''', (comparacao_id,))
-        
-        row = cursor.fetchone()
-        conn.close()
+        with self._cursor() as cursor:
+            cursor.execute('''
+            SELECT id, data_criacao, produto1, produto2, arquivo_id,
+                   coluna_data, coluna_valor, coluna_produto, coluna_cliente
+            FROM comparacoes
+            WHERE id = ?
+            ''', (comparacao_id,))
+
+            row = cursor.fetchone()
         
         if row:
             return {
@@ -242,16 +677,264 @@ class Database:
 
     def deletar_previsao(self, previsao_id):
         print(f"[DEBUG] Deletando previsao ID: {previsao_id} do banco: {self.db_name}")
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM previsoes WHERE id = ?', (previsao_id,))
-        conn.commit()
-        conn.close()
+        with self._cursor() as cursor:
+            cursor.execute('DELETE FROM previsoes WHERE id = ?', (previsao_id,))
+            cursor.execute('DELETE FROM backtests WHERE previsao_id = ?', (previsao_id,))
+            cursor.execute("DELETE FROM figuras WHERE tipo = 'previsao' AND ref_id = ?", (previsao_id,))
+            derivados, orfaos = self._liberar_referencias(cursor, 'previsao', previsao_id)
+        return derivados, orfaos
 
     def deletar_comparacao(self, comparacao_id):
         print(f"[DEBUG] Deletando comparacao ID: {comparacao_id} do banco: {self.db_name}")
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM comparacoes WHERE id = ?', (comparacao_id,))
-        conn.commit()
-        conn.close() 
\ No newline at end of file
+        with self._cursor() as cursor:
+            cursor.execute('DELETE FROM comparacoes WHERE id = ?', (comparacao_id,))
+            cursor.execute("DELETE FROM figuras WHERE tipo = 'comparacao' AND ref_id = ?", (comparacao_id,))
+            derivados, orfaos = self._liberar_referencias(cursor, 'comparacao', comparacao_id)
+        return derivados, orfaos 
+
+    def salvar_backtest(self, previsao_id, parametros, resultado):
+        """Grava o backtesting da previsão, substituindo o anterior."""
+        with self._cursor() as cursor:
+            cursor.execute('DELETE FROM backtests WHERE previsao_id = ?', (previsao_id,))
+            cursor.execute('''
+            INSERT INTO backtests (previsao_id, data_criacao, parametros, resultado)
+            VALUES (?, ?, ?, ?)
+            ''', (previsao_id, datetime.now(), json.dumps(parametros), json.dumps(resultado)))
+            backtest_id = cursor.lastrowid
+        return backtest_id
+
+    def obter_backtest(self, previsao_id):
+        with self._cursor() as cursor:
+            cursor.execute('''
+            SELECT id, data_criacao, parametros, resultado
+            FROM backtests
+            WHERE previsao_id = ?
+            ORDER BY id DESC
+            LIMIT 1
+            ''', (previsao_id,))
+            row = cursor.fetchone()
+        if row:
+            return {
+                'id': row[0],
+                'data': row[1],
+                'parametros': json.loads(row[2]) if row[2] else {},
+                'resultado': json.loads(row[3]) if row[3] else None
+            }
+        return None
+
+    def salvar_figuras(self, tipo, ref_id, idioma, figuras):
+        """Guarda as specs dos gráficos (``nome -> spec``) de uma previsão ou comparação."""
+        agora = datetime.now()
+        with self._cursor() as cursor:
+            cursor.executemany('''
+            INSERT OR REPLACE INTO figuras (tipo, ref_id, nome, idioma, spec, data_criacao)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ''', [(tipo, ref_id, nome, idioma, json.dumps(spec, separators=(',', ':')), agora)
+                  for nome, spec in figuras.items() if spec])
+
+    def obter_figuras(self, tipo, ref_id, idioma):
+        """Specs guardadas (``nome -> spec``) no idioma pedido; sem elas, as de outro idioma."""
+        with self._cursor() as cursor:
+            cursor.execute('''
+            SELECT nome, spec FROM figuras
+            WHERE tipo = ? AND ref_id = ?
+            ORDER BY idioma = ? DESC, data_criacao DESC
+            ''', (tipo, ref_id, idioma))
+            linhas = cursor.fetchall()
+        figuras = {}
+        for nome, spec in linhas:
+            figuras.setdefault(nome, json.loads(spec))
+        return figuras
+
+    def salvar_selecoes(self, arquivo_id, selecoes):
+        """Guarda a última escolha de motor de cada série (``serie -> registro`` da seleção)."""
+        agora = datetime.now()
+        with self._cursor() as cursor:
+            cursor.executemany('''
+            INSERT OR REPLACE INTO selecao_modelos (serie, arquivo_id, classe, modelo, erros, tempos, n, assinatura, data_criacao)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(serie, arquivo_id, r['classe'], r['modelo'], json.dumps(r.get('erros') or {}),
+                   json.dumps(r.get('tempos') or {}), r.get('n'), r.get('assinatura'), agora)
+                  for serie, r in selecoes.items() if not r.get('reaproveitada')])
+
+    def obter_selecoes(self, series=None, arquivo_id=None):
+        """Escolhas guardadas (``serie -> registro``), das ``series`` pedidas ou de um arquivo."""
+        sql = 'SELECT serie, arquivo_id, classe, modelo, erros, tempos, n, assinatura, data_criacao FROM selecao_modelos'
+        condicoes, valores = [], []
+        if series is not None:
+            series = list(series)
+            if not series: return {}
+            condicoes.append(f"serie IN ({', '.join('?' * len(series))})")
+            valores += series
+        if arquivo_id is not None:
+            condicoes.append('arquivo_id = ?')
+            valores.append(arquivo_id)
+        if condicoes:
+            sql += ' WHERE ' + ' AND '.join(condicoes)
+        with self._cursor() as cursor:
+            cursor.execute(sql + ' ORDER BY serie', valores)
+            linhas = cursor.fetchall()
+        return {serie: {'arquivo_id': arquivo, 'classe': classe, 'modelo': modelo, 'erros': json.loads(erros or '{}'),
+                        'tempos': json.loads(tempos or '{}'), 'n': n, 'assinatura': assinatura, 'data': data}
+                for serie, arquivo, classe, modelo, erros, tempos, n, assinatura, data in linhas}
+
+    def criar_job(self, job_id, tipo, parametros, pid_servidor):
+        with self._cursor() as cursor:
+            cursor.execute('''
+            INSERT INTO jobs (id, tipo, status, parametros, pid_servidor, tentativas, data_criacao)
+            VALUES (?, ?, 'pendente', ?, ?, 0, ?)
+            ''', (job_id, tipo, json.dumps(parametros), pid_servidor, datetime.now()))
+
+    def atualizar_job(self, job_id, **campos):
+        if 'resultado' in campos and campos['resultado'] is not None:
+            campos['resultado'] = json.dumps(campos['resultado'])
+        with self._cursor() as cursor:
+            atribuicoes = ', '.join(f'{campo} = ?' for campo in campos)
+            cursor.execute(f'UPDATE jobs SET {atribuicoes} WHERE id = ?', (*campos.values(), job_id))
+
+    def iniciar_job(self, job_id):
+        """Marca o job como em execução; retorna False se ele foi cancelado (ou já terminou)."""
+        with self._cursor() as cursor:
+            cursor.execute('''
+            UPDATE jobs SET status = 'executando', data_inicio = ?
+            WHERE id = ? AND status IN ('pendente', 'executando')
+            ''', (datetime.now(), job_id))
+            iniciado = cursor.rowcount == 1
+        return iniciado
+
+    def finalizar_job(self, job_id, status, **campos):
+        """Grava o status final do job e os ``campos``, só se ele ainda não terminou.
+
+        Retorna False se o job já tinha terminado (ex.: cancelado enquanto rodava), sem gravar nada.
+        """
+        if 'resultado' in campos and campos['resultado'] is not None:
+            campos['resultado'] = json.dumps(campos['resultado'])
+        campos = dict(campos, status=status, data_fim=datetime.now())
+        with self._cursor() as cursor:
+            atribuicoes = ', '.join(f'{campo} = ?' for campo in campos)
+            cursor.execute(f"UPDATE jobs SET {atribuicoes} WHERE id = ? AND status IN ('pendente', 'executando')",
+                           (*campos.values(), job_id))
+            finalizado = cursor.rowcount == 1
+        return finalizado
+
+    def obter_job(self, job_id, com_resultado=True):
+        """Job completo; com ``com_resultado=False`` o resultado (às vezes grande) nem é lido."""
+        with self._cursor() as cursor:
+            cursor.execute(f'''
+            SELECT id, tipo, status, parametros, {'resultado' if com_resultado else 'NULL'}, erro, pid_servidor,
+                   tentativas, data_criacao, data_inicio, data_fim, progresso
+            FROM jobs
+            WHERE id = ?
+            ''', (job_id,))
+
+            row = cursor.fetchone()
+        
+        if row:
+            return {
+                'id': row[0],
+                'tipo': row[1],
+                'status': row[2],
+                'parametros': json.loads(row[3]) if row[3] else {},
+                'resultado': json.loads(row[4]) if row[4] else None,
+                'erro': row[5],
+                'pid_servidor': row[6],
+                'tentativas': row[7],
+                'data_criacao': row[8],
+                'data_inicio': row[9],
+                'data_fim': row[10],
+                'progresso': json.loads(row[11]) if row[11] else []
+            }
+        return None
+
+    def registrar_progresso_job(self, job_id, evento, resultado_parcial=None):
+        """Acrescenta ``evento`` (dicionário) ao progresso do job e retorna o status atual dele.
+
+        ``resultado_parcial``, se informado, substitui o resultado do job enquanto ele roda.
+        """
+        with self._cursor() as cursor:
+            cursor.execute('''
+            UPDATE jobs SET progresso = json_insert(COALESCE(progresso, '[]'), '$[#]', json(?))
+            WHERE id = ?
+            ''', (json.dumps(evento), job_id))
+            if resultado_parcial is not None:
+                cursor.execute('UPDATE jobs SET resultado = ? WHERE id = ?', (json.dumps(resultado_parcial), job_id))
+            cursor.execute('SELECT status FROM jobs WHERE id = ?', (job_id,))
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def obter_progresso_job(self, job_id):
+        """Tipo, status, erro e progresso do job, sem ler os parâmetros e o resultado."""
+        with self._cursor() as cursor:
+            cursor.execute('SELECT tipo, status, erro, progresso FROM jobs WHERE id = ?', (job_id,))
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        return {'tipo': row[0], 'status': row[1], 'erro': row[2], 'progresso': json.loads(row[3]) if row[3] else []}
+
+    def obter_status_job(self, job_id):
+        """Só o status do job (ou None), para a verificação periódica de cancelamento."""
+        with self._cursor() as cursor:
+            cursor.execute('SELECT status FROM jobs WHERE id = ?', (job_id,))
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def obter_campos_resultado_job(self, job_id, chaves):
+        """Tipo, status e erro do job e só as ``chaves`` do resultado, extraídas pelo SQLite.
+
+        Chaves que o resultado (ainda) não tem ficam de fora de ``'campos'``.
+        """
+        extracoes = ', '.join('json_type(resultado, ?), json_extract(resultado, ?)' for _ in chaves)
+        caminhos = [f'$.{chave}' for chave in chaves for _ in range(2)]
+        with self._cursor() as cursor:
+            cursor.execute(f'SELECT tipo, status, erro, {extracoes} FROM jobs WHERE id = ?', (*caminhos, job_id))
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        campos = {}
+        for i, chave in enumerate(chaves):
+            tipo, valor = row[3 + 2 * i], row[4 + 2 * i]
+            if tipo is None:
+                continue
+            if tipo in ('object', 'array'):
+                valor = json.loads(valor)
+            elif tipo in ('true', 'false'):
+                valor = bool(valor)
+            campos[chave] = valor
+        return {'tipo': row[0], 'status': row[1], 'erro': row[2], 'campos': campos}
+
+    def cancelar_job(self, job_id):
+        """Marca o job como cancelado; retorna False se ele já tinha terminado."""
+        with self._cursor() as cursor:
+            cursor.execute('''
+            UPDATE jobs SET status = 'cancelado', data_fim = ?
+            WHERE id = ? AND status IN ('pendente', 'executando')
+            ''', (datetime.now(), job_id))
+            cancelado = cursor.rowcount == 1
+        return cancelado
+
+    def contar_jobs_ativos(self):
+        with self._cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('pendente', 'executando')")
+            total = cursor.fetchone()[0]
+        return total
+
+    def listar_jobs_interrompidos(self):
+        """Jobs que ficaram pendentes ou em execução (ex.: o processo caiu no meio)."""
+        with self._cursor() as cursor:
+            cursor.execute('''
+            SELECT id, pid_servidor FROM jobs
+            WHERE status IN ('pendente', 'executando')
+            ORDER BY data_criacao
+            ''')
+            jobs = cursor.fetchall()
+        return [{'id': row[0], 'pid_servidor': row[1]} for row in jobs]
+
+    def assumir_job(self, job_id, pid_anterior, pid_servidor):
+        """Transfere o job para este processo; retorna False se outro processo já o assumiu."""
+        with self._cursor() as cursor:
+            cursor.execute('''
+            UPDATE jobs SET pid_servidor = ?, status = 'pendente', tentativas = tentativas + 1
+            WHERE id = ? AND pid_servidor IS ? AND status IN ('pendente', 'executando')
+            ''', (pid_servidor, job_id, pid_anterior))
+            assumido = cursor.rowcount == 1
+        return assumido
@@ -1,17 +1,74 @@
 import pandas as pd
 import numpy as np
-import plotly.graph_objects as go
-import plotly.io as pio
-from prophet import Prophet
-from sklearn.metrics import r2_score, mean_absolute_error, mean_squared_error
 import warnings
 import io
+import os
+import json
+import hashlib
+import time
 import traceback
+from cubo_agregacao import CuboAgregacao, AcumuladorCubo
+from ingestao import LeitorPlanilha, detectar_formato, encontrar_coluna
+from figuras import compactar_figura
+from instrumentacao import etapa
+import modelos_estatisticos
+from selecao_modelos import PARAMETROS_PROPHET, selecionar_modelos
+from backtesting import executar_backtest
+from ajuste_hiperparametros import busca_successive_halving, gerar_candidatos
+from concurrent.futures import ProcessPoolExecutor
+from processos import contexto_pool_interno
 
 warnings.filterwarnings('ignore')
 
+# Prophet (e o backend Stan), Plotly e scikit-learn são importados só ao ajustar ou plotar,
+# para que o processo web suba sem eles; ver precarregar() para aquecer os processos de previsão
+MODULOS_PESADOS = ('prophet', 'plotly.graph_objects', 'plotly.io', 'sklearn.metrics')
+
+def precarregar(ajustar_modelo=False):
+    """Importa os módulos pesados (e, opcionalmente, ajusta um modelo mínimo para carregar o Stan).
+
+    Usado como inicializador dos processos da fila de jobs, para que o primeiro job de
+    cada processo não pague o custo das importações.
+    """
+    import importlib
+    for modulo in MODULOS_PESADOS:
+        importlib.import_module(modulo)
+    if ajustar_modelo:
+        from prophet import Prophet
+        df = pd.DataFrame({'ds': pd.date_range('2020-01-01', periods=12, freq='MS'), 'y': np.arange(12, dtype='float64')})
+        Prophet(uncertainty_samples=0).fit(df)
+
+def _prever_serie_produto(produto, datas, valores, periodos, freq, cache_modelos, serie=None):
+    """Ajusta o Prophet de um produto; roda nos processos do pool de ``prever_todos_produtos``."""
+    from prophet import Prophet
+    df_prophet = pd.DataFrame({'ds': datas, 'y': valores})
+    params_for_prophet = dict(PARAMETROS_PROPHET)
+    if cache_modelos is None: m = Prophet(**params_for_prophet).fit(df_prophet)
+    else: m = cache_modelos.ajustar(df_prophet, params_for_prophet, serie=serie)
+    # Prevê apenas as datas futuras (o histórico não é necessário na tabela consolidada)
+    future = pd.DataFrame({'ds': pd.date_range(datas[-1], periods=periodos + 1, freq=freq)[1:]})
+    forecast = m.predict(future)
+    return produto, forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']]
+
+def _completar_intervalo(forecast):
+    """Com ``uncertainty_samples=0`` o Prophet não gera ``yhat_lower``/``yhat_upper``; usa o próprio ``yhat``."""
+    for coluna in ('yhat_lower', 'yhat_upper'):
+        if coluna not in forecast.columns:
+            forecast[coluna] = forecast['yhat']
+    return forecast
+
+def id_versao_incremental(versao_base, arquivo_delta):
+    """Identificador dos agregados de ``versao_base`` somados ao arquivo de delta ``arquivo_delta``."""
+    return 'incremental_' + hashlib.sha256(f'{versao_base}|{arquivo_delta}'.encode('utf-8')).hexdigest()[:32]
+
 class FaturamentoForecast:
-    def __init__(self, file_input, coluna_data, coluna_valor, coluna_produto, coluna_cliente, translator=None):
+    # Linhas por bloco na leitura em streaming de XLSX/CSV (ver ingestao.LeitorPlanilha)
+    TAMANHO_BLOCO_INGESTAO = 50000
+    # Nome da série agregada de todo o faturamento na seleção automática de modelos
+    SERIE_TOTAL = '*'
+
+    def __init__(self, file_input, coluna_data, coluna_valor, coluna_produto, coluna_cliente, translator=None,
+                 file_id=None, cache_dados=None, hash_conteudo=None, cache_modelos=None, pasta_cubos=None):
         # Armazena os nomes das colunas fornecidos pelo usuário
         self.user_coluna_data = coluna_data
         self.user_coluna_valor = coluna_valor
@@ -25,33 +82,80 @@ class FaturamentoForecast:
         self.coluna_cliente = None
         
         self.file_input = file_input
+        self.file_id = file_id
+        # Cache colunar opcional (ver cache_dados.CacheDados)
+        self.cache_dados = cache_dados
+        # Hash já conhecido do conteúdo (uploads endereçados por conteúdo), evita reler o arquivo
+        self.hash_conteudo = hash_conteudo
+        # Cache opcional de modelos Prophet ajustados (ver cache_modelos.CacheModelos)
+        self.cache_modelos = cache_modelos
+        # Pasta onde o cubo de agregação é persistido junto ao upload (ver cubo_agregacao.CuboAgregacao)
+        self.pasta_cubos = pasta_cubos
+        self.cubo = None
         # Define um tradutor padrão (que não faz nada) se nenhum for passado
         self._ = translator if translator is not None else lambda s: s
         self.df_raw = None
         self.df_agregado = None
-        self.modelo_prophet = None
+        self.modelo_prophet = None # Modelo final, ajustado na série completa
+        self.modelo_validacao = None # Modelo ajustado apenas no treino, usado nas métricas
+        self.params_prophet = {}
+        self.freq = 'M'
         self.metricas = {}
         self.previsoes_futuras_df = None # DataFrame interno com nomes de coluna padrão
         self.top_produtos_list = []
+        self.versao = file_id # Versão dos agregados (muda nas atualizações incrementais com delta)
+        self.produtos_reajustados = []
+        self.selecoes = {} # Motor escolhido por série na seleção automática (chave: _serie_id)
+
+    def _chave_cache_dados(self):
+        if self.cache_dados is None: return None
+        hash_conteudo = self.hash_conteudo or self.cache_dados.hash_conteudo(self.file_input)
+        return self.cache_dados.gerar_chave(self.file_id, hash_conteudo, {
+            'data': self.user_coluna_data, 'valor': self.user_coluna_valor,
+            'produto': self.user_coluna_produto, 'cliente': self.user_coluna_cliente})
 
+    @etapa('carregar_dados')
     def carregar_dados(self):
         try:
             print("\n--- 1. Carregando dados ---")
+            chave_cache = self._chave_cache_dados()
+            if chave_cache is None:
+                return self._decodificar(None)
+            entrada = self.cache_dados.carregar(chave_cache)
+            if entrada is None:
+                # Só um processo decodifica a planilha; os outros esperam a entrada e a mapeiam
+                with self.cache_dados.trava(chave_cache):
+                    entrada = self.cache_dados.carregar(chave_cache)
+                    if entrada is None:
+                        return self._decodificar(chave_cache)
+            self.df_raw, colunas = entrada
+            self.coluna_data = colunas.get('data')
+            self.coluna_valor = colunas.get('valor')
+            self.coluna_produto = colunas.get('produto', self.user_coluna_produto)
+            self.coluna_cliente = colunas.get('cliente', self.user_coluna_cliente)
+            print("   Dados carregados do cache colunar.")
+            return self.df_raw
+        except Exception as e:
+            print(f"ERRO ao carregar dados: {e}")
+            traceback.print_exc()
+            return None
+
+    def _decodificar(self, chave_cache):
+        """Lê e trata a planilha; com ``chave_cache``, grava a entrada do cache colunar e mapeia dela."""
+        try:
+            formato = detectar_formato(self.file_input)
+            if formato in ('xlsx', 'csv'):
+                return self._carregar_em_blocos(formato, chave_cache)
+
             if isinstance(self.file_input, io.BytesIO): self.df_raw = pd.read_excel(self.file_input)
             else: self.df_raw = pd.read_excel(self.file_input)
             
             # Limpa os nomes das colunas no DataFrame (remove espaços extras)
             self.df_raw.columns = [str(c).strip() for c in self.df_raw.columns]
             
-            # Função auxiliar segura para encontrar o nome real da coluna, ignorando maiúsculas/minúsculas
+            # Encontra o nome real da coluna, ignorando maiúsculas/minúsculas (mantém o informado se não achar)
             def find_actual_column_name(user_provided_name, df_columns):
-                if not user_provided_name: return None
-                for col_name in df_columns:
-                    if col_name.lower() == user_provided_name.lower():
-                        print(f"   Coluna '{user_provided_name}' encontrada como '{col_name}' no arquivo.")
-                        return col_name
-                print(f"   AVISO: A coluna especificada '{user_provided_name}' não foi encontrada.")
-                return user_provided_name
+                return encontrar_coluna(user_provided_name, df_columns) or user_provided_name
 
             all_df_columns = self.df_raw.columns
             self.coluna_data = find_actual_column_name(self.user_coluna_data, all_df_columns)
@@ -65,6 +169,15 @@ class FaturamentoForecast:
             self.df_raw[self.coluna_data] = pd.to_datetime(self.df_raw[self.coluna_data], errors='coerce')
             self.df_raw = self.df_raw.dropna(subset=[self.coluna_data])
             self.df_raw[self.coluna_valor] = pd.to_numeric(self.df_raw[self.coluna_valor], errors='coerce').fillna(0)
+
+            if chave_cache is not None:
+                # Guarda apenas as colunas usadas pela análise, já tratadas
+                colunas = {'data': self.coluna_data, 'valor': self.coluna_valor}
+                if self.coluna_produto in all_df_columns: colunas['produto'] = self.coluna_produto
+                if self.coluna_cliente in all_df_columns: colunas['cliente'] = self.coluna_cliente
+                self.cache_dados.salvar(chave_cache, self.df_raw, colunas)
+                entrada = self.cache_dados.carregar(chave_cache)
+                if entrada is not None: self.df_raw = entrada[0]
             
             print("   Dados carregados e tratados.")
             return self.df_raw
@@ -73,6 +186,57 @@ class FaturamentoForecast:
             traceback.print_exc()
             return None
 
+    def _carregar_em_blocos(self, formato, chave_cache):
+        """Leitura em streaming: só as quatro colunas, tipadas bloco a bloco e já somadas no cubo.
+
+        Com cache colunar, os blocos vão direto para o disco e ``df_raw`` é mapeado em memória;
+        sem cache, as colunas tipadas são concatenadas (24 bytes por linha, em vez do DataFrame
+        inteiro da planilha).
+        """
+        leitor = LeitorPlanilha(self.file_input, {
+            'data': self.user_coluna_data, 'valor': self.user_coluna_valor,
+            'produto': self.user_coluna_produto, 'cliente': self.user_coluna_cliente},
+            formato=formato, tamanho_bloco=self.TAMANHO_BLOCO_INGESTAO)
+        acumulador = AcumuladorCubo()
+
+        def blocos():
+            for bloco in leitor.blocos():
+                acumulador.adicionar(bloco)
+                yield bloco
+
+        def descrever():
+            return dict(leitor.colunas), leitor.categorias
+
+        if chave_cache is not None:
+            self.cache_dados.salvar_blocos(chave_cache, blocos(), descrever)
+            self.df_raw, _ = self.cache_dados.carregar(chave_cache)
+        else:
+            partes = list(blocos())
+            if not partes or not sum(len(p['data']) for p in partes):
+                raise ValueError("Nenhuma linha com data válida no arquivo.")
+            colunas, categorias = descrever()
+            dados = {}
+            for papel, nome in colunas.items():
+                arr = np.concatenate([p[papel] for p in partes])
+                dados[nome] = pd.Categorical.from_codes(arr, categories=categorias[papel]) if papel in categorias else arr
+            self.df_raw = pd.DataFrame(dados, copy=False)
+
+        self.coluna_data = leitor.colunas['data']
+        self.coluna_valor = leitor.colunas['valor']
+        self.coluna_produto = leitor.colunas.get('produto', self.user_coluna_produto)
+        self.coluna_cliente = leitor.colunas.get('cliente', self.user_coluna_cliente)
+
+        # O cubo mensal sai da mesma passada; não é preciso reler df_raw em obter_cubo
+        self.cubo = acumulador.finalizar(leitor.categorias.get('produto'), leitor.categorias.get('cliente'), {
+            'data': self.coluna_data, 'valor': self.coluna_valor,
+            'produto': leitor.colunas.get('produto'), 'cliente': leitor.colunas.get('cliente')})
+        caminho_cubo = self._caminho_cubo()
+        if self.cubo is not None and caminho_cubo is not None and not os.path.exists(caminho_cubo):
+            self.cubo.salvar(caminho_cubo)
+        print(f"   Dados lidos em blocos ({formato}): {len(self.df_raw)} linhas.")
+        return self.df_raw
+
+    @etapa('kpis')
     def calcular_kpis_gerais(self):
         if self.df_raw is None: return {}
         print("\n--- Calculando KPIs Gerais ---")
@@ -94,18 +258,61 @@ class FaturamentoForecast:
             print(f"ERRO ao calcular KPIs: {e}")
             return {}
             
+    def _caminho_cubo(self, versao=None):
+        versao = versao or self.file_id
+        if self.pasta_cubos is None or versao is None: return None
+        mapeamento = json.dumps([(c or '').strip().lower() for c in (self.user_coluna_data, self.user_coluna_valor,
+                                                                     self.user_coluna_produto, self.user_coluna_cliente)])
+        return os.path.join(self.pasta_cubos, f"cubo_{versao}_{hashlib.sha256(mapeamento.encode('utf-8')).hexdigest()[:16]}.npz")
+
+    def _cubo_da_versao(self, versao):
+        """Cubo salvo de outra versão (upload ou resultado incremental), montado do upload se preciso."""
+        if self.pasta_cubos is None: return None
+        cubo = CuboAgregacao.carregar(self._caminho_cubo(versao))
+        if cubo is None and os.path.isfile(os.path.join(self.pasta_cubos, versao)):
+            outra = FaturamentoForecast(os.path.join(self.pasta_cubos, versao), self.user_coluna_data, self.user_coluna_valor,
+                                        self.user_coluna_produto, self.user_coluna_cliente, file_id=versao,
+                                        cache_dados=self.cache_dados, pasta_cubos=self.pasta_cubos)
+            if outra.carregar_dados() is not None: cubo = outra.obter_cubo()
+        return cubo
+
+    def obter_cubo(self):
+        """Cubo mensal produto x cliente: carregado do disco ou construído uma vez a partir de ``df_raw``."""
+        if self.cubo is not None: return self.cubo
+        caminho = self._caminho_cubo()
+        try:
+            if caminho is not None:
+                self.cubo = CuboAgregacao.carregar(caminho)
+            if self.cubo is None and self.df_raw is not None and not self.df_raw.empty:
+                coluna_produto = self.coluna_produto if self.coluna_produto in self.df_raw.columns else None
+                coluna_cliente = self.coluna_cliente if self.coluna_cliente in self.df_raw.columns else None
+                self.cubo = CuboAgregacao.construir(self.df_raw, self.coluna_data, self.coluna_valor, coluna_produto, coluna_cliente)
+                if caminho is not None: self.cubo.salvar(caminho)
+        except Exception as e:
+            print(f"   AVISO: cubo de agregação indisponível: {e}")
+            self.cubo = None
+        return self.cubo
+
+    @etapa('agregar_dados')
     def agregar_dados(self, freq='M'):
         if self.df_raw is None: return None
+        self.freq = freq
         try:
+            if freq == 'M' and self.obter_cubo() is not None:
+                self.df_agregado = self.cubo.serie_total().to_frame()
+                return self.df_agregado
             df_para_agregar = self.df_raw.set_index(self.coluna_data)
             self.df_agregado = df_para_agregar.resample(freq)[self.coluna_valor].sum().to_frame()
             return self.df_agregado
         except Exception: return None
 
     def calcular_metricas(self, y_real, y_pred):
+        from sklearn.metrics import r2_score, mean_absolute_error, mean_squared_error
         return {'MAE': mean_absolute_error(y_real, y_pred), 'RMSE': np.sqrt(mean_squared_error(y_real, y_pred)), 'R²': r2_score(y_real, y_pred)}
 
+    @etapa('grafico')
     def plotar_previsoes_validacao(self, dados_treino_reais, dados_teste_reais, previsoes_teste, intervalo_confianca, modelo_nome):
+        import plotly.graph_objects as go
         fig = go.Figure()
         fig.add_trace(go.Scatter(x=dados_treino_reais.index, y=dados_treino_reais, mode='lines', name=self._('Histórico (Treino)'), line=dict(color='silver')))
         fig.add_trace(go.Scatter(x=dados_teste_reais.index, y=dados_teste_reais, mode='markers+lines', name=self._('Valores Reais (Teste)'), line=dict(color='#2ca02c')))
@@ -114,34 +321,43 @@ class FaturamentoForecast:
             fig.add_trace(go.Scatter(x=intervalo_confianca.index, y=intervalo_confianca['IC_Superior'], mode='lines', line=dict(width=0), showlegend=False, hoverinfo='none'))
             fig.add_trace(go.Scatter(x=intervalo_confianca.index, y=intervalo_confianca['IC_Inferior'], mode='lines', line=dict(width=0), fill='tonexty', fillcolor='rgba(255, 127, 14, 0.2)', name=self._('Intervalo de Confiança'), hoverinfo='none'))
         fig.update_layout(title=self._('Validação do Modelo %(modelo)s: Previsão vs. Real') % {'modelo': modelo_nome}, xaxis_title=self._('Data'), yaxis_title=self.coluna_valor, template='plotly_dark', height=600, legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
-        return pio.to_html(fig, full_html=False, config={'displayModeBar': False})
+        return compactar_figura(fig, template='plotly_dark', config={'displayModeBar': False})
 
+    @etapa('grafico')
     def plotar_previsao_futura(self, periodos, modelo_nome):
         if self.previsoes_futuras_df is None: return None
+        import plotly.graph_objects as go
         fig = go.Figure()
         fig.add_trace(go.Scatter(x=self.df_agregado.index, y=self.df_agregado[self.coluna_valor], mode='lines', name=self._('Histórico Completo'), line=dict(color='#1f77b4')))
         fig.add_trace(go.Scatter(x=self.previsoes_futuras_df.index, y=self.previsoes_futuras_df['Previsao'], mode='lines', name=self._('Previsão Futura'), line=dict(color='#ff7f0e', dash='dash')))
         fig.add_trace(go.Scatter(x=self.previsoes_futuras_df.index, y=self.previsoes_futuras_df['IC_Superior'], mode='lines', line=dict(width=0), showlegend=False, hoverinfo='none'))
         fig.add_trace(go.Scatter(x=self.previsoes_futuras_df.index, y=self.previsoes_futuras_df['IC_Inferior'], mode='lines', line=dict(width=0), fill='tonexty', fillcolor='rgba(255, 127, 14, 0.2)', name=self._('Intervalo de Confiança'), hoverinfo='none'))
         fig.update_layout(title=self._('Previsão de %(valor)s (%(modelo)s) - Próximos %(n)s Períodos') % {'valor': self.coluna_valor, 'modelo': modelo_nome, 'n': periodos}, xaxis_title=self._('Data'), yaxis_title=self.coluna_valor, template='plotly_dark', height=600, legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
-        return pio.to_html(fig, full_html=False, config={'displayModeBar': False})
+        return compactar_figura(fig, template='plotly_dark', config={'displayModeBar': False})
 
     def fazer_previsao_futura_prophet(self, periodos=12):
-        if self.modelo_prophet is None: return None, None
-        
-        future_dates_df = self.modelo_prophet.make_future_dataframe(periods=periodos, freq='MS')
-        forecast = self.modelo_prophet.predict(future_dates_df)
+        if self.df_agregado is None or not self.params_prophet: return None, None
+
+        # Ajuste final na série completa (incluindo os meses de teste), prevendo só as datas futuras
+        df_prophet = self.df_agregado.reset_index().rename(columns={self.coluna_data: 'ds', self.coluna_valor: 'y'})
+        self.modelo_prophet = self._ajustar_prophet(df_prophet, **self.params_prophet)
+        datas_futuras = pd.date_range(df_prophet['ds'].iloc[-1], periods=periodos + 1, freq=self.freq)[1:]
+        with etapa('predict_prophet'):
+            forecast = _completar_intervalo(self.modelo_prophet.predict(pd.DataFrame({'ds': datas_futuras})))
         
         # Cria o DataFrame com nomes de coluna padrão para uso interno (plotagem, download)
         df_interno = forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].rename(columns={
             'ds': 'Data', 'yhat': 'Previsao', 'yhat_lower': 'IC_Inferior', 'yhat_upper': 'IC_Superior'
-        }).set_index('Data').tail(periodos)
-        
+        }).set_index('Data')
+        return self._registrar_previsao_futura(df_interno, periodos, 'Prophet')
+
+    def _registrar_previsao_futura(self, df_interno, periodos, modelo_nome):
+        """Guarda a previsão futura (colunas padrão) e retorna ``(df traduzido, figura)``."""
         # Armazena a versão interna com nomes padrão
         self.previsoes_futuras_df = df_interno
 
         # Gera o gráfico usando o DataFrame interno
-        fig_futura_html = self.plotar_previsao_futura(periodos, 'Prophet')
+        fig_futura_html = self.plotar_previsao_futura(periodos, modelo_nome)
         
         # Cria uma cópia com nomes traduzidos apenas para exibição na tabela HTML
         df_display = df_interno.copy()
@@ -152,82 +368,391 @@ class FaturamentoForecast:
         # Isso garante que o índice continue sendo as datas.
         return df_display, fig_futura_html
     
+    @etapa('ajuste_prophet')
+    def _ajustar_prophet(self, df_prophet, uncertainty_samples=None, **params_for_prophet):
+        # Reaproveita um modelo já ajustado para a mesma série e parâmetros, se houver cache
+        if self.cache_modelos is None:
+            from prophet import Prophet
+            modelo = Prophet(**params_for_prophet).fit(df_prophet)
+        else:
+            modelo = self.cache_modelos.ajustar(df_prophet, params_for_prophet)
+        # A amostragem só afeta o predict; fica fora da chave do cache
+        if uncertainty_samples is not None:
+            modelo.uncertainty_samples = int(uncertainty_samples)
+        return modelo
+
+    @staticmethod
+    def _parametros_prophet(prophet_kwargs):
+        return {
+            'seasonality_mode': prophet_kwargs.get('prophet_seasonality_mode') or 'additive',
+            'changepoint_prior_scale': float(prophet_kwargs.get('prophet_changepoint_prior_scale', 0.05)),
+            'seasonality_prior_scale': float(prophet_kwargs.get('prophet_seasonality_prior_scale', 10.0)),
+            # Amostras para os intervalos de confiança; 0 desliga os intervalos (mais rápido)
+            'uncertainty_samples': int(prophet_kwargs.get('prophet_uncertainty_samples', 1000))}
+
     def treinar_modelo_prophet(self, dados_teste_ratio=0.2, **prophet_kwargs):
         if self.df_agregado is None: return None, {}
         df_prophet = self.df_agregado.reset_index().rename(columns={self.coluna_data: 'ds', self.coluna_valor: 'y'})
         split_idx = int(len(df_prophet) * (1 - dados_teste_ratio))
         df_train, df_test = df_prophet.iloc[:split_idx], df_prophet.iloc[split_idx:]
         
-        params_for_prophet = {
-            'seasonality_mode': prophet_kwargs.get('prophet_seasonality_mode', 'additive'),
-            'changepoint_prior_scale': float(prophet_kwargs.get('prophet_changepoint_prior_scale', 0.05)),
-            'seasonality_prior_scale': float(prophet_kwargs.get('prophet_seasonality_prior_scale', 10.0))}
+        params_for_prophet = self._parametros_prophet(prophet_kwargs)
+        self.params_prophet = params_for_prophet
         
-        self.modelo_prophet = Prophet(**params_for_prophet).fit(df_train)
-        forecast_test = self.modelo_prophet.predict(df_test[['ds']].copy())
+        self.modelo_validacao = self._ajustar_prophet(df_train, **params_for_prophet)
+        with etapa('predict_prophet'):
+            forecast_test = _completar_intervalo(self.modelo_validacao.predict(df_test[['ds']].copy()))
         results_test = pd.merge(df_test, forecast_test, on='ds')
         self.metricas = self.calcular_metricas(results_test['y'], results_test['yhat'])
         intervalo_conf_df = results_test[['ds', 'yhat_lower', 'yhat_upper']].rename(columns={'yhat_lower':'IC_Inferior', 'yhat_upper':'IC_Superior'}).set_index('ds')
         
         fig_validacao_html = self.plotar_previsoes_validacao(df_train.set_index('ds')['y'], results_test.set_index('ds')['y'], results_test.set_index('ds')['yhat'], intervalo_conf_df, 'Prophet')
-        return self.modelo_prophet, {'validacao': fig_validacao_html}
+        return self.modelo_validacao, {'validacao': fig_validacao_html}
 
-    def comparar_previsao_produtos(self, nome_produto_1, nome_produto_2, freq='M', periodos=12):
-        def _gerar_grafico_plotly(nome_produto):
+    def _sazonalidade(self):
+        return modelos_estatisticos.SAZONALIDADE_POR_FREQ.get(self.freq, 12)
+
+    def treinar_modelo_estatistico(self, modelo_tipo, dados_teste_ratio=0.2):
+        """Validação de um dos ``modelos_estatisticos.MODELOS`` no mesmo corte e métricas do Prophet."""
+        if self.df_agregado is None: return None, {}
+        serie = self.df_agregado[self.coluna_valor]
+        split_idx = int(len(serie) * (1 - dados_teste_ratio))
+        treino, teste = serie.iloc[:split_idx], serie.iloc[split_idx:]
+        with etapa('modelo_estatistico'):
+            previsao, inferior, superior = modelos_estatisticos.prever(
+                treino.to_numpy(dtype='float64'), modelo_tipo, len(teste), sazonalidade=self._sazonalidade())
+        self.metricas = self.calcular_metricas(teste.to_numpy(), previsao)
+        intervalo_conf_df = pd.DataFrame({'IC_Inferior': inferior, 'IC_Superior': superior}, index=teste.index)
+        nome = modelos_estatisticos.NOMES[modelo_tipo]
+        fig_validacao = self.plotar_previsoes_validacao(treino, teste, pd.Series(previsao, index=teste.index),
+                                                        intervalo_conf_df, nome)
+        return modelo_tipo, {'validacao': fig_validacao}
+
+    def fazer_previsao_futura_estatistica(self, modelo_tipo, periodos=12):
+        """Previsão futura com um modelo estatístico ajustado na série completa."""
+        if self.df_agregado is None: return None, None
+        serie = self.df_agregado[self.coluna_valor]
+        with etapa('modelo_estatistico'):
+            previsao, inferior, superior = modelos_estatisticos.prever(
+                serie.to_numpy(dtype='float64'), modelo_tipo, periodos, sazonalidade=self._sazonalidade())
+        datas_futuras = pd.date_range(serie.index[-1], periods=periodos + 1, freq=self.freq)[1:]
+        df_interno = pd.DataFrame({'Previsao': previsao, 'IC_Inferior': inferior, 'IC_Superior': superior},
+                                  index=pd.Index(datas_futuras, name='Data'))
+        return self._registrar_previsao_futura(df_interno, periodos, modelos_estatisticos.NOMES[modelo_tipo])
+
+    def executar_backtest(self, horizonte=3, min_treino=12, passo=1, max_dobras=None, max_workers=None, **prophet_kwargs):
+        """Backtesting com origem móvel da série agregada (ver backtesting.executar_backtest)."""
+        if self.df_agregado is None: return None
+        params_for_prophet = self._parametros_prophet(prophet_kwargs)
+        params_for_prophet.pop('uncertainty_samples')
+        return executar_backtest(self.df_agregado[self.coluna_valor], params_for_prophet, horizonte=horizonte,
+                                 min_treino=min_treino, passo=passo, max_dobras=max_dobras,
+                                 max_workers=max_workers, cache_modelos=self.cache_modelos)
+
+    @etapa('ajuste_hiperparametros')
+    def ajustar_hiperparametros(self, dados_teste_ratio=0.2, horizonte=3, n_candidatos=None, eta=3, max_workers=None):
+        """Procura os priors e o modo de sazonalidade com menor RMSE no backtesting.
+
+        As dobras começam no mesmo ponto de corte da validação (``dados_teste_ratio``).
+        Retorna o resumo da busca (ver ajuste_hiperparametros.busca_successive_halving).
+        """
+        if self.df_agregado is None: return None
+        serie = self.df_agregado[self.coluna_valor]
+        horizonte = max(1, min(int(horizonte), len(serie) - int(len(serie) * (1 - dados_teste_ratio))))
+        min_treino = max(2, int(len(serie) * (1 - dados_teste_ratio)))
+        return busca_successive_halving(serie, gerar_candidatos(n_candidatos=n_candidatos), horizonte=horizonte,
+                                        min_treino=min_treino, eta=eta, max_workers=max_workers,
+                                        cache_modelos=self.cache_modelos)
+
+    @etapa('comparacao_produtos')
+    def comparar_previsao_produtos(self, nome_produto_1, nome_produto_2, freq='M', periodos=12, selecoes_anteriores=None):
+        """Gráficos de previsão de dois produtos, cada um com o motor escolhido pela seleção automática."""
+        import plotly.graph_objects as go
+
+        def _serie_agregada(nome_produto):
             if not self.coluna_produto or self.coluna_produto not in self.df_raw.columns: return None
-            df_prod = self.df_raw[self.df_raw[self.coluna_produto] == nome_produto].copy()
-            if df_prod.empty: return None
-            
-            df_prod_agg = df_prod.set_index(self.coluna_data).resample(freq)[self.coluna_valor].sum().fillna(0)
+            if freq == 'M' and self.obter_cubo() is not None:
+                df_prod_agg = self.cubo.serie_produto(nome_produto)
+                if df_prod_agg is None or df_prod_agg.empty: return None
+            else:
+                df_prod = self.df_raw[self.df_raw[self.coluna_produto] == nome_produto].copy()
+                if df_prod.empty: return None
+                df_prod_agg = df_prod.set_index(self.coluna_data).resample(freq)[self.coluna_valor].sum().fillna(0)
+            # Séries esparsas também entram, até com um único período (ver abaixo)
+            return df_prod_agg
+
+        def _gerar_grafico_plotly(nome_produto, df_prod_agg, modelo):
             df_prophet = df_prod_agg.reset_index().rename(columns={self.coluna_data: 'ds', self.coluna_valor: 'y'})
-            if len(df_prophet) < 5: return None
-            
-            m = Prophet(seasonality_mode='multiplicative').fit(df_prophet)
-            future = m.make_future_dataframe(periods=periodos, freq='MS')
-            forecast = m.predict(future)
-            
+            if modelo == 'prophet':
+                m = self._ajustar_prophet(df_prophet, **PARAMETROS_PROPHET)
+                # Mesma grade de datas dos motores estatísticos (a frequência da agregação)
+                future = m.make_future_dataframe(periods=periodos, freq=freq)
+                forecast = m.predict(future)
+            else:
+                previsao, inferior, superior = modelos_estatisticos.prever(
+                    df_prophet['y'].to_numpy(dtype='float64'), modelo, periodos,
+                    sazonalidade=modelos_estatisticos.SAZONALIDADE_POR_FREQ.get(freq, 12))
+                forecast = pd.DataFrame({'ds': pd.date_range(df_prophet['ds'].iloc[-1], periods=periodos + 1, freq=freq)[1:],
+                                         'yhat': previsao, 'yhat_lower': inferior, 'yhat_upper': superior})
+            nome_modelo = 'Prophet' if modelo == 'prophet' else modelos_estatisticos.NOMES[modelo]
+
             fig = go.Figure()
             fig.add_trace(go.Scatter(x=forecast['ds'], y=forecast['yhat_upper'], mode='lines', line=dict(width=0), hoverinfo="none", showlegend=False, fillcolor='rgba(131, 192, 232, 0.3)'))
             fig.add_trace(go.Scatter(name=self._('Intervalo de Confiança'), x=forecast['ds'], y=forecast['yhat_lower'], mode='lines', line=dict(width=0), fill='tonexty', fillcolor='rgba(131, 192, 232, 0.3)', hoverinfo="none"))
-            fig.add_trace(go.Scatter(name=self._('Previsão'), x=forecast['ds'], y=forecast['yhat'], mode='lines', line=dict(dash='dash')))
+            fig.add_trace(go.Scatter(name=f"{self._('Previsão')} ({nome_modelo})", x=forecast['ds'], y=forecast['yhat'], mode='lines', line=dict(dash='dash')))
             fig.add_trace(go.Scatter(name=self._('Histórico'), x=df_prophet['ds'], y=df_prophet['y'], mode='lines'))
             fig.update_layout(title=self._('Previsão para: %(produto)s') % {'produto': nome_produto[:30] + '...'}, xaxis_title=self._('Data'), yaxis_title=self._('Valor Total'), template='plotly_dark')
-            return pio.to_json(fig)
+            return compactar_figura(fig, template='plotly_dark')
 
-        plot_json_1 = _gerar_grafico_plotly(nome_produto_1)
-        plot_json_2 = _gerar_grafico_plotly(nome_produto_2)
+        series = {nome: _serie_agregada(nome) for nome in (nome_produto_1, nome_produto_2)}
+        series = {nome: serie for nome, serie in series.items() if serie is not None}
+        # Com um só período não há o que comparar: o naive sazonal repete esse valor
+        modelos = {nome: 'naive_sazonal' for nome, serie in series.items() if len(serie) < 2}
+        avaliar = {nome: serie for nome, serie in series.items() if nome not in modelos}
+        registros = self.selecionar_modelos(avaliar, selecoes_anteriores=selecoes_anteriores) if avaliar else {}
+        modelos.update({nome: registro['modelo'] for nome, registro in registros.items()})
+        plot_json_1, plot_json_2 = (
+            _gerar_grafico_plotly(nome, series[nome], modelos[nome]) if nome in series else None
+            for nome in (nome_produto_1, nome_produto_2))
         return plot_json_1, plot_json_2
 
+    def _totais_produto(self):
+        if self.obter_cubo() is not None: return self.cubo.totais_produto()
+        return self.df_raw.groupby(self.coluna_produto, observed=True)[self.coluna_valor].sum()
+
+    def matriz_produtos(self, freq='M', produtos=None):
+        """Matriz produto x período com um único groupby/resample sobre ``df_raw``.
+
+        Períodos sem venda dentro do intervalo de cada produto ficam com 0; períodos antes da
+        primeira ou depois da última venda do produto ficam como NaN.
+        """
+        if self.df_raw is None or not self.coluna_produto or self.coluna_produto not in self.df_raw.columns: return None
+        if freq == 'M' and self.obter_cubo() is not None: return self.cubo.matriz_produtos(produtos)
+        df = self.df_raw
+        if produtos is not None: df = df[df[self.coluna_produto].isin(produtos)]
+        matriz = df.groupby([self.coluna_produto, pd.Grouper(key=self.coluna_data, freq=freq)], observed=True)[self.coluna_valor].sum().unstack()
+        # Preenche com 0 apenas os buracos entre a primeira e a última venda de cada produto
+        dentro_intervalo = matriz.ffill(axis=1).notna() & matriz.bfill(axis=1).notna()
+        return matriz.fillna(0).where(dentro_intervalo)
+
+    def _serie_id(self, produto):
+        """Identificador estável da série de um produto (cache de modelos e seleção automática)."""
+        return f"{self.coluna_valor}|{produto}"
+
+    @etapa('selecao_modelos')
+    def selecionar_modelos(self, series, selecoes_anteriores=None, max_workers=None):
+        """Seleção automática de motor para ``{produto: serie}`` (ver selecao_modelos.selecionar_modelos).
+
+        ``selecoes_anteriores`` e ``self.selecoes`` usam ``_serie_id`` como chave; o retorno
+        é indexado pelo produto.
+        """
+        anteriores = {produto: (selecoes_anteriores or {}).get(self._serie_id(produto)) for produto in series}
+        registros = selecionar_modelos(series, sazonalidade=modelos_estatisticos.SAZONALIDADE_POR_FREQ.get(self.freq, 12),
+                                       max_workers=max_workers, anteriores=anteriores, cache_modelos=self.cache_modelos)
+        self.selecoes.update({self._serie_id(produto): registro for produto, registro in registros.items()})
+        return registros
+
+    @etapa('lote_produtos')
+    def prever_todos_produtos(self, top_n=None, periodos=12, freq='M', max_workers=None, min_periodos=None,
+                              alterados=None, previsao_anterior=None, modelo_tipo='prophet', selecoes_anteriores=None):
+        """Previsão em lote de todos os produtos (ou dos ``top_n`` de maior faturamento).
+
+        Retorna ``(df_consolidado, ignorados)``; os ajustes do Prophet são distribuídos em um
+        pool de processos. Produtos com menos de ``min_periodos`` períodos são ignorados.
+        Com ``alterados`` e ``previsao_anterior`` (tabela consolidada de uma execução
+        anterior), os produtos fora de ``alterados`` reaproveitam as linhas anteriores sem
+        novo ajuste (ver ``atualizar_incremental``). Com um dos ``modelos_estatisticos.MODELOS``
+        em ``modelo_tipo``, todas as séries são previstas juntas, sem o pool de processos. Com
+        ``'auto'``, cada série usa o motor escolhido por ``selecionar_modelos`` e séries curtas
+        (a partir de 2 períodos; 5 nos demais modos) deixam de ser ignoradas.
+        """
+        if min_periodos is None: min_periodos = 2 if modelo_tipo == 'auto' else 5
+        if self.df_raw is None or not self.coluna_produto or self.coluna_produto not in self.df_raw.columns: return None, []
+        produtos = None
+        if top_n:
+            produtos = self._totais_produto().nlargest(int(top_n)).index
+        matriz = self.matriz_produtos(freq=freq, produtos=produtos)
+
+        anteriores = {}
+        if alterados is not None and previsao_anterior is not None:
+            alterados = {str(p) for p in alterados}
+            anteriores = {str(p): df for p, df in previsao_anterior.groupby('Produto', sort=False)
+                          if str(p) not in alterados and len(df) == periodos}
+
+        tarefas, ignorados, partes = [], [], {}
+        for produto, serie in matriz.iterrows():
+            serie = serie.dropna()
+            if len(serie) < min_periodos:
+                ignorados.append(produto)
+                continue
+            if str(produto) in anteriores:
+                partes[produto] = anteriores[str(produto)].assign(Produto=produto)
+                continue
+            tarefas.append((produto, serie.index.to_numpy(), serie.to_numpy(dtype='float64')))
+
+        print(f"\n--- Previsão em lote: {len(tarefas)} produtos ({len(partes)} reaproveitados, {len(ignorados)} ignorados) ---")
+        self.produtos_reajustados = [produto for produto, _, _ in tarefas]
+        modelos = {produto: modelo_tipo for produto, _, _ in tarefas}
+        if modelo_tipo == 'auto' and tarefas:
+            registros = self.selecionar_modelos({produto: pd.Series(valores, index=datas) for produto, datas, valores in tarefas},
+                                                selecoes_anteriores=selecoes_anteriores, max_workers=max_workers)
+            modelos = {produto: registro['modelo'] for produto, registro in registros.items()}
+        for modelo in modelos_estatisticos.MODELOS:
+            grupo = [tarefa for tarefa in tarefas if modelos[tarefa[0]] == modelo]
+            if grupo: partes.update(self._prever_lote_estatistico(grupo, periodos, freq, modelo))
+        tarefas_prophet = [tarefa for tarefa in tarefas if modelos[tarefa[0]] not in modelos_estatisticos.MODELOS]
+        if tarefas_prophet:
+            with ProcessPoolExecutor(max_workers=min(max_workers or os.cpu_count(), len(tarefas_prophet)),
+                                     mp_context=contexto_pool_interno()) as executor:
+                futures = [executor.submit(_prever_serie_produto, produto, datas, valores, periodos, freq, self.cache_modelos,
+                                           self._serie_id(produto))
+                           for produto, datas, valores in tarefas_prophet]
+                for future in futures:
+                    try:
+                        produto, forecast = future.result()
+                    except Exception as e:
+                        print(f"ERRO na previsão em lote: {e}")
+                        continue
+                    forecast = forecast.rename(columns={'ds': 'Data', 'yhat': 'Previsao', 'yhat_lower': 'IC_Inferior', 'yhat_upper': 'IC_Superior'})
+                    forecast.insert(0, 'Produto', produto)
+                    partes[produto] = forecast
+
+        if not partes: return pd.DataFrame(columns=['Produto', 'Data', 'Previsao', 'IC_Inferior', 'IC_Superior']), ignorados
+        # Mantém a ordem da matriz de produtos, reaproveitados ou não
+        return pd.concat([partes[p] for p in matriz.index if p in partes], ignore_index=True), ignorados
+
+    def _prever_lote_estatistico(self, tarefas, periodos, freq, modelo_tipo):
+        """Previsões de todas as tarefas ``(produto, datas, valores)`` em uma única chamada vetorizada."""
+        # Séries alinhadas pelo fim (a última venda de cada produto), com NaN antes da primeira
+        comprimento = max(len(valores) for _, _, valores in tarefas)
+        Y = np.full((len(tarefas), comprimento), np.nan)
+        for i, (_, _, valores) in enumerate(tarefas):
+            Y[i, comprimento - len(valores):] = valores
+        previsao, inferior, superior = modelos_estatisticos.prever(
+            Y, modelo_tipo, periodos, sazonalidade=modelos_estatisticos.SAZONALIDADE_POR_FREQ.get(freq, 12))
+        partes = {}
+        for i, (produto, datas, _) in enumerate(tarefas):
+            partes[produto] = pd.DataFrame({
+                'Produto': produto, 'Data': pd.date_range(datas[-1], periods=periodos + 1, freq=freq)[1:],
+                'Previsao': previsao[i], 'IC_Inferior': inferior[i], 'IC_Superior': superior[i]})
+        return partes
+
+    def atualizar_incremental(self, versao_base, delta=False, previsao_anterior=None, periodos=12,
+                              max_workers=None, min_periodos=None, modelo_tipo='prophet', selecoes_anteriores=None):
+        """Atualização mensal da previsão em lote sem reprocessar o histórico.
+
+        ``versao_base`` identifica os agregados já salvos (um upload anterior ou o resultado de
+        outra atualização incremental). Com ``delta=True`` o arquivo desta instância contém só
+        as linhas novas, somadas ao cubo da base (salvo como ``self.versao``); senão é a nova
+        exportação completa, comparada com a base. Só os produtos cuja série mudou são
+        reajustados (partindo do modelo anterior via ``CacheModelos``); os demais reaproveitam
+        ``previsao_anterior``.
+
+        Retorna ``(df_consolidado, ignorados, alteracoes)``.
+        """
+        if self.df_raw is None and self.carregar_dados() is None:
+            raise ValueError("Erro no carregamento dos dados.")
+        base = self._cubo_da_versao(versao_base)
+        if base is None:
+            raise ValueError("Agregados da versão base não encontrados.")
+        novo = self.obter_cubo()
+        if novo is None:
+            raise ValueError("Erro na agregação dos dados.")
+        if delta:
+            self.versao = id_versao_incremental(versao_base, self.file_id)
+            self.cubo = base.mesclar(novo)
+            if self.pasta_cubos is not None: self.cubo.salvar(self._caminho_cubo(self.versao))
+        else:
+            self.versao = self.file_id
+        produtos_alterados, meses_alterados = self.cubo.diferenca(base)
+        print(f"   Atualização incremental: {len(produtos_alterados)} produtos e {len(meses_alterados)} meses alterados.")
+
+        df_lote, ignorados = self.prever_todos_produtos(periodos=periodos, max_workers=max_workers, min_periodos=min_periodos,
+                                                        alterados=produtos_alterados, previsao_anterior=previsao_anterior,
+                                                        modelo_tipo=modelo_tipo, selecoes_anteriores=selecoes_anteriores)
+        return df_lote, ignorados, {
+            'versao': self.versao,
+            'produtos_alterados': [str(p) for p in produtos_alterados],
+            'meses_alterados': [d.strftime('%Y-%m') for d in meses_alterados],
+            'reajustados': [str(p) for p in self.produtos_reajustados]
+        }
+
     def executar_pipeline_completo(self, **kwargs):
         results = {
             'df_raw': None, 'df_agregado': None, 'modelo': None, 'metricas': {}, 'kpis_gerais': {}, 
             'validacao_fig': None, 'previsao_futura_df': None, 'previsao_futura_fig': None, 
-            'top_produtos_list': [], 'previsao_futura_df_interno': None
+            'top_produtos_list': [], 'previsao_futura_df_interno': None, 'ajuste': None, 'selecao': None
         }
+        # ``ao_progresso(etapa, segundos, results)`` é chamado ao fim de cada etapa, com o que já está
+        # pronto em ``results`` (ver jobs.relatar_progresso)
+        ao_progresso = kwargs.pop('ao_progresso', None)
+        marca = [time.perf_counter()]
+        def progresso(etapa):
+            agora = time.perf_counter()
+            if ao_progresso is not None: ao_progresso(etapa, agora - marca[0], results)
+            marca[0] = agora
+
         try:
             results['df_raw'] = self.carregar_dados()
             if results['df_raw'] is None: raise ValueError("Erro no carregamento dos dados.")
+            progresso('carregado')
             
             results['kpis_gerais'] = self.calcular_kpis_gerais()
+            if self.coluna_produto and self.coluna_produto in self.df_raw.columns:
+                 results['top_produtos_list'] = self._totais_produto().nlargest(20).index.tolist()
+            progresso('kpis')
             results['df_agregado'] = self.agregar_dados(freq=kwargs.get('freq_agg', 'M'))
             if results['df_agregado'] is None: raise ValueError("Erro na agregação dos dados.")
+            progresso('agregado')
 
-            if kwargs.get('modelo_tipo', 'prophet').lower() == 'prophet':
+            modelo_tipo = (kwargs.get('modelo_tipo') or 'prophet').lower()
+            if modelo_tipo == 'auto':
+                # A série total passa pela mesma seleção automática das séries por produto
+                serie = self.df_agregado[self.coluna_valor]
+                results['selecao'] = self.selecionar_modelos({self.SERIE_TOTAL: serie}, kwargs.get('selecoes_anteriores'))[self.SERIE_TOTAL]
+                modelo_tipo = results['selecao']['modelo']
+            if modelo_tipo == 'prophet':
+                if kwargs.get('ajustar_hiperparametros'):
+                    # Modo de ajuste: a melhor configuração encontrada substitui a do formulário
+                    ajuste = self.ajustar_hiperparametros(dados_teste_ratio=float(kwargs.get('test_ratio', 0.2)),
+                                                          n_candidatos=kwargs.get('ajuste_max_candidatos'),
+                                                          max_workers=kwargs.get('ajuste_max_workers'))
+                    if ajuste is not None:
+                        results['ajuste'] = ajuste
+                        kwargs['prophet_changepoint_prior_scale'] = ajuste['melhor']['changepoint_prior_scale']
+                        kwargs['prophet_seasonality_prior_scale'] = ajuste['melhor']['seasonality_prior_scale']
+                        kwargs['prophet_seasonality_mode'] = ajuste['melhor']['seasonality_mode']
                 modelo_treinado, figs_treinamento = self.treinar_modelo_prophet(
                     dados_teste_ratio=float(kwargs.get('test_ratio', 0.2)), **kwargs
                 )
                 results['validacao_fig'] = figs_treinamento.get('validacao')
-                results['modelo'] = modelo_treinado
                 results['metricas'] = self.metricas
+                progresso('validacao')
                 
                 if modelo_treinado is not None:
                     df_display, fig_futura = self.fazer_previsao_futura_prophet(periodos=int(kwargs.get('periodos_forecast', 12)))
+                    results['modelo'] = self.modelo_prophet
                     results['previsao_futura_df'] = df_display
                     results['previsao_futura_df_interno'] = self.previsoes_futuras_df
                     results['previsao_futura_fig'] = fig_futura
-
-            if self.coluna_produto and self.coluna_produto in self.df_raw.columns:
-                 results['top_produtos_list'] = self.df_raw.groupby(self.coluna_produto)[self.coluna_valor].sum().nlargest(20).index.tolist()
+                    progresso('previsao_futura')
+            elif modelo_tipo in modelos_estatisticos.MODELOS:
+                # Motor estatístico vetorizado: sem ajuste do Stan, mesmo corte e métricas do Prophet
+                modelo_treinado, figs_treinamento = self.treinar_modelo_estatistico(
+                    modelo_tipo, dados_teste_ratio=float(kwargs.get('test_ratio', 0.2)))
+                results['validacao_fig'] = figs_treinamento.get('validacao')
+                results['metricas'] = self.metricas
+                progresso('validacao')
+                if modelo_treinado is not None:
+                    df_display, fig_futura = self.fazer_previsao_futura_estatistica(
+                        modelo_tipo, periodos=int(kwargs.get('periodos_forecast', 12)))
+                    results['modelo'] = modelo_tipo
+                    results['previsao_futura_df'] = df_display
+                    results['previsao_futura_df_interno'] = self.previsoes_futuras_df
+                    results['previsao_futura_fig'] = fig_futura
+                    progresso('previsao_futura')
+            else:
+                raise ValueError(f"Tipo de modelo desconhecido: {modelo_tipo}")
 
         except Exception as e:
             print(f"ERRO NO PIPELINE: {e}")
@@ -0,0 +1,80 @@
+import base64
+import json
+from datetime import date
+
+import numpy as np
+
+
+def _base64(arr):
+    return base64.b64encode(np.ascontiguousarray(arr).tobytes()).decode('ascii')
+
+
+def _e_datas(arr):
+    if arr.dtype.kind == 'M':
+        return True
+    if arr.dtype == object and arr.size:
+        primeiro = next((v for v in arr.flat if v is not None), None)
+        return isinstance(primeiro, (date, np.datetime64))
+    return False
+
+
+def _compactar_array(valor, precisao):
+    """``(array codificado, é_data)`` ou ``(None, False)`` se o valor não for um array numérico/de datas."""
+    if not isinstance(valor, (np.ndarray, list, tuple)) or len(valor) == 0:
+        return None, False
+    arr = np.asarray(valor)
+    if arr.ndim != 1:
+        return None, False
+    if _e_datas(arr):
+        import pandas as pd
+        # Eixos de data do Plotly aceitam milissegundos desde a época
+        ms = pd.to_datetime(arr).asi8 // 10 ** 6
+        return {'dtype': 'f8', 'bdata': _base64(ms.astype('<f8'))}, True
+    if arr.dtype.kind in 'fiu':
+        return {'dtype': precisao, 'bdata': _base64(arr.astype('<' + precisao))}, False
+    return None, False
+
+
+def compactar_figura(fig, template=None, precisao='f4', config=None):
+    """Spec JSON da figura Plotly com os arrays numéricos como *typed arrays* em base64.
+
+    ``x``/``y`` etc. viram ``{'dtype', 'bdata'}`` (``precisao`` ``'f4'`` guarda ~7 dígitos
+    significativos, suficiente para o gráfico); datas viram milissegundos em ``'f8'`` e o eixo
+    correspondente é marcado como ``type='date'``. Com ``template``, o template expandido
+    (~8 KB por figura) sai do layout e só o nome é enviado; o cliente o busca uma vez em
+    ``/api/figuras/template/<nome>``. A decodificação é feita por ``window.desenharFigura``.
+    """
+    from plotly.utils import PlotlyJSONEncoder
+    spec = fig.to_plotly_json()
+    layout = spec.get('layout', {})
+    if template:
+        layout.pop('template', None)
+    for trace in spec.get('data', []):
+        for chave, valor in list(trace.items()):
+            codificado, e_data = _compactar_array(valor, precisao)
+            if codificado is None:
+                continue
+            trace[chave] = codificado
+            if e_data and chave in ('x', 'y'):
+                eixo = chave + 'axis' + trace.get(chave + 'axis', chave)[1:]
+                layout.setdefault(eixo, {})['type'] = 'date'
+    spec['layout'] = layout
+    if template:
+        spec['template'] = template
+    if config:
+        spec['config'] = config
+    return json.loads(json.dumps(spec, cls=PlotlyJSONEncoder))
+
+
+def decodificar_array(valor):
+    """Inverso de ``_compactar_array`` para os *typed arrays* (usado nos testes e em ferramentas)."""
+    return np.frombuffer(base64.b64decode(valor['bdata']), dtype='<' + valor['dtype'])
+
+
+def template_plotly(nome):
+    """Template nomeado do Plotly (ex.: ``'plotly_dark'``) como JSON, ou ``None``."""
+    import plotly.io as pio
+    from plotly.utils import PlotlyJSONEncoder
+    if nome not in pio.templates:
+        return None
+    return json.loads(json.dumps(pio.templates[nome].to_plotly_json(), cls=PlotlyJSONEncoder))
@@ -0,0 +1,126 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class ResolvedorImagens:
+    """Busca a imagem de um produto (primeira ``<img>`` da busca de imagens) com cache persistente.
+
+    O cache fica em SQLite (produto -> URL): acertos valem por ``ttl`` segundos e buscas sem
+    resultado (ou com erro de rede) por ``ttl_negativo``. As requisições usam uma sessão HTTP
+    com pool de conexões e timeouts de conexão/leitura; as buscas rodam em um pool de threads
+    próprio, para que nunca atrasem o ajuste dos modelos. ``requests`` e ``bs4`` só são
+    importados na primeira busca que vai à rede.
+    """
+
+    CABECALHOS = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3"
+    }
+
+    def __init__(self, caminho_db, url_busca='https://www.google.com/search', prefixo='SOHIPREN',
+                 ttl=7 * 24 * 3600, ttl_negativo=24 * 3600, timeout=(2, 4), max_workers=4):
+        self.caminho_db = caminho_db
+        self.url_busca = url_busca
+        self.prefixo = prefixo
+        self.ttl = ttl
+        self.ttl_negativo = ttl_negativo
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self._sessao = None
+        self._executor = None
+        self._lock = threading.Lock()
+        diretorio = os.path.dirname(caminho_db)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        conn = sqlite3.connect(self.caminho_db, timeout=10)
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS imagens_produto (
+            produto TEXT PRIMARY KEY,
+            url TEXT,
+            data_consulta REAL NOT NULL
+        )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def _obter_sessao(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+        with self._lock:
+            if self._sessao is None:
+                sessao = requests.Session()
+                adaptador = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers, max_retries=0)
+                sessao.mount('http://', adaptador)
+                sessao.mount('https://', adaptador)
+                sessao.headers.update(self.CABECALHOS)
+                self._sessao = sessao
+            return self._sessao
+
+    def _obter_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='imagens')
+            return self._executor
+
+    def consultar_cache(self, produto):
+        """Retorna ``(encontrado, url)``; ``encontrado`` é False se não houver entrada válida."""
+        conn = sqlite3.connect(self.caminho_db, timeout=10)
+        row = conn.execute('SELECT url, data_consulta FROM imagens_produto WHERE produto = ?', (produto,)).fetchone()
+        conn.close()
+        if row is None:
+            return False, None
+        url, data_consulta = row
+        validade = self.ttl if url else self.ttl_negativo
+        if time.time() - data_consulta > validade:
+            return False, None
+        return True, url
+
+    def _guardar(self, produto, url):
+        conn = sqlite3.connect(self.caminho_db, timeout=10)
+        conn.execute('INSERT OR REPLACE INTO imagens_produto (produto, url, data_consulta) VALUES (?, ?, ?)',
+                     (produto, url, time.time()))
+        conn.commit()
+        conn.close()
+
+    def _buscar_na_rede(self, produto):
+        from bs4 import BeautifulSoup, SoupStrainer
+        consulta = f"{self.prefixo} {produto}" if self.prefixo else produto
+        resposta = self._obter_sessao().get(self.url_busca, params={'tbm': 'isch', 'q': consulta}, timeout=self.timeout)
+        resposta.raise_for_status()
+        # Analisa só as tags <img>, em vez da página inteira
+        for img in BeautifulSoup(resposta.text, 'html.parser', parse_only=SoupStrainer('img')).find_all('img'):
+            src = img.get('src')
+            if src and src.startswith('http'):
+                return src
+        return None
+
+    def buscar(self, produto):
+        """URL da imagem do produto (do cache ou da rede) ou ``None``."""
+        if not produto:
+            return None
+        encontrado, url = self.consultar_cache(produto)
+        if encontrado:
+            return url
+        import requests
+        try:
+            url = self._buscar_na_rede(produto)
+        except requests.RequestException as e:
+            print(f"   AVISO: busca de imagem falhou para '{produto}': {e}")
+            url = None
+        self._guardar(produto, url)
+        return url
+
+    def agendar(self, produtos):
+        """Dispara as buscas em segundo plano e retorna ``{produto: Future}``."""
+        executor = self._obter_executor()
+        return {produto: executor.submit(self.buscar, produto) for produto in dict.fromkeys(produtos)}
+
+    @staticmethod
+    def coletar(futures, espera=0):
+        """Resultados das buscas concluídas em até ``espera`` segundos; as demais ficam ``None``."""
+        if espera:
+            wait(list(futures.values()), timeout=espera)
+        return {produto: (future.result() if future.done() and not future.exception() else None)
+                for produto, future in futures.items()}
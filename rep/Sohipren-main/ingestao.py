@@ -0,0 +1,166 @@
+import csv
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+
+PAPEIS = ('data', 'valor', 'produto', 'cliente')
+
+
+def detectar_formato(file_input):
+    """Identifica a planilha pelo conteúdo: ``'xlsx'`` (zip), ``'xls'`` (OLE2) ou ``'csv'``."""
+    if isinstance(file_input, io.BytesIO):
+        posicao = file_input.tell()
+        file_input.seek(0)
+        inicio = file_input.read(8)
+        file_input.seek(posicao)
+    else:
+        with open(file_input, 'rb') as f:
+            inicio = f.read(8)
+    if inicio.startswith(b'PK\x03\x04'):
+        return 'xlsx'
+    if inicio.startswith(b'\xd0\xcf\x11\xe0'):
+        return 'xls'
+    return 'csv'
+
+
+def encontrar_coluna(nome_usuario, colunas):
+    """Nome real da coluna no arquivo, ignorando maiúsculas/minúsculas e espaços nas pontas."""
+    if not nome_usuario: return None
+    for coluna in colunas:
+        if coluna.lower() == nome_usuario.strip().lower():
+            print(f"   Coluna '{nome_usuario}' encontrada como '{coluna}' no arquivo.")
+            return coluna
+    print(f"   AVISO: A coluna especificada '{nome_usuario}' não foi encontrada.")
+    return None
+
+
+class CodificadorCategorias:
+    """Códigos ``int32`` estáveis entre blocos; as categorias ficam na ordem em que aparecem."""
+
+    def __init__(self):
+        self._codigos = {}
+        self.categorias = []
+
+    def codificar(self, valores):
+        codigos_locais, unicos = pd.factorize(valores, use_na_sentinel=True)
+        mapa = np.empty(len(unicos) + 1, dtype='int32')
+        mapa[-1] = -1  # nulos (código -1 do factorize)
+        for i, valor in enumerate(unicos):
+            codigo = self._codigos.get(valor)
+            if codigo is None:
+                codigo = self._codigos[valor] = len(self.categorias)
+                self.categorias.append(valor)
+            mapa[i] = codigo
+        return mapa[codigos_locais]
+
+
+class LeitorPlanilha:
+    """Leitura em blocos das quatro colunas da análise, sem carregar a planilha inteira.
+
+    XLSX é percorrido linha a linha com o openpyxl em modo somente leitura; CSV é lido
+    com ``pandas.read_csv(chunksize=...)``. Cada bloco já sai com os tipos finais: datas em
+    ``datetime64[ns]`` (linhas sem data descartadas), valores em ``float64`` (inválidos
+    viram 0) e produto/cliente como códigos ``int32`` de ``categorias``.
+    """
+
+    def __init__(self, file_input, colunas_usuario, formato=None, tamanho_bloco=50000):
+        self.file_input = file_input
+        self.colunas_usuario = colunas_usuario
+        self.formato = formato or detectar_formato(file_input)
+        self.tamanho_bloco = tamanho_bloco
+        self.colunas = {}
+        self.codificadores = {}
+        self._opcoes_csv = {}
+
+    @property
+    def categorias(self):
+        return {papel: cod.categorias for papel, cod in self.codificadores.items()}
+
+    def _mapear_colunas(self, cabecalho):
+        cabecalho = [str(c).strip() if c is not None else '' for c in cabecalho]
+        for papel in PAPEIS:
+            real = encontrar_coluna(self.colunas_usuario.get(papel), cabecalho)
+            if real is not None:
+                self.colunas[papel] = real
+        if 'data' not in self.colunas or 'valor' not in self.colunas:
+            raise ValueError("Colunas essenciais de Data ou Valor não foram encontradas.")
+        self.codificadores = {papel: CodificadorCategorias() for papel in self.colunas if papel not in ('data', 'valor')}
+        return [cabecalho.index(self.colunas[papel]) for papel in self.colunas]
+
+    def _converter(self, dados):
+        """Converte as listas/Series brutas de um bloco para os tipos finais."""
+        datas = pd.to_datetime(pd.Series(dados['data']), errors='coerce', dayfirst=self._opcoes_csv.get('decimal') == ',')
+        validas = datas.notna().to_numpy()
+        bloco = {'data': datas.to_numpy(dtype='datetime64[ns]')[validas]}
+        valores = pd.Series(dados['valor'])
+        if valores.dtype == object and self._opcoes_csv.get('decimal') == ',':
+            valores = valores.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+        bloco['valor'] = pd.to_numeric(valores, errors='coerce').fillna(0).to_numpy(dtype='float64')[validas]
+        for papel, codificador in self.codificadores.items():
+            bloco[papel] = codificador.codificar(np.asarray(dados[papel], dtype=object)[validas])
+        return bloco
+
+    def _blocos_xlsx(self):
+        from openpyxl import load_workbook
+        wb = load_workbook(self.file_input, read_only=True, data_only=True)
+        try:
+            linhas = wb.worksheets[0].iter_rows(values_only=True)
+            indices = self._mapear_colunas(next(linhas, ()))
+            papeis = list(self.colunas)
+            buffers = {papel: [] for papel in papeis}
+            for linha in linhas:
+                for papel, indice in zip(papeis, indices):
+                    buffers[papel].append(linha[indice] if indice < len(linha) else None)
+                if len(buffers['data']) >= self.tamanho_bloco:
+                    yield self._converter(buffers)
+                    buffers = {papel: [] for papel in papeis}
+            if buffers['data']:
+                yield self._converter(buffers)
+        finally:
+            wb.close()
+
+    def _abrir_texto(self):
+        if isinstance(self.file_input, io.BytesIO):
+            self.file_input.seek(0)
+            bruto = self.file_input.read()
+            try:
+                return io.StringIO(bruto.decode('utf-8-sig'))
+            except UnicodeDecodeError:
+                return io.StringIO(bruto.decode('latin-1'))
+        try:
+            with open(self.file_input, encoding='utf-8-sig') as f:
+                f.read(64 * 1024)
+            return open(self.file_input, encoding='utf-8-sig', newline='')
+        except UnicodeDecodeError:
+            return open(self.file_input, encoding='latin-1', newline='')
+
+    def _blocos_csv(self):
+        with self._abrir_texto() as texto:
+            amostra = texto.read(64 * 1024)
+            texto.seek(0)
+            try:
+                separador = csv.Sniffer().sniff(amostra, delimiters=',;\t|').delimiter
+            except csv.Error:
+                separador = ','
+            # Exportações com ';' costumam usar vírgula decimal e datas dd/mm/aaaa
+            self._opcoes_csv = {'decimal': ',' if separador == ';' else '.'}
+            cabecalho = next(csv.reader(io.StringIO(amostra), delimiter=separador), [])
+            self._mapear_colunas(cabecalho)
+            nomes = {real: papel for papel, real in self.colunas.items()}
+            leitor = pd.read_csv(texto, sep=separador, dtype=str, chunksize=self.tamanho_bloco,
+                                 usecols=lambda c: str(c).strip() in nomes)
+            for parte in leitor:
+                parte.columns = [nomes[str(c).strip()] for c in parte.columns]
+                yield self._converter({papel: parte[papel] for papel in self.colunas})
+
+    def blocos(self):
+        """Gera dicionários ``papel -> array`` com no máximo ``tamanho_bloco`` linhas cada."""
+        if self.formato == 'xlsx':
+            yield from self._blocos_xlsx()
+        elif self.formato == 'csv':
+            yield from self._blocos_csv()
+        else:
+            raise ValueError(f"Formato sem leitura em blocos: {self.formato}")
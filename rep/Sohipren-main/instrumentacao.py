@@ -0,0 +1,293 @@
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+try:
+    import resource  # ausente no Windows; sem ele, só os picos do tracemalloc
+except ImportError:
+    resource = None
+
+
+# Limites (segundos) dos histogramas de duração; cobrem de leitura de cache a ajustes longos do Stan
+LIMITES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Tipo e descrição de cada métrica exposta em /metrics
+DESCRICOES = {
+    'sohipren_etapa_segundos': ('histogram', 'Duração de cada etapa do pipeline de previsão.'),
+    'sohipren_etapa_memoria_pico_bytes': (
+        'gauge', 'Maior pico de memória de cada etapa (tracemalloc, se ativo; senão, RSS máximo do processo).'),
+    'sohipren_requisicao_segundos': ('histogram', 'Duração das requisições por rota, método e status.'),
+    'sohipren_requisicao_memoria_pico_bytes': (
+        'gauge', 'Maior pico de memória das requisições por rota (tracemalloc, se ativo; senão, RSS máximo do processo).'),
+    'sohipren_processo_memoria_pico_bytes': ('gauge', 'RSS máximo do processo web.'),
+}
+
+
+def pico_rss():
+    """RSS máximo do processo em bytes (``None`` sem o módulo ``resource``)."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB; macOS, em bytes
+    return pico if sys.platform == 'darwin' else pico * 1024
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatar_rotulos(rotulos, extra=()):
+    pares = list(rotulos) + list(extra)
+    return '{' + ','.join(f'{chave}="{_escapar(valor)}"' for chave, valor in pares) + '}' if pares else ''
+
+
+class Registro:
+    """Histogramas de duração e picos de memória por métrica e rótulos (thread-safe).
+
+    ``exportar`` gera o formato de texto do Prometheus. Os jobs rodam em processos filhos:
+    ``drenar`` retira as medições acumuladas lá e ``incorporar`` as soma às do processo web.
+    """
+
+    def __init__(self, limites=LIMITES_SEGUNDOS):
+        self.limites = tuple(limites)
+        self._lock = threading.Lock()
+        # (metrica, rotulos) -> [contagem por faixa..., contagem total, soma]
+        self._histogramas = {}
+        self._picos = {}
+
+    def observar(self, metrica, rotulos, segundos):
+        chave = (metrica, tuple(sorted(rotulos.items())))
+        faixa = bisect_left(self.limites, segundos)
+        with self._lock:
+            valores = self._histogramas.get(chave)
+            if valores is None:
+                valores = self._histogramas[chave] = [0] * len(self.limites) + [0, 0.0]
+            if faixa < len(self.limites):
+                valores[faixa] += 1
+            valores[-2] += 1
+            valores[-1] += segundos
+
+    def registrar_pico(self, metrica, rotulos, valor):
+        chave = (metrica, tuple(sorted(rotulos.items())))
+        with self._lock:
+            self._picos[chave] = max(self._picos.get(chave, 0), valor)
+
+    def drenar(self):
+        """Retira e retorna as medições acumuladas (serializáveis), zerando o registro."""
+        with self._lock:
+            dados = {'limites': list(self.limites),
+                     'histogramas': [[metrica, list(rotulos), valores] for (metrica, rotulos), valores in self._histogramas.items()],
+                     'picos': [[metrica, list(rotulos), valor] for (metrica, rotulos), valor in self._picos.items()]}
+            self._histogramas, self._picos = {}, {}
+        return dados
+
+    def incorporar(self, dados):
+        """Soma as medições de ``drenar`` (de outro processo) às deste registro."""
+        if not dados or list(dados.get('limites', ())) != list(self.limites):
+            return
+        with self._lock:
+            for metrica, rotulos, valores in dados['histogramas']:
+                chave = (metrica, tuple(tuple(par) for par in rotulos))
+                atuais = self._histogramas.setdefault(chave, [0] * len(self.limites) + [0, 0.0])
+                for i, valor in enumerate(valores):
+                    atuais[i] += valor
+            for metrica, rotulos, valor in dados['picos']:
+                chave = (metrica, tuple(tuple(par) for par in rotulos))
+                self._picos[chave] = max(self._picos.get(chave, 0), valor)
+
+    def exportar(self):
+        """Medições no formato de exposição de texto do Prometheus (versão 0.0.4)."""
+        with self._lock:
+            histogramas = {chave: list(valores) for chave, valores in self._histogramas.items()}
+            picos = dict(self._picos)
+        rss = pico_rss()
+        if rss is not None:
+            picos[('sohipren_processo_memoria_pico_bytes', ())] = rss
+
+        linhas = []
+        metricas = sorted({metrica for metrica, _ in histogramas} | {metrica for metrica, _ in picos})
+        for metrica in metricas:
+            tipo, descricao = DESCRICOES.get(metrica, ('untyped', metrica))
+            linhas += [f'# HELP {metrica} {descricao}', f'# TYPE {metrica} {tipo}']
+            for (nome, rotulos), valores in sorted(histogramas.items()):
+                if nome != metrica: continue
+                acumulado = 0
+                for limite, contagem in zip(self.limites, valores):
+                    acumulado += contagem
+                    linhas.append(f'{metrica}_bucket{_formatar_rotulos(rotulos, [("le", limite)])} {acumulado}')
+                linhas.append(f'{metrica}_bucket{_formatar_rotulos(rotulos, [("le", "+Inf")])} {valores[-2]}')
+                linhas.append(f'{metrica}_count{_formatar_rotulos(rotulos)} {valores[-2]}')
+                linhas.append(f'{metrica}_sum{_formatar_rotulos(rotulos)} {valores[-1]:.6f}')
+            for (nome, rotulos), valor in sorted(picos.items()):
+                if nome == metrica:
+                    linhas.append(f'{metrica}{_formatar_rotulos(rotulos)} {valor}')
+        return '\n'.join(linhas) + '\n'
+
+
+REGISTRO = Registro()
+
+# Medições da requisição atual (cabeçalho Server-Timing) e picos do tracemalloc das etapas abertas
+_coleta = ContextVar('instrumentacao_coleta', default=None)
+_picos_abertos = ContextVar('instrumentacao_picos_abertos', default=())
+
+
+class _Medicao:
+    """Duração e pico de memória entre ``__init__`` e ``encerrar``.
+
+    Com o tracemalloc ativo (ex.: ``PYTHONTRACEMALLOC=1``), o pico é o da memória alocada
+    durante a medição, mesmo com medições aninhadas (o pico de uma interna vale também para
+    as externas); sem ele, é o RSS máximo do processo ao final.
+    """
+
+    def __init__(self):
+        self._rastreando = tracemalloc.is_tracing()
+        if self._rastreando:
+            abertos = _picos_abertos.get()
+            if abertos:
+                # O pico até aqui pertence à medição externa; zera para medir só esta
+                abertos[-1][0] = max(abertos[-1][0], tracemalloc.get_traced_memory()[1])
+            self._quadro = [0]
+            self._token = _picos_abertos.set(abertos + (self._quadro,))
+            tracemalloc.reset_peak()
+        self.inicio = time.perf_counter()
+
+    def decorrido(self):
+        return time.perf_counter() - self.inicio
+
+    def encerrar(self):
+        """Retorna ``(segundos, pico_bytes)``; o pico é ``None`` sem tracemalloc nem ``resource``."""
+        segundos = self.decorrido()
+        if not self._rastreando:
+            return segundos, pico_rss()
+        pico = max(self._quadro[0], tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0)
+        _picos_abertos.reset(self._token)
+        abertos = _picos_abertos.get()
+        if abertos:
+            abertos[-1][0] = max(abertos[-1][0], pico)
+        return segundos, pico
+
+
+class Coleta:
+    """Etapas medidas durante uma requisição, somadas por nome para o cabeçalho Server-Timing."""
+
+    def __init__(self):
+        self.medicao = _Medicao()
+        self.duracoes = {}
+
+    def adicionar(self, nome, segundos):
+        total, vezes = self.duracoes.get(nome, (0.0, 0))
+        self.duracoes[nome] = (total + segundos, vezes + 1)
+
+    def server_timing(self, total):
+        partes = [f'{nome};dur={segundos * 1000:.1f}' + (f';desc="{vezes}x"' if vezes > 1 else '')
+                  for nome, (segundos, vezes) in self.duracoes.items()]
+        partes.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(partes)
+
+
+def iniciar_coleta():
+    coleta = Coleta()
+    _coleta.set(coleta)
+    return coleta
+
+
+def encerrar_coleta():
+    """Retira a coleta da requisição atual (``None`` se não havia)."""
+    coleta = _coleta.get()
+    _coleta.set(None)
+    return coleta
+
+
+@contextmanager
+def etapa(nome, registro=None):
+    """Mede um trecho (bloco ``with`` ou decorador) como a etapa ``nome``.
+
+    A duração entra no histograma ``sohipren_etapa_segundos``, o pico de memória em
+    ``sohipren_etapa_memoria_pico_bytes`` e, dentro de uma requisição, no Server-Timing.
+    """
+    medicao = _Medicao()
+    try:
+        yield
+    finally:
+        segundos, pico = medicao.encerrar()
+        registro = registro or REGISTRO
+        registro.observar('sohipren_etapa_segundos', {'etapa': nome}, segundos)
+        if pico is not None:
+            registro.registrar_pico('sohipren_etapa_memoria_pico_bytes', {'etapa': nome}, pico)
+        coleta = _coleta.get()
+        if coleta is not None:
+            coleta.adicionar(nome, segundos)
+
+
+def _pilha(quadro, max_profundidade):
+    funcoes = []
+    while quadro is not None and len(funcoes) < max_profundidade:
+        codigo = quadro.f_code
+        funcoes.append(f'{os.path.basename(codigo.co_filename)}:{codigo.co_name}')
+        quadro = quadro.f_back
+    return ';'.join(reversed(funcoes))
+
+
+class AmostradorPerfil:
+    """Profiler por amostragem das threads acompanhadas (uma por requisição).
+
+    Uma única thread lê ``sys._current_frames()`` a cada ``intervalo`` segundos enquanto
+    houver threads acompanhadas e conta as pilhas no formato "collapsed"
+    (``a;b;c contagem``, usado por flamegraph.pl e speedscope). O custo fica fora da
+    thread medida, então dá para deixar ligado e só gravar os perfis das requisições lentas.
+    """
+
+    def __init__(self, intervalo=0.005, max_profundidade=64):
+        self.intervalo = intervalo
+        self.max_profundidade = max_profundidade
+        self._lock = threading.Lock()
+        self._acompanhadas = {}
+        self._thread = None
+
+    def acompanhar(self, ident=None):
+        ident = ident or threading.get_ident()
+        with self._lock:
+            self._acompanhadas[ident] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._amostrar, name='amostrador-perfil', daemon=True)
+                self._thread.start()
+
+    def liberar(self, ident=None):
+        """Para de acompanhar a thread e retorna as pilhas contadas (``Counter``)."""
+        with self._lock:
+            return self._acompanhadas.pop(ident or threading.get_ident(), Counter())
+
+    def _amostrar(self):
+        proprio = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._acompanhadas:
+                    self._thread = None
+                    return
+                idents = [ident for ident in self._acompanhadas if ident != proprio]
+            quadros = sys._current_frames()
+            amostras = {ident: _pilha(quadros[ident], self.max_profundidade) for ident in idents if ident in quadros}
+            with self._lock:
+                for ident, pilha in amostras.items():
+                    if ident in self._acompanhadas:
+                        self._acompanhadas[ident][pilha] += 1
+            time.sleep(self.intervalo)
+
+
+def gravar_perfil(pilhas, pasta, nome):
+    """Grava as pilhas (formato "collapsed", mais frequentes primeiro) e retorna o caminho."""
+    os.makedirs(pasta, exist_ok=True)
+    nome = re.sub(r'[^A-Za-z0-9.-]+', '_', nome).strip('_') or 'raiz'
+    caminho = os.path.join(pasta, f"perfil_{datetime.now():%Y%m%d_%H%M%S_%f}_{nome}.txt")
+    with open(caminho, 'w', encoding='utf-8') as f:
+        for pilha, contagem in pilhas.most_common():
+            f.write(f'{pilha} {contagem}\n')
+    return caminho
@@ -0,0 +1,378 @@
+import atexit
+import importlib
+import os
+import queue
+import signal
+import threading
+import traceback
+import uuid
+import multiprocessing
+
+from database import Database
+import instrumentacao
+
+
+class FilaCheiaError(Exception):
+    """Lançada quando o limite de jobs pendentes é atingido."""
+
+
+class JobCancelado(BaseException):
+    """Lançada por ``relatar_progresso`` quando o job foi cancelado.
+
+    Como o ``CancelledError`` do asyncio, herda de ``BaseException`` para atravessar os
+    ``except Exception`` do pipeline até ``_executar_job``.
+    """
+
+
+# Job em execução neste processo filho: (banco, id), definido por _executar_job
+_job_atual = None
+# Gravações finais do job em execução, feitas na mesma transação que o marca como concluído
+_gravacoes_finais = []
+# Segundos entre as consultas de status do job em execução (ver FilaJobs._acompanhar)
+INTERVALO_CANCELAMENTO = 0.5
+
+
+def relatar_progresso(etapa, resultado_parcial=None, **dados):
+    """Registra uma etapa concluída do job em execução e interrompe o job se ele foi cancelado.
+
+    ``resultado_parcial`` publica o que já está pronto antes de o job terminar. Além desta
+    verificação a cada etapa, a fila encerra o processo de um job cancelado no meio de uma
+    etapa longa. Fora de um job (ex.: o pipeline chamado direto, nos testes), não faz nada.
+    """
+    if _job_atual is None:
+        return
+    db, job_id = _job_atual
+    if db.registrar_progresso_job(job_id, {'etapa': etapa, **dados}, resultado_parcial) == 'cancelado':
+        raise JobCancelado(job_id)
+
+
+def gravar_ao_concluir(gravar):
+    """Adia ``gravar()`` (ex.: salvar a previsão no histórico) para a conclusão do job.
+
+    As gravações rodam na mesma transação que marca o job como concluído, e só se ele não foi
+    cancelado: um job cancelado não deixa nada no histórico. Fora de um job, grava na hora.
+    """
+    if _job_atual is None:
+        gravar()
+    else:
+        _gravacoes_finais.append(gravar)
+
+
+def _processo_ativo(pid):
+    if not pid:
+        return False
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        # os.kill no Windows encerra o processo; considera apenas o processo atual
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _preparar_processo(precarregar):
+    """Inicializador dos processos da fila: importa ``'modulo'`` ou chama ``'modulo:funcao'``."""
+    for item in precarregar:
+        nome_modulo, _, funcao = item.partition(':')
+        try:
+            modulo = importlib.import_module(nome_modulo)
+            if funcao:
+                getattr(modulo, funcao)()
+        except Exception as e:
+            # O pré-carregamento é só otimização; o job importa o que faltar ao rodar
+            print(f"   AVISO: falha ao pré-carregar '{item}': {e}")
+
+
+def _contexto_processos():
+    """Processos da fila criados pelo forkserver, onde houver.
+
+    Um fork do processo web no meio de uma requisição copiaria o estado de travas do SQLite
+    de outras threads (ex.: uma escrita em andamento), e o filho ficaria esperando para sempre
+    por uma trava que nenhum processo dele segura ("database is locked").
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return None
+
+
+def _executar_job(db_name, job_id, tarefa, parametros):
+    """Executado no processo filho: roda a tarefa e grava o status e o resultado no banco.
+
+    Retorna as medições de instrumentação do job, somadas às do processo web ao terminar.
+    """
+    global _job_atual
+    db = Database(db_name)
+    # As gravações de status são condicionais: um cancelamento feito no meio do caminho prevalece
+    if not db.iniciar_job(job_id):
+        # Cancelado enquanto esperava na fila
+        return instrumentacao.REGISTRO.drenar()
+    _job_atual = (db, job_id)
+    try:
+        resultado = tarefa(parametros)
+        with db.em_lote():
+            concluido = db.finalizar_job(job_id, 'concluido', resultado=resultado, erro=None)
+            if concluido:
+                for gravar in _gravacoes_finais:
+                    gravar()
+        if not concluido:
+            raise JobCancelado(job_id)
+    except JobCancelado:
+        print(f"   AVISO: job {job_id} cancelado.")
+    except Exception as e:
+        print(f"ERRO NO JOB {job_id}: {e}")
+        traceback.print_exc()
+        db.finalizar_job(job_id, 'erro', erro=str(e))
+    finally:
+        _job_atual = None
+        _gravacoes_finais.clear()
+    return instrumentacao.REGISTRO.drenar()
+
+
+def _atender_jobs(conexao, precarregar):
+    """Laço do processo da fila: roda, um de cada vez, os jobs recebidos por ``conexao``."""
+    if hasattr(os, 'setpgrp'):
+        # Grupo de processos próprio: encerrar o job leva junto os pools internos e o Stan
+        os.setpgrp()
+    _preparar_processo(precarregar)
+    while True:
+        try:
+            pedido = conexao.recv()
+        except EOFError:
+            # O processo web terminou
+            return
+        except Exception as e:
+            # Ex.: a tarefa não pôde ser importada neste processo
+            conexao.send(('erro', str(e)))
+            continue
+        if pedido is None:
+            return
+        conexao.send(('ok', _executar_job(*pedido)))
+
+
+class _ProcessoJobs:
+    """Processo da fila e o canal por onde recebe os jobs; substituído quando um job é cancelado."""
+
+    def __init__(self, precarregar):
+        contexto = _contexto_processos() or multiprocessing.get_context()
+        self.conexao, conexao_filho = contexto.Pipe()
+        self.processo = contexto.Process(target=_atender_jobs, args=(conexao_filho, precarregar),
+                                         name='fila-jobs')
+        self.processo.start()
+        conexao_filho.close()
+
+    def fechar(self):
+        """Pede ao processo que saia depois do job atual e espera por ele."""
+        try:
+            self.conexao.send(None)
+        except OSError:
+            pass
+        self.processo.join()
+        self.conexao.close()
+
+    def matar(self):
+        """Encerra o processo na hora, junto com o que ele iniciou (pools internos, executáveis do Stan)."""
+        if hasattr(os, 'killpg'):
+            try:
+                os.killpg(self.processo.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                # Ainda sem grupo próprio ou já encerrado
+                pass
+        self.processo.kill()
+        self.processo.join()
+        self.conexao.close()
+
+
+class FilaJobs:
+    """Fila de processamento em segundo plano (ex.: treino do Prophet) com estado no SQLite.
+
+    As tarefas rodam em ``max_workers`` processos próprios, cada um acompanhado por uma thread
+    deste processo; o status de cada job fica na tabela ``jobs`` para que qualquer requisição
+    possa consultá-lo. Jobs que estavam pendentes ou em execução quando o processo dono caiu
+    são retomados por ``retomar_interrompidos``.
+    ``precarregar`` lista módulos (``'modulo'``) ou funções (``'modulo:funcao'``) executados
+    ao iniciar cada processo, antes do primeiro job. ``ao_terminar(job_id)``, se informado,
+    roda neste processo ao fim de cada job, qualquer que seja o status.
+    """
+
+    def __init__(self, db, max_workers=2, max_pendentes=20, precarregar=(), ao_terminar=None):
+        self.db = db
+        self.max_workers = max_workers
+        self.max_pendentes = max_pendentes
+        self.precarregar = tuple(precarregar)
+        self.ao_terminar = ao_terminar
+        self.tarefas = {}
+        self._pendentes = queue.Queue()
+        self._threads = []
+        self._processos = set()
+        self._encerrando = False
+        self._saida_registrada = False
+        self._lock = threading.Lock()
+
+    def registrar(self, tipo, tarefa):
+        """Associa um tipo de job a uma função de nível de módulo (precisa ser serializável)."""
+        self.tarefas[tipo] = tarefa
+
+    def _iniciar(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._encerrando = False
+            self._threads = [threading.Thread(target=self._atender, name=f'fila-jobs-{i}', daemon=True)
+                             for i in range(self.max_workers)]
+            for thread in self._threads:
+                thread.start()
+
+    def _novo_processo(self):
+        """Cria um processo da fila; None se ela está sendo encerrada."""
+        with self._lock:
+            if self._encerrando:
+                return None
+            processo = _ProcessoJobs(self.precarregar)
+            self._processos.add(processo)
+            if not self._saida_registrada:
+                # Registrado depois do primeiro processo (e do atexit do multiprocessing, que espera
+                # pelos filhos): roda antes dele e não deixa a saída presa aos processos da fila
+                atexit.register(self.encerrar, aguardar=False)
+                self._saida_registrada = True
+        return processo
+
+    def _descartar(self, processo):
+        processo.matar()
+        processo.conexao.close()
+        with self._lock:
+            self._processos.discard(processo)
+
+    def _atender(self):
+        """Thread da fila: leva cada job a um processo e o acompanha até terminar."""
+        processo = None
+        while True:
+            pedido = self._pendentes.get()
+            if pedido is None or self._encerrando:
+                break
+            if processo is None:
+                try:
+                    processo = self._novo_processo()
+                except Exception as e:
+                    print(f"   AVISO: falha ao iniciar o processo da fila: {e}")
+                    self.db.finalizar_job(pedido[0], 'erro', erro=str(e))
+                    continue
+                if processo is None:
+                    break
+            if not self._acompanhar(processo, *pedido):
+                # Job cancelado ou processo morto: outro processo já começa a se preparar
+                self._descartar(processo)
+                processo = self._novo_processo()
+            if self.ao_terminar is not None and not self._encerrando:
+                try:
+                    self.ao_terminar(pedido[0])
+                except Exception as e:
+                    print(f"   AVISO: falha ao finalizar o job {pedido[0]}: {e}")
+        if processo is not None:
+            if self._encerrando:
+                self._descartar(processo)
+            else:
+                processo.fechar()
+                with self._lock:
+                    self._processos.discard(processo)
+
+    def _acompanhar(self, processo, job_id, tipo, parametros):
+        """Roda o job em ``processo`` e espera o fim; retorna False se o processo deve ser descartado.
+
+        Uma etapa longa (um ajuste do Stan, um pool interno) pode levar minutos sem passar por
+        ``relatar_progresso``; por isso o status é consultado a cada ``INTERVALO_CANCELAMENTO``
+        segundos e, se o job foi cancelado, o processo é encerrado com tudo o que iniciou em vez
+        de interrompido no meio de uma operação e reaproveitado.
+        """
+        try:
+            processo.conexao.send((self.db.db_name, job_id, self.tarefas[tipo], parametros))
+        except Exception as e:
+            # Ex.: parâmetros que não podem ser serializados
+            self.db.finalizar_job(job_id, 'erro', erro=str(e))
+            return processo.processo.is_alive()
+        while not processo.conexao.poll(INTERVALO_CANCELAMENTO):
+            if self._encerrando:
+                return False
+            try:
+                status = self.db.obter_status_job(job_id)
+            except Exception as e:
+                print(f"   AVISO: falha ao consultar o status do job {job_id}: {e}")
+                continue
+            if status == 'cancelado':
+                print(f"   AVISO: job {job_id} cancelado.")
+                return False
+        try:
+            situacao, valor = processo.conexao.recv()
+        except (EOFError, OSError):
+            if not self._encerrando:
+                # O processo morreu sem registrar o status (ex.: falta de memória)
+                self.db.finalizar_job(job_id, 'erro', erro='O processo do job terminou inesperadamente.')
+            return False
+        if situacao == 'erro':
+            self.db.finalizar_job(job_id, 'erro', erro=valor)
+        else:
+            instrumentacao.REGISTRO.incorporar(valor)
+        return True
+
+    def _despachar(self, job_id, tipo, parametros):
+        self._iniciar()
+        self._pendentes.put((job_id, tipo, parametros))
+
+    def submeter(self, tipo, parametros):
+        if tipo not in self.tarefas:
+            raise ValueError(f"Tipo de job desconhecido: {tipo}")
+        if self.db.contar_jobs_ativos() >= self.max_pendentes:
+            raise FilaCheiaError("Limite de análises simultâneas atingido.")
+        job_id = uuid.uuid4().hex
+        self.db.criar_job(job_id, tipo, parametros, os.getpid())
+        self._despachar(job_id, tipo, parametros)
+        return job_id
+
+    def obter(self, job_id, com_resultado=True):
+        return self.db.obter_job(job_id, com_resultado=com_resultado)
+
+    def cancelar(self, job_id):
+        """Pede o cancelamento do job; retorna False se ele já tinha terminado.
+
+        Um job pendente nem chega a rodar; um em execução tem o processo encerrado em até
+        ``INTERVALO_CANCELAMENTO`` segundos, mesmo no meio de um ajuste (ver ``_acompanhar``).
+        """
+        return self.db.cancelar_job(job_id)
+
+    def retomar_interrompidos(self):
+        """Reenvia os jobs cujo processo dono não está mais ativo. Retorna os ids retomados."""
+        if multiprocessing.parent_process() is not None:
+            return []
+        retomados = []
+        for job in self.db.listar_jobs_interrompidos():
+            if _processo_ativo(job['pid_servidor']):
+                continue
+            if not self.db.assumir_job(job['id'], job['pid_servidor'], os.getpid()):
+                continue
+            completo = self.db.obter_job(job['id'])
+            if completo['tipo'] not in self.tarefas:
+                continue
+            self._despachar(job['id'], completo['tipo'], completo['parametros'])
+            retomados.append(job['id'])
+        return retomados
+
+    def encerrar(self, aguardar=True):
+        """Para a fila. Com ``aguardar``, roda antes os jobs já enviados; sem, encerra os processos
+        na hora, e os jobs interrompidos são retomados quando o servidor voltar."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+            if not aguardar:
+                self._encerrando = True
+            processos = list(self._processos)
+        for _ in threads:
+            self._pendentes.put(None)
+        if aguardar:
+            for thread in threads:
+                thread.join()
+        else:
+            for processo in processos:
+                processo.matar()
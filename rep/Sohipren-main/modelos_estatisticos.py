@@ -0,0 +1,191 @@
+from itertools import product
+from statistics import NormalDist
+
+import numpy as np
+
+
+# Modelos disponíveis como ``modelo_tipo`` (além do 'prophet') e seus nomes nos gráficos
+MODELOS = ('naive_sazonal', 'drift', 'croston', 'holt_winters')
+NOMES = {'naive_sazonal': 'Naive Sazonal', 'drift': 'Drift', 'croston': 'Croston', 'holt_winters': 'Holt-Winters'}
+
+# Períodos por ciclo sazonal para cada frequência de agregação
+SAZONALIDADE_POR_FREQ = {'M': 12, 'W': 52, 'D': 7}
+
+# Grade de suavização do Holt-Winters (alfa, beta, gama), avaliada de uma vez para todas as séries
+GRADE_HOLT_WINTERS = tuple(product((0.1, 0.3, 0.5, 0.8), (0.01, 0.1, 0.3), (0.05, 0.2, 0.5)))
+
+
+def _preparar(Y):
+    """Matriz série x período (float) e o índice do primeiro valor válido de cada série.
+
+    As séries são alinhadas pelo fim; ``NaN`` só no início (antes da primeira venda).
+    """
+    Y = np.atleast_2d(np.asarray(Y, dtype='float64'))
+    validos = ~np.isnan(Y)
+    if not validos.any(axis=1).all():
+        raise ValueError("Série sem nenhum valor.")
+    inicio = validos.argmax(axis=1)
+    return np.where(validos, Y, 0.0), inicio
+
+
+def _intervalos(previsao, desvio, fator, nivel):
+    z = NormalDist().inv_cdf(0.5 + nivel / 2)
+    margem = z * desvio[:, None] * fator
+    return previsao - margem, previsao + margem
+
+
+def naive_sazonal(Y, periodos, sazonalidade=12, nivel=0.95):
+    """Repete o último ciclo; séries com menos de um ciclo repetem o último valor."""
+    Y, inicio = _preparar(Y)
+    n_series, T = Y.shape
+    n = T - inicio
+    m = np.where(n >= sazonalidade, sazonalidade, 1)
+    h = np.arange(1, periodos + 1)
+    # Posição do mesmo período no último ciclo observado: T - m + (h - 1) % m
+    origem = T - m[:, None] + (h[None, :] - 1) % m[:, None]
+    previsao = Y[np.arange(n_series)[:, None], origem]
+
+    t = np.arange(T)
+    defasado = np.take_along_axis(Y, np.clip(t[None, :] - m[:, None], 0, None), axis=1)
+    residuos = np.where(t[None, :] >= inicio[:, None] + m[:, None], Y - defasado, np.nan)
+    # Sem resíduos (série com um único período), o intervalo colapsa na previsão
+    validos = ~np.isnan(residuos)
+    desvio = np.sqrt(np.where(validos, residuos ** 2, 0.0).sum(axis=1) / np.maximum(validos.sum(axis=1), 1))
+    ciclos = (h[None, :] - 1) // m[:, None]
+    return previsao, *_intervalos(previsao, desvio, np.sqrt(ciclos + 1), nivel)
+
+
+def drift(Y, periodos, nivel=0.95):
+    """Último valor mais a inclinação média entre a primeira e a última observação."""
+    Y, inicio = _preparar(Y)
+    n_series, T = Y.shape
+    n = T - inicio
+    primeiro = Y[np.arange(n_series), inicio]
+    ultimo = Y[:, -1]
+    inclinacao = np.where(n > 1, (ultimo - primeiro) / np.maximum(n - 1, 1), 0.0)
+    h = np.arange(1, periodos + 1)
+    previsao = ultimo[:, None] + inclinacao[:, None] * h[None, :]
+
+    t = np.arange(1, T)
+    diferencas = np.where(t[None, :] > inicio[:, None], np.diff(Y, axis=1) - inclinacao[:, None], np.nan)
+    desvio = np.nan_to_num(np.sqrt(np.nanmean(diferencas ** 2, axis=1))) if T > 1 else np.zeros(n_series)
+    fator = np.sqrt(h[None, :] * (1 + h[None, :] / np.maximum(n - 1, 1)[:, None]))
+    return previsao, *_intervalos(previsao, desvio, fator, nivel)
+
+
+def croston(Y, periodos, alfa=0.1, nivel=0.95):
+    """Croston com a correção de Syntetos-Boylan (SBA), para demanda intermitente.
+
+    Tamanho da demanda e intervalo entre demandas são suavizados só nos períodos com venda;
+    a previsão é constante e o intervalo, cortado em zero.
+    """
+    Y, inicio = _preparar(Y)
+    n_series, T = Y.shape
+    tamanho = np.full(n_series, np.nan)
+    intervalo = np.full(n_series, np.nan)
+    desde_ultima = np.ones(n_series)
+    sse = np.zeros(n_series)
+    contagem = np.zeros(n_series)
+    for t in range(T):
+        ativo = t >= inicio
+        y = Y[:, t]
+        anterior = (1 - alfa / 2) * tamanho / intervalo
+        avaliado = ativo & ~np.isnan(anterior)
+        sse += np.where(avaliado, (y - np.nan_to_num(anterior)) ** 2, 0.0)
+        contagem += avaliado
+        demanda = ativo & (y != 0)
+        primeira = demanda & np.isnan(tamanho)
+        tamanho = np.where(primeira, y, np.where(demanda, tamanho + alfa * (y - tamanho), tamanho))
+        intervalo = np.where(primeira, desde_ultima,
+                             np.where(demanda, intervalo + alfa * (desde_ultima - intervalo), intervalo))
+        desde_ultima = np.where(demanda, 1, np.where(ativo, desde_ultima + 1, desde_ultima))
+    taxa = np.nan_to_num((1 - alfa / 2) * tamanho / intervalo)
+    previsao = np.repeat(taxa[:, None], periodos, axis=1)
+    desvio = np.sqrt(sse / np.maximum(contagem, 1))
+    inferior, superior = _intervalos(previsao, desvio, np.ones(periodos), nivel)
+    return previsao, np.maximum(inferior, 0.0), superior
+
+
+def holt_winters(Y, periodos, sazonalidade=12, nivel=0.95, grade=GRADE_HOLT_WINTERS):
+    """Holt-Winters aditivo (ETS(A,A,A)) com a suavização escolhida por série na ``grade``.
+
+    Todas as séries e todas as combinações da grade avançam juntas, um período por vez,
+    em arrays ``série x combinação``; cada série fica com a combinação de menor erro
+    quadrático um passo à frente. Séries com menos de dois ciclos usam só nível e tendência
+    (Holt). Os intervalos seguem a variância analítica do ETS(A,A,A).
+    """
+    Y, inicio = _preparar(Y)
+    n_series, T = Y.shape
+    m = sazonalidade
+    n = T - inicio
+    sazonal = n >= 2 * m
+    if (n < 2).any():
+        raise ValueError("Holt-Winters precisa de ao menos dois períodos por série.")
+    alfa, beta, gama = (np.array(v)[None, :] for v in zip(*grade))
+    gama = np.where(sazonal[:, None], gama, 0.0)
+
+    # Estado inicial: primeiro ciclo (sazonal) ou dois primeiros valores (Holt)
+    linhas = np.arange(n_series)
+    nivel_ = np.empty(n_series)
+    tendencia = np.empty(n_series)
+    estacao = np.zeros((n_series, m))
+    for i in range(n_series):
+        s = inicio[i]
+        if sazonal[i]:
+            ciclo1, ciclo2 = Y[i, s:s + m], Y[i, s + m:s + 2 * m]
+            tendencia[i] = (ciclo2.mean() - ciclo1.mean()) / m
+            # A reta do primeiro ciclo sai dos índices sazonais; o nível é o do fim do ciclo
+            reta = ciclo1.mean() + (np.arange(m) - (m - 1) / 2) * tendencia[i]
+            nivel_[i] = reta[-1]
+            estacao[i, (s + np.arange(m)) % m] = ciclo1 - reta
+        else:
+            nivel_[i] = Y[i, s]
+            tendencia[i] = Y[i, s + 1] - Y[i, s]
+    comeco = inicio + np.where(sazonal, m, 1)
+
+    n_grade = alfa.shape[1]
+    L = np.repeat(nivel_[:, None], n_grade, axis=1)
+    B = np.repeat(tendencia[:, None], n_grade, axis=1)
+    S = np.repeat(estacao[:, None, :], n_grade, axis=1)
+    sse = np.zeros((n_series, n_grade))
+    for t in range(int(comeco.min()), T):
+        ativo = (t >= comeco)[:, None]
+        y = Y[:, t, None]
+        s_t = S[:, :, t % m]
+        erro = y - (L + B + s_t)
+        novo_L = alfa * (y - s_t) + (1 - alfa) * (L + B)
+        B = np.where(ativo, beta * (novo_L - L) + (1 - beta) * B, B)
+        S[:, :, t % m] = np.where(ativo, gama * (y - novo_L) + (1 - gama) * s_t, s_t)
+        L = np.where(ativo, novo_L, L)
+        sse += np.where(ativo, erro ** 2, 0.0)
+
+    melhor = sse.argmin(axis=1)
+    L, B, S = L[linhas, melhor], B[linhas, melhor], S[linhas, melhor]
+    a, b, g = alfa[0, melhor], beta[0, melhor], gama[linhas, melhor]
+    h = np.arange(1, periodos + 1)
+    previsao = L[:, None] + B[:, None] * h[None, :] + S[:, (T - 1 + h) % m]
+
+    desvio = np.sqrt(sse[linhas, melhor] / np.maximum(T - comeco, 1))
+    j = np.arange(1, periodos)
+    c = a[:, None] * (1 + j[None, :] * b[:, None]) + g[:, None] * (j[None, :] % m == 0)
+    fator = np.sqrt(1 + np.concatenate([np.zeros((n_series, 1)), np.cumsum(c ** 2, axis=1)], axis=1))
+    return previsao, *_intervalos(previsao, desvio, fator, nivel)
+
+
+def prever(Y, modelo, periodos, sazonalidade=12, nivel=0.95):
+    """Previsão de uma série (1-D) ou de várias (série x período) com um dos ``MODELOS``.
+
+    Retorna ``(previsao, inferior, superior)`` com o mesmo número de dimensões de ``Y``.
+    """
+    if modelo not in MODELOS:
+        raise ValueError(f"Modelo desconhecido: {modelo}")
+    unica = np.ndim(Y) == 1
+    if modelo == 'drift':
+        resultado = drift(Y, periodos, nivel=nivel)
+    elif modelo == 'naive_sazonal':
+        resultado = naive_sazonal(Y, periodos, sazonalidade=sazonalidade, nivel=nivel)
+    elif modelo == 'croston':
+        resultado = croston(Y, periodos, nivel=nivel)
+    else:
+        resultado = holt_winters(Y, periodos, sazonalidade=sazonalidade, nivel=nivel)
+    return tuple(r[0] for r in resultado) if unica else resultado
@@ -0,0 +1,13 @@
+import multiprocessing
+
+
+def contexto_pool_interno():
+    """Contexto dos pools criados dentro de um job (ajustes por produto, backtesting, seleção).
+
+    O processo do job nasce do forkserver e herdaria esse método; com fork, onde houver, os
+    filhos já recebem o Prophet e o pandas importados. O job roda em uma única thread, então
+    o fork não copia travas seguradas por outras threads. Nos demais sistemas, usa o padrão.
+    """
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return None
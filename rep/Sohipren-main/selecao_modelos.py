@@ -0,0 +1,158 @@
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import modelos_estatisticos
+from processos import contexto_pool_interno
+
+
+# Motores do mais barato ao mais caro; entre erros equivalentes, fica o primeiro
+CUSTO = ('naive_sazonal', 'drift', 'croston', 'holt_winters', 'prophet')
+
+# Motores avaliados para cada perfil de série
+CANDIDATOS = {
+    'intermitente': ('naive_sazonal', 'croston'),
+    'curta': ('naive_sazonal', 'drift', 'holt_winters'),
+    'sazonal': ('naive_sazonal', 'holt_winters', 'prophet'),
+    'tendencia': ('drift', 'holt_winters', 'prophet'),
+    'regular': ('naive_sazonal', 'drift', 'holt_winters', 'prophet'),
+}
+
+# Mesma configuração usada nas previsões por produto (comparação e lote)
+PARAMETROS_PROPHET = {'seasonality_mode': 'multiplicative'}
+
+
+def classificar_serie(valores, sazonalidade=12):
+    """Perfil da série: 'intermitente', 'curta', 'sazonal', 'tendencia' ou 'regular'.
+
+    Intermitente pelo intervalo médio entre vendas (ADI > 1,32, critério de Syntetos-Boylan);
+    curta com menos de dois ciclos; sazonal pela autocorrelação no atraso de um ciclo, depois
+    de remover a reta; tendência pela correlação com o tempo.
+    """
+    valores = np.asarray(valores, dtype='float64')
+    n = len(valores)
+    com_venda = np.count_nonzero(valores)
+    if com_venda == 0 or n / com_venda > 1.32:
+        return 'intermitente'
+    if n < 2 * sazonalidade:
+        return 'curta'
+    t = np.arange(n)
+    residuo = valores - np.polyval(np.polyfit(t, valores, 1), t)
+    if residuo.std() > 0 and np.corrcoef(residuo[sazonalidade:], residuo[:-sazonalidade])[0, 1] > 0.3:
+        return 'sazonal'
+    if valores.std() > 0 and abs(np.corrcoef(t, valores)[0, 1]) > 0.6:
+        return 'tendencia'
+    return 'regular'
+
+
+def _avaliar_prophet(nome, datas, valores, corte, cache_modelos):
+    """Ajusta o Prophet até o corte e prevê o holdout (roda no pool); retorna o tempo gasto."""
+    from prophet import Prophet
+    inicio = time.perf_counter()
+    df_treino = pd.DataFrame({'ds': datas[:corte], 'y': valores[:corte]})
+    if cache_modelos is None: modelo = Prophet(**PARAMETROS_PROPHET).fit(df_treino)
+    else: modelo = cache_modelos.ajustar(df_treino, PARAMETROS_PROPHET)
+    modelo.uncertainty_samples = 0
+    previsao = modelo.predict(pd.DataFrame({'ds': datas[corte:]}))['yhat'].to_numpy(dtype='float64')
+    return nome, previsao, time.perf_counter() - inicio
+
+
+def _rmse(previsao, real):
+    return float(np.sqrt(np.mean((np.asarray(previsao) - np.asarray(real)) ** 2)))
+
+
+def assinatura_serie(serie):
+    """Impressão digital da série agregada (datas e valores): muda sempre que os dados mudam."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.ascontiguousarray(serie.index.to_numpy(dtype='datetime64[ns]')).view('int64').tobytes())
+    h.update(np.ascontiguousarray(serie.to_numpy(dtype='float64')).tobytes())
+    return h.hexdigest()
+
+
+def escolher(erros, candidatos, tolerancia):
+    """Motor mais barato com erro até ``tolerancia`` (fração) acima do melhor."""
+    melhor = min(erros.values())
+    for modelo in sorted(candidatos, key=CUSTO.index):
+        if modelo in erros and erros[modelo] <= melhor * (1 + tolerancia) + 1e-12:
+            return modelo
+
+
+def selecionar_modelos(series, horizonte=6, tolerancia=0.1, sazonalidade=12, max_workers=None,
+                       anteriores=None, cache_modelos=None):
+    """Escolhe o motor de cada série comparando os candidatos do seu perfil em um holdout.
+
+    ``series`` é ``{nome: pd.Series}`` (índice de datas). O holdout são os últimos
+    ``horizonte`` períodos (no máximo um quarto da série); os motores estatísticos avaliam
+    todas as séries de uma vez e os ajustes do Prophet rodam em um pool de processos ao
+    mesmo tempo. ``anteriores`` (``{nome: registro}``) evita reavaliar séries cujos dados
+    (``assinatura_serie``) não mudaram. Retorna
+    ``{nome: {'classe', 'modelo', 'erros', 'tempos', 'n', 'assinatura', 'reaproveitada'}}``,
+    com os erros em RMSE e os tempos em segundos por série.
+    """
+    anteriores = anteriores or {}
+    registros, avaliar = {}, {}
+    for nome, serie in series.items():
+        valores = serie.to_numpy(dtype='float64')
+        classe = classificar_serie(valores, sazonalidade)
+        candidatos = CANDIDATOS[classe]
+        assinatura = assinatura_serie(serie)
+        anterior = anteriores.get(nome)
+        # Só reaproveita a escolha feita sobre exatamente os mesmos dados (outro upload reavalia)
+        if anterior and anterior.get('assinatura') == assinatura and anterior.get('modelo') in candidatos:
+            registros[nome] = dict(anterior, n=len(valores), reaproveitada=True)
+            continue
+        registros[nome] = {'classe': classe, 'modelo': candidatos[0], 'erros': {}, 'tempos': {},
+                           'n': len(valores), 'assinatura': assinatura, 'reaproveitada': False}
+        h = min(horizonte, len(valores) // 4)
+        if h >= 1 and len(valores) - h >= 2:
+            avaliar[nome] = (serie.index.to_numpy(), valores, len(valores) - h)
+
+    futures = []
+    pares_prophet = [(nome, dados) for nome, dados in avaliar.items() if 'prophet' in CANDIDATOS[registros[nome]['classe']]]
+    executor = ProcessPoolExecutor(max_workers=min(max_workers or os.cpu_count(), len(pares_prophet)),
+                                   mp_context=contexto_pool_interno()) if pares_prophet else None
+    try:
+        if executor is not None:
+            futures = [executor.submit(_avaliar_prophet, nome, datas, valores, corte, cache_modelos)
+                       for nome, (datas, valores, corte) in pares_prophet]
+
+        # Cada motor estatístico avalia todas as suas séries em uma chamada, enquanto o Prophet roda no pool
+        for modelo in modelos_estatisticos.MODELOS:
+            grupo = [nome for nome in avaliar if modelo in CANDIDATOS[registros[nome]['classe']]]
+            if not grupo: continue
+            comprimento = max(avaliar[nome][2] for nome in grupo)
+            h_max = max(len(avaliar[nome][1]) - avaliar[nome][2] for nome in grupo)
+            Y = np.full((len(grupo), comprimento), np.nan)
+            for i, nome in enumerate(grupo):
+                _, valores, corte = avaliar[nome]
+                Y[i, comprimento - corte:] = valores[:corte]
+            inicio = time.perf_counter()
+            previsao, _, _ = modelos_estatisticos.prever(Y, modelo, h_max, sazonalidade=sazonalidade)
+            tempo = (time.perf_counter() - inicio) / len(grupo)
+            for i, nome in enumerate(grupo):
+                _, valores, corte = avaliar[nome]
+                registros[nome]['erros'][modelo] = _rmse(previsao[i, :len(valores) - corte], valores[corte:])
+                registros[nome]['tempos'][modelo] = tempo
+
+        for future in futures:
+            try:
+                nome, previsao, tempo = future.result()
+            except Exception as e:
+                print(f"   AVISO: Prophet falhou na seleção de modelos: {e}")
+                continue
+            _, valores, corte = avaliar[nome]
+            registros[nome]['erros']['prophet'] = _rmse(previsao, valores[corte:])
+            registros[nome]['tempos']['prophet'] = tempo
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    for nome in avaliar:
+        registro = registros[nome]
+        if registro['erros']:
+            registro['modelo'] = escolher(registro['erros'], CANDIDATOS[registro['classe']], tolerancia)
+    return registros
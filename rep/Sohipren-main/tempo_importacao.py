@@ -0,0 +1,38 @@
+import os
+import re
+import subprocess
+import sys
+
+
+_LINHA = re.compile(r'^import time:\s*(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S.*)$')
+
+
+def medir_importacao(modulo='app', diretorio=None, python=None):
+    """Importa ``modulo`` em um interpretador novo com ``-X importtime`` e devolve as medições.
+
+    Retorna uma lista de ``{'modulo', 'proprio', 'acumulado', 'nivel'}`` (tempos em segundos),
+    na ordem em que o Python reporta (filhos antes do pai). Lança ``RuntimeError`` se a
+    importação falhar.
+    """
+    diretorio = diretorio or os.path.dirname(os.path.abspath(__file__))
+    processo = subprocess.run([python or sys.executable, '-X', 'importtime', '-c', f'import {modulo}'],
+                              cwd=diretorio, capture_output=True, text=True)
+    if processo.returncode != 0:
+        raise RuntimeError(f"Falha ao importar '{modulo}':\n{processo.stderr[-2000:]}")
+    medicoes = []
+    for linha in processo.stderr.splitlines():
+        encontrada = _LINHA.match(linha)
+        if encontrada:
+            proprio, acumulado, recuo, nome = encontrada.groups()
+            medicoes.append({'modulo': nome.strip(), 'proprio': int(proprio) / 1e6,
+                             'acumulado': int(acumulado) / 1e6, 'nivel': len(recuo) // 2})
+    return medicoes
+
+
+def resumir(medicoes, modulo, limite=15):
+    """Tempo total de ``modulo`` e os ``limite`` maiores custos (acumulados) entre os demais."""
+    total = next((m['acumulado'] for m in reversed(medicoes) if m['modulo'] == modulo and m['nivel'] == 0), None)
+    if total is None:
+        total = sum(m['proprio'] for m in medicoes)
+    maiores = sorted((m for m in medicoes if m['modulo'] != modulo), key=lambda m: m['acumulado'], reverse=True)
+    return total, maiores[:limite]
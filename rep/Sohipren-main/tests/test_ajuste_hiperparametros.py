@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+from ajuste_hiperparametros import busca_successive_halving, gerar_candidatos
+
+
+def test_gerar_candidatos():
+    """A grade completa cobre todas as combinações; com limite, sorteia sem repetir"""
+    espaco = {'changepoint_prior_scale': [0.05, 0.5], 'seasonality_mode': ['additive', 'multiplicative']}
+    assert len(gerar_candidatos(espaco)) == 4
+    amostra = gerar_candidatos(n_candidatos=5, semente=1)
+    assert len(amostra) == 5
+    assert len({tuple(sorted(c.items())) for c in amostra}) == 5
+    assert amostra == gerar_candidatos(n_candidatos=5, semente=1)
+
+
+def test_successive_halving():
+    """A cada rodada sobra metade dos candidatos (eta=2) e o número de dobras dobra"""
+    datas = pd.date_range('2021-01-31', periods=24, freq='M')
+    serie = pd.Series(1000 + 30 * np.arange(24) + 150 * np.sin(np.arange(24) * np.pi / 6), index=datas)
+    candidatos = gerar_candidatos({'changepoint_prior_scale': [0.01, 0.5], 'seasonality_mode': ['additive', 'multiplicative']})
+
+    resultado = busca_successive_halving(serie, candidatos, horizonte=2, min_treino=18, eta=2, max_workers=2)
+
+    assert resultado['rodadas'] == [{'dobras': 1, 'candidatos': 4}, {'dobras': 2, 'candidatos': 2}, {'dobras': 4, 'candidatos': 1}]
+    assert resultado['melhor'] in candidatos
+    assert resultado['metricas']['dobras'] == 4
+    assert resultado['ranking'][0]['RMSE'] == resultado['metricas']['RMSE']
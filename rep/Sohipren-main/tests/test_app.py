@@ -1,12 +1,16 @@
 import pytest
 import os
+import shutil
 import json
 import pandas as pd
 from datetime import datetime
+import time
 import io
+import gzip
 
 # Recria o objeto db ANTES de importar o app
 from database import Database
+from traducao import TradutorLocal
 
 test_db = 'test_historico.db'
 if os.path.exists(test_db):
@@ -21,17 +25,40 @@ app_module.db = db  # Garante que o app use o db correto
 def client():
     app.config['TESTING'] = True
     app.config['UPLOAD_FOLDER'] = 'test_uploads'
+    app.config['CACHE_FOLDER'] = 'test_cache'
     app.config['DATABASE'] = test_db
+    app.config['UPLOAD_RESERVA_SEGUNDOS'] = 3600
+    # Tradução automática sem rede; a memória é recriada dentro de test_cache
+    app.config['TRADUCAO_BACKEND'] = TradutorLocal()
+    app_module._memoria_traducao = None
+    # Busca de imagens sem rede: porta fechada, a conexão é recusada na hora
+    app.config['IMAGENS_URL_BUSCA'] = 'http://127.0.0.1:9/buscar'
+    app_module._resolvedor_imagens = None
     os.makedirs('test_uploads', exist_ok=True)
     with app.test_client() as client:
         with app.app_context():
             db.criar_tabelas()
         yield client
-    if os.path.exists(test_db):
-        os.remove(test_db)
+    db.fechar()
+    for arquivo in (test_db, test_db + '-wal', test_db + '-shm'):
+        if os.path.exists(arquivo):
+            os.remove(arquivo)
     for file in os.listdir('test_uploads'):
         os.remove(os.path.join('test_uploads', file))
     os.rmdir('test_uploads')
+    shutil.rmtree('test_cache', ignore_errors=True)
+
+def _aguardar_analise(client, response):
+    """Segue o redirecionamento do /analyze para /analise/<job_id> e espera o job terminar."""
+    assert response.status_code == 302 and '/analise/' in response.headers['Location']
+    job_id = response.headers['Location'].rstrip('/').rsplit('/', 1)[-1]
+    for _ in range(240):
+        job = json.loads(client.get(f'/api/jobs/{job_id}').data)['job']
+        if job['status'] not in ('pendente', 'executando'):
+            break
+        time.sleep(0.5)
+    assert job['status'] == 'concluido', job['erro']
+    return job_id
 
 def test_login_success(client):
     """Testa o login bem-sucedido"""
@@ -51,6 +78,14 @@ def test_login_failure(client):
     }, follow_redirects=True)
     assert b'Usu' in response.data or b'inv' in response.data
 
+def test_imagem_produto_exige_login(client):
+    """A busca de imagens não fica aberta para quem não está logado"""
+    response = client.get('/api/imagem_produto?produto=Produto A')
+    assert response.status_code == 302
+    client.post('/login', data={'username': 'admin', 'password': '123'})
+    response = client.get('/api/imagem_produto?produto=Produto A')
+    assert response.status_code == 200 and json.loads(response.data)['success']
+
 def test_analyze_file_upload(client):
     """Testa o upload e análise de arquivo"""
     client.post('/login', data={
@@ -84,8 +119,9 @@ def test_analyze_file_upload(client):
         },
         content_type='multipart/form-data'
     )
-    assert response.status_code == 200
-    # Verifica se a página de resultados foi renderizada
+    # A análise vai para a fila e o navegador segue para a página de resultados do job
+    job_id = _aguardar_analise(client, response)
+    response = client.get(f'/analise/{job_id}')
     assert b'Resultados' in response.data or b'resultados' in response.data
 
 def test_compare_products(client):
@@ -140,4 +176,467 @@ def test_delete_previsao(client):
     data = json.loads(response.data)
     assert data['success'] is True
     previsao = db.obter_previsao_por_id(previsao_id)
-    assert previsao is None 
\ No newline at end of file
+    assert previsao is None
+
+
+def test_historico_paginado(client):
+    """O histórico é percorrido por cursor, com filtros no servidor e resposta compacta"""
+    client.post('/login', data={'username': 'admin', 'password': '123'})
+    for i in range(5):
+        db.salvar_previsao(
+            nome_arquivo=f'arquivo_{i}.xlsx', periodo_forecast=6 + i, test_ratio=0.2,
+            prophet_changepoint_prior_scale=0.1 * (i + 1), prophet_seasonality_prior_scale=10.0,
+            coluna_data='EMISSÃO', coluna_valor='VALOR TOTAL', coluna_produto='DESCRIÇÃO MATERIAL',
+            coluna_cliente='RAZÃO SOCIAL CLIENTE', arquivo_id=f'arq_{i % 2}',
+            metricas={'MAE': 1.0 * i, 'RMSE': 2.0 * i, 'R²': 0.5})
+
+    ids = []
+    url = '/api/historico/previsoes?limite=2'
+    while url:
+        dados = json.loads(client.get(url).data)
+        assert dados['success'] is True and len(dados['linhas']) <= 2
+        ids += [linha[dados['colunas'].index('id')] for linha in dados['linhas']]
+        url = f"/api/historico/previsoes?limite=2&cursor={dados['proximo']}" if dados['proximo'] else None
+    assert ids == sorted(ids, reverse=True) and len(ids) == 5
+
+    dados = json.loads(client.get('/api/historico/previsoes?arquivo_id=arq_0&changepoint_min=0.25&rmse_max=8').data)
+    assert [dict(zip(dados['colunas'], l))['arquivo'] for l in dados['linhas']] == ['arquivo_4.xlsx', 'arquivo_2.xlsx']
+    assert client.get('/api/historico/previsoes?coluna_inexistente=1').status_code == 400
+    assert client.get('/api/historico/previsoes?cursor=invalido').status_code == 400
+
+def test_upload_deduplicado_e_coleta(client):
+    """Reenvios do mesmo arquivo compartilham o blob, que só é apagado sem referências"""
+    client.post('/login', data={
+        'username': 'admin',
+        'password': '123'
+    })
+    df = pd.DataFrame({
+        'EMISSÃO': pd.date_range(start='2023-01-01', periods=12, freq='M'),
+        'VALOR TOTAL': [1000, 1200, 1100, 1300, 1400, 1500, 1600, 1700, 1800, 1900, 2000, 2100],
+        'DESCRIÇÃO MATERIAL': ['Produto A'] * 12,
+        'RAZÃO SOCIAL CLIENTE': ['Cliente 1'] * 12
+    })
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False)
+    conteudo = buffer.getvalue()
+
+    for _ in range(2):
+        response = client.post('/analyze',
+            data={'file': (io.BytesIO(conteudo), 'test.xlsx'), 'periodos_forecast': '3'},
+            content_type='multipart/form-data'
+        )
+        _aguardar_analise(client, response)
+
+    blobs = [f for f in os.listdir('test_uploads') if f.endswith('.xlsx')]
+    assert len(blobs) == 1
+    previsoes = db.obter_historico_previsoes()
+    assert len(previsoes) == 2
+    assert {p['arquivo_id'] for p in previsoes} == {blobs[0]}
+
+    client.post(f"/api/delete_previsao/{previsoes[0]['id']}")
+    assert os.path.exists(os.path.join('test_uploads', blobs[0]))
+    # Enviado há pouco, o blob continua reservado mesmo sem referências
+    client.post(f"/api/delete_previsao/{previsoes[1]['id']}")
+    assert os.path.exists(os.path.join('test_uploads', blobs[0]))
+    assert not [f for f in os.listdir('test_uploads') if f.startswith('forecast_')]
+    app.config['UPLOAD_RESERVA_SEGUNDOS'] = 0
+    app_module.coletar_uploads_orfaos()
+    assert not os.path.exists(os.path.join('test_uploads', blobs[0]))
+
+def test_upload_com_job_ativo_nao_e_apagado(client):
+    """Apagar a última previsão de um arquivo não apaga o blob usado por um job ainda ativo"""
+    client.post('/login', data={
+        'username': 'admin',
+        'password': '123'
+    })
+    df = pd.DataFrame({
+        'EMISSÃO': pd.date_range(start='2023-01-01', periods=12, freq='M'),
+        'VALOR TOTAL': [1000, 1200, 1100, 1300, 1400, 1500, 1600, 1700, 1800, 1900, 2000, 2100],
+        'DESCRIÇÃO MATERIAL': ['Produto A'] * 12,
+        'RAZÃO SOCIAL CLIENTE': ['Cliente 1'] * 12
+    })
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False)
+    response = client.post('/analyze',
+        data={'file': (io.BytesIO(buffer.getvalue()), 'test.xlsx'), 'periodos_forecast': '3'},
+        content_type='multipart/form-data'
+    )
+    _aguardar_analise(client, response)
+    previsao = db.obter_historico_previsoes()[0]
+    app.config['UPLOAD_RESERVA_SEGUNDOS'] = 0
+    # Outra análise do mesmo conteúdo, ainda na fila
+    db.criar_job('job-pendente', 'analise', {'file_id': previsao['arquivo_id']}, os.getpid())
+    client.post(f"/api/delete_previsao/{previsao['id']}")
+    app_module.coletar_uploads_orfaos()
+    assert os.path.exists(os.path.join('test_uploads', previsao['arquivo_id']))
+    db.cancelar_job('job-pendente')
+    app_module.coletar_uploads_orfaos()
+    assert not os.path.exists(os.path.join('test_uploads', previsao['arquivo_id']))
+
+def test_upload_sem_previsao_e_coletado(client):
+    """O upload de uma análise que não gerou previsão é apagado ao fim do job, vencida a reserva"""
+    client.post('/login', data={
+        'username': 'admin',
+        'password': '123'
+    })
+    # A fila já subiu; sem reserva, só o job ativo segura o upload
+    app_module.obter_fila_jobs()
+    app.config['UPLOAD_RESERVA_SEGUNDOS'] = 0
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        pd.DataFrame({'OUTRA COLUNA': [1, 2, 3]}).to_excel(writer, index=False)
+    response = client.post('/analyze',
+        data={'file': (io.BytesIO(buffer.getvalue()), 'invalido.xlsx'), 'periodos_forecast': '3'},
+        content_type='multipart/form-data'
+    )
+    job_id = response.headers['Location'].rstrip('/').rsplit('/', 1)[-1]
+    for _ in range(100):
+        job = json.loads(client.get(f'/api/jobs/{job_id}').data)['job']
+        blobs = [f for f in os.listdir('test_uploads') if f.endswith('.xlsx')]
+        if job['status'] not in ('pendente', 'executando') and not blobs:
+            break
+        time.sleep(0.1)
+    assert job['status'] == 'concluido'
+    assert db.obter_historico_previsoes() == []
+    assert blobs == []
+
+def test_analise_assincrona(client):
+    """A análise enviada para a fila responde na hora e o resultado fica disponível depois"""
+    client.post('/login', data={
+        'username': 'admin',
+        'password': '123'
+    })
+    df = pd.DataFrame({
+        'EMISSÃO': pd.date_range(start='2023-01-01', periods=12, freq='M'),
+        'VALOR TOTAL': [1000, 1200, 1100, 1300, 1400, 1500, 1600, 1700, 1800, 1900, 2000, 2100],
+        'DESCRIÇÃO MATERIAL': ['Produto A'] * 12,
+        'RAZÃO SOCIAL CLIENTE': ['Cliente 1'] * 12
+    })
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False)
+    buffer.seek(0)
+
+    response = client.post('/api/analises',
+        data={'file': (buffer, 'test.xlsx'), 'periodos_forecast': '3'},
+        content_type='multipart/form-data'
+    )
+    assert response.status_code == 202
+    data = json.loads(response.data)
+    assert data['success'] is True
+
+    status = None
+    for _ in range(120):
+        status = json.loads(client.get(data['status_url']).data)['job']['status']
+        if status in ('concluido', 'erro'):
+            break
+        time.sleep(0.5)
+    assert status == 'concluido'
+
+    response = client.get(data['resultado_url'])
+    assert response.status_code == 200
+    assert b'Resultados' in response.data
+
+def test_progresso_e_secoes_da_analise(client):
+    """O status do job traz as etapas da análise com os tempos; a página de resultados carrega por seção"""
+    client.post('/login', data={'username': 'admin', 'password': '123'})
+    df = pd.DataFrame({
+        'EMISSÃO': pd.date_range(start='2023-01-01', periods=24, freq='M'),
+        'VALOR TOTAL': range(1000, 3400, 100),
+        'DESCRIÇÃO MATERIAL': ['Produto A'] * 24,
+        'RAZÃO SOCIAL CLIENTE': ['Cliente 1'] * 24
+    })
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False)
+    buffer.seek(0)
+    data = json.loads(client.post('/api/analises', data={
+        'file': (buffer, 'sse.xlsx'), 'periodos_forecast': '3', 'modelo_tipo': 'drift'
+    }, content_type='multipart/form-data').data)
+
+    for _ in range(240):
+        job = json.loads(client.get(data['status_url']).data)['job']
+        if job['status'] not in ('pendente', 'executando'):
+            break
+        time.sleep(0.5)
+    assert job['status'] == 'concluido'
+    # A consulta de status não traz (nem lê) o resultado grande da análise
+    assert job['resultado'] is None
+    etapas = [evento['etapa'] for evento in job['progresso']]
+    assert etapas == ['carregado', 'kpis', 'agregado', 'validacao', 'previsao_futura', 'renderizacao']
+    decorridos = [evento['decorrido'] for evento in job['progresso']]
+    assert decorridos == sorted(decorridos)
+    assert client.post(data['cancelar_url']).status_code == 409
+
+    # Página de resultados em seções: o esqueleto e um JSON por seção
+    assert client.get(data['resultado_url']).status_code == 200
+    kpis = json.loads(client.get(f"/api/analise/{data['job_id']}/kpis").data)
+    assert kpis['pronto'] and kpis['kpis_gerais']
+    tabela = json.loads(client.get(f"/api/analise/{data['job_id']}/tabela").data)
+    assert tabela['forecast_id'] and len(tabela['previsao_futura']['index']) == 3
+    produtos = json.loads(client.get(f"/api/analise/{data['job_id']}/produtos").data)
+    assert produtos['top_produtos_list'] == ['Produto A']
+    assert client.get(f"/api/analise/{data['job_id']}/inexistente").status_code == 404
+
+def test_previsao_em_lote(client):
+    """A previsão em lote gera uma tabela consolidada disponível nas rotas de download"""
+    client.post('/login', data={
+        'username': 'admin',
+        'password': '123'
+    })
+    df = pd.DataFrame({
+        'EMISSÃO': list(pd.date_range(start='2023-01-01', periods=12, freq='M')) * 2 + [pd.Timestamp('2023-05-01')],
+        'VALOR TOTAL': list(range(1000, 2200, 100)) * 2 + [50],
+        'DESCRIÇÃO MATERIAL': ['Produto A'] * 12 + ['Produto B'] * 12 + ['Produto C'],
+        'RAZÃO SOCIAL CLIENTE': ['Cliente 1'] * 25
+    })
+    file_id = 'test_lote.xlsx'
+    with pd.ExcelWriter(os.path.join('test_uploads', file_id), engine='openpyxl') as writer:
+        df.to_excel(writer, index=False)
+
+    response = client.post('/api/prever_produtos', json={'file_id': file_id, 'periodos': 3})
+    assert response.status_code == 202
+    status_url = json.loads(response.data)['status_url']
+    job = None
+    for _ in range(120):
+        job = json.loads(client.get(status_url).data)['job']
+        if job['status'] in ('concluido', 'erro'):
+            break
+        time.sleep(0.5)
+    assert job['status'] == 'concluido'
+    assert job['resultado']['produtos'] == 2
+    assert job['resultado']['ignorados'] == ['Produto C']
+
+    response = client.get(f"/download/csv/{job['resultado']['forecast_id']}")
+    assert response.status_code == 200
+    tabela = pd.read_csv(io.BytesIO(response.data))
+    assert len(tabela) == 6
+    assert set(tabela['Produto']) == {'Produto A', 'Produto B'}
+    response.close()
+
+def _aguardar_job(client, resposta):
+    status_url = json.loads(resposta.data)['status_url']
+    job = None
+    for _ in range(120):
+        job = json.loads(client.get(status_url).data)['job']
+        if job['status'] in ('concluido', 'erro'):
+            break
+        time.sleep(0.5)
+    return job
+
+def test_previsao_em_lote_incremental(client):
+    """Com um arquivo só das linhas novas, apenas os produtos alterados são reajustados"""
+    client.post('/login', data={'username': 'admin', 'password': '123'})
+    datas = list(pd.date_range(start='2023-01-01', periods=12, freq='M'))
+    df = pd.DataFrame({
+        'EMISSÃO': datas * 2,
+        'VALOR TOTAL': list(range(1000, 2200, 100)) * 2,
+        'DESCRIÇÃO MATERIAL': ['Produto A'] * 12 + ['Produto B'] * 12,
+        'RAZÃO SOCIAL CLIENTE': ['Cliente 1'] * 24
+    })
+    delta = pd.DataFrame({'EMISSÃO': [pd.Timestamp('2024-01-15')], 'VALOR TOTAL': [2500],
+                          'DESCRIÇÃO MATERIAL': ['Produto A'], 'RAZÃO SOCIAL CLIENTE': ['Cliente 2']})
+    for nome, tabela in (('base_lote.xlsx', df), ('delta_lote.xlsx', delta)):
+        with pd.ExcelWriter(os.path.join('test_uploads', nome), engine='openpyxl') as writer:
+            tabela.to_excel(writer, index=False)
+
+    base = _aguardar_job(client, client.post('/api/prever_produtos', json={'file_id': 'base_lote.xlsx', 'periodos': 3}))
+    assert base['status'] == 'concluido' and base['resultado']['versao'] == 'base_lote.xlsx'
+    job = _aguardar_job(client, client.post('/api/prever_produtos', json={
+        'file_id': 'delta_lote.xlsx', 'periodos': 3, 'versao_base': base['resultado']['versao'], 'delta': True,
+        'previsao_anterior': base['resultado']['forecast_id']}))
+    assert job['status'] == 'concluido'
+    alteracoes = job['resultado']['alteracoes']
+    assert alteracoes['produtos_alterados'] == ['Produto A'] and alteracoes['reajustados'] == ['Produto A']
+    assert alteracoes['meses_alterados'] == ['2024-01'] and job['resultado']['versao'].startswith('incremental_')
+
+    anterior = pd.read_csv(os.path.join('test_uploads', f"forecast_{base['resultado']['forecast_id']}.csv"))
+    atual = pd.read_csv(os.path.join('test_uploads', f"forecast_{job['resultado']['forecast_id']}.csv"))
+    pd.testing.assert_frame_equal(atual[atual['Produto'] == 'Produto B'].reset_index(drop=True),
+                                  anterior[anterior['Produto'] == 'Produto B'].reset_index(drop=True))
+    assert atual[atual['Produto'] == 'Produto A']['Data'].tolist() == ['2024-02-29', '2024-03-31', '2024-04-30']
+
+def test_backtest_previsao(client):
+    """O backtesting roda na fila, fica salvo junto à previsão e é apagado com ela"""
+    client.post('/login', data={
+        'username': 'admin',
+        'password': '123'
+    })
+    df = pd.DataFrame({
+        'EMISSÃO': pd.date_range(start='2022-01-01', periods=18, freq='M'),
+        'VALOR TOTAL': [1000 + 50 * i for i in range(18)],
+        'DESCRIÇÃO MATERIAL': ['Produto A'] * 18,
+        'RAZÃO SOCIAL CLIENTE': ['Cliente 1'] * 18
+    })
+    file_id = 'test_backtest.xlsx'
+    with pd.ExcelWriter(os.path.join('test_uploads', file_id), engine='openpyxl') as writer:
+        df.to_excel(writer, index=False)
+    previsao_id = db.salvar_previsao(
+        nome_arquivo=file_id, periodo_forecast=12, test_ratio=0.2,
+        prophet_changepoint_prior_scale=0.65, prophet_seasonality_prior_scale=25.0,
+        coluna_data='EMISSÃO', coluna_valor='VALOR TOTAL',
+        coluna_produto='DESCRIÇÃO MATERIAL', coluna_cliente='RAZÃO SOCIAL CLIENTE',
+        arquivo_id=file_id)
+
+    assert client.get(f'/api/previsao/{previsao_id}/backtest').status_code == 404
+    response = client.post(f'/api/previsao/{previsao_id}/backtest', json={'horizonte': 2, 'min_treino': 14})
+    assert response.status_code == 202
+    status_url = json.loads(response.data)['status_url']
+    job = None
+    for _ in range(120):
+        job = json.loads(client.get(status_url).data)['job']
+        if job['status'] in ('concluido', 'erro'):
+            break
+        time.sleep(0.5)
+    assert job['status'] == 'concluido'
+
+    detalhes = json.loads(client.get(f'/api/previsao/{previsao_id}').data)['previsao']
+    resultado = detalhes['backtest']['resultado']
+    assert resultado['dobras'] == 3
+    assert len(resultado['por_horizonte']) == 2
+
+    client.post(f'/api/delete_previsao/{previsao_id}')
+    assert db.obter_backtest(previsao_id) is None
+
+def test_analise_com_ajuste_de_parametros(client):
+    """O modo de ajuste grava a melhor configuração no histórico e o formulário parte dela"""
+    client.post('/login', data={
+        'username': 'admin',
+        'password': '123'
+    })
+    app.config['AJUSTE_MAX_CANDIDATOS'] = 3
+    app.config['AJUSTE_MAX_WORKERS'] = 2
+    df = pd.DataFrame({
+        'EMISSÃO': pd.date_range(start='2022-01-01', periods=18, freq='M'),
+        'VALOR TOTAL': [1000 + 50 * i + (200 if i % 6 == 0 else 0) for i in range(18)],
+        'DESCRIÇÃO MATERIAL': ['Produto A'] * 18,
+        'RAZÃO SOCIAL CLIENTE': ['Cliente 1'] * 18
+    })
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False)
+    buffer.seek(0)
+    try:
+        response = client.post('/analyze', data={
+            'file': (buffer, 'ajuste.xlsx'),
+            'test_ratio': '0.2',
+            'periodos_forecast': '3',
+            'ajustar_hiperparametros': '1'
+        }, content_type='multipart/form-data')
+    finally:
+        app.config['AJUSTE_MAX_CANDIDATOS'] = None
+        app.config['AJUSTE_MAX_WORKERS'] = None
+    _aguardar_analise(client, response)
+
+    melhor = db.obter_melhor_config()
+    assert melhor is not None
+    previsao = db.obter_historico_previsoes(limite=1)[0]
+    assert previsao['changepoint_scale'] == melhor['changepoint_prior_scale']
+    assert previsao['seasonality_scale'] == melhor['seasonality_prior_scale']
+    # O resumo das métricas fica no histórico, sem reabrir o CSV da previsão
+    assert previsao['rmse'] is not None and previsao['mae'] is not None
+
+    formulario = client.get('/analyze').data.decode('utf-8')
+    assert f'id="cp_scale_value">{melhor["changepoint_prior_scale"]}<' in formulario
+
+def test_processos_por_job(monkeypatch):
+    """Sem limite configurado, os pools internos dos jobs dividem os núcleos entre os jobs simultâneos de todos os processos web"""
+    monkeypatch.setattr(app_module.os, 'cpu_count', lambda: 8)
+    monkeypatch.setitem(app.config, 'JOBS_MAX_WORKERS', 3)
+    monkeypatch.setitem(app.config, 'LOTE_MAX_WORKERS', None)
+    monkeypatch.setitem(app.config, 'WEB_WORKERS', 1)
+    assert app_module.processos_por_job('LOTE_MAX_WORKERS') == 2
+    # Cada worker do gunicorn tem a sua fila: os núcleos também são divididos entre eles
+    monkeypatch.setitem(app.config, 'JOBS_MAX_WORKERS', 2)
+    monkeypatch.setitem(app.config, 'WEB_WORKERS', 2)
+    assert app_module.processos_por_job('LOTE_MAX_WORKERS') == 2
+    monkeypatch.setitem(app.config, 'WEB_WORKERS', 1)
+    monkeypatch.setitem(app.config, 'JOBS_MAX_WORKERS', 16)
+    assert app_module.processos_por_job('LOTE_MAX_WORKERS') == 1
+    monkeypatch.setitem(app.config, 'LOTE_MAX_WORKERS', 5)
+    assert app_module.processos_por_job('LOTE_MAX_WORKERS') == 5
+
+def test_traducao_automatica_em_lote(client):
+    """Textos sem tradução saem no original na hora e são resolvidos depois, em uma chamada por idioma"""
+    with app.test_request_context('/'), app_module.force_locale('en'):
+        textos = ['Texto sem tradução 1', 'Texto sem tradução 2']
+        assert [app_module.smart_translate(t) for t in textos] == textos
+        app_module.obter_memoria_traducao().resolver_pendentes()
+        assert app_module.smart_translate(textos[0]) == '[en] Texto sem tradução 1'
+    assert app.config['TRADUCAO_BACKEND'].chamadas == [('en', textos)]
+
+def test_figuras_e_respostas_comprimidas(client):
+    """Figuras ficam no banco por execução e idioma; respostas GET têm ETag, 304 e gzip"""
+    client.post('/login', data={'username': 'admin', 'password': '123'})
+    previsao_id = db.salvar_previsao(
+        nome_arquivo='test.xlsx', periodo_forecast=12, test_ratio=0.2,
+        prophet_changepoint_prior_scale=0.65, prophet_seasonality_prior_scale=25.0,
+        coluna_data='EMISSÃO', coluna_valor='VALOR TOTAL', coluna_produto='DESCRIÇÃO MATERIAL',
+        coluna_cliente='RAZÃO SOCIAL CLIENTE', arquivo_id='test_file.xlsx')
+    assert client.get(f'/api/previsao/{previsao_id}/figuras').status_code == 404
+    spec = {'data': [{'y': {'dtype': 'f4', 'bdata': 'AACAPw=='}}], 'layout': {}, 'template': 'plotly_dark'}
+    db.salvar_figuras('previsao', previsao_id, 'en', {'previsao_futura': spec})
+    dados = json.loads(client.get(f'/api/previsao/{previsao_id}/figuras').data)
+    assert dados['figuras']['previsao_futura'] == spec
+
+    resposta = client.get('/api/figuras/template/plotly_dark', headers={'Accept-Encoding': 'gzip'})
+    assert resposta.headers['Content-Encoding'] == 'gzip' and 'max-age' in resposta.headers['Cache-Control']
+    assert 'layout' in json.loads(gzip.decompress(resposta.data))
+    repetida = client.get('/api/figuras/template/plotly_dark', headers={
+        'Accept-Encoding': 'gzip', 'If-None-Match': resposta.headers['ETag']})
+    assert repetida.status_code == 304 and repetida.data == b''
+
+    # Refazer a comparação usa as figuras guardadas, sem arquivo nem novo ajuste
+    comparacao_id = db.salvar_comparacao('Produto A', 'Produto B', 'inexistente.xlsx', 'EMISSÃO',
+                                         'VALOR TOTAL', 'DESCRIÇÃO MATERIAL', 'RAZÃO SOCIAL CLIENTE')
+    assert client.post(f'/api/refazer_comparacao/{comparacao_id}').status_code == 404
+    db.salvar_figuras('comparacao', comparacao_id, 'pt', {'produto1': spec, 'produto2': spec})
+    dados = json.loads(client.post(f'/api/refazer_comparacao/{comparacao_id}').data)
+    assert dados['success'] is True and dados['plot_json_1'] == spec
+    db.deletar_comparacao(comparacao_id)
+    assert db.obter_figuras('comparacao', comparacao_id, 'pt') == {}
+
+def test_metricas_server_timing_e_perfil(client):
+    """Etapas aparecem no Server-Timing e em /metrics (as dos jobs também); acima do limiar, o perfil da requisição é gravado"""
+    client.post('/login', data={'username': 'admin', 'password': '123'})
+    df = pd.DataFrame({
+        'EMISSÃO': list(pd.date_range(start='2022-01-01', periods=24, freq='M')) * 2,
+        'VALOR TOTAL': [1000 + 50 * i for i in range(24)] + [500 + 20 * i for i in range(24)],
+        'DESCRIÇÃO MATERIAL': ['Produto A'] * 24 + ['Produto B'] * 24,
+        'RAZÃO SOCIAL CLIENTE': ['Cliente 1'] * 48
+    })
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False)
+    buffer.seek(0)
+
+    response = client.post('/analyze', data={'file': (buffer, 'test.xlsx'), 'modelo_tipo': 'holt_winters',
+                                             'periodos_forecast': '3'}, content_type='multipart/form-data')
+    job_id = _aguardar_analise(client, response)
+    file_id = app_module.obter_fila_jobs().obter(job_id)['parametros']['file_id']
+
+    app.config['PERFIL_LIMIAR_SEGUNDOS'] = 0
+    app.config['PERFIL_PASTA'] = os.path.join('test_cache', 'perfis')
+    try:
+        response = client.post('/api/compare_products', json={'product_1': 'Produto A', 'product_2': 'Produto B',
+                                                               'file_id': file_id})
+    finally:
+        app.config['PERFIL_LIMIAR_SEGUNDOS'] = None
+    assert response.status_code == 200
+    etapas = {parte.split(';')[0] for parte in response.headers['Server-Timing'].split(', ')}
+    assert {'carregar_dados', 'selecao_modelos', 'comparacao_produtos', 'total'} <= etapas
+    perfis = os.listdir(os.path.join('test_cache', 'perfis'))
+    assert len(perfis) == 1 and 'compare_products' in perfis[0]
+
+    # As medições do job chegam ao processo web quando ele termina
+    for _ in range(50):
+        metricas = client.get('/metrics')
+        texto = metricas.get_data(as_text=True)
+        if 'sohipren_etapa_segundos_count{etapa="modelo_estatistico"}' in texto:
+            break
+        time.sleep(0.1)
+    assert metricas.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+    assert 'sohipren_etapa_segundos_count{etapa="modelo_estatistico"}' in texto
+    assert 'sohipren_requisicao_segundos_count{metodo="POST",rota="/analyze",status="302"}' in texto
+    assert '# TYPE sohipren_etapa_memoria_pico_bytes gauge' in texto
@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+from backtesting import executar_backtest, gerar_cortes
+
+
+def test_gerar_cortes():
+    """Só entram dobras com o horizonte completo; max_dobras mantém os cortes mais recentes"""
+    assert gerar_cortes(20, horizonte=3, min_treino=12) == list(range(12, 18))
+    assert gerar_cortes(20, horizonte=3, min_treino=12, passo=2) == [12, 14, 16]
+    assert gerar_cortes(20, horizonte=3, min_treino=12, max_dobras=2) == [16, 17]
+    assert gerar_cortes(10, horizonte=3, min_treino=12) == []
+
+
+def test_backtest_por_horizonte():
+    """Cada passo do horizonte recebe uma métrica calculada sobre todas as dobras"""
+    datas = pd.date_range('2021-01-31', periods=24, freq='M')
+    serie = pd.Series(1000 + 20 * np.arange(24) + 100 * np.sin(np.arange(24) * np.pi / 6), index=datas)
+
+    resultado = executar_backtest(serie, {'seasonality_mode': 'additive'}, horizonte=3, min_treino=15, max_workers=2)
+
+    assert resultado['dobras'] == 7
+    assert resultado['cortes'][0] == datas[14].isoformat()
+    assert [linha['horizonte'] for linha in resultado['por_horizonte']] == [1, 2, 3]
+    assert all(linha['n'] == 7 for linha in resultado['por_horizonte'])
+    assert resultado['geral']['n'] == 21
+    assert resultado['geral']['MAE'] >= 0
+    assert executar_backtest(serie.iloc[:10], {}, horizonte=3, min_treino=12) is None
@@ -0,0 +1,58 @@
+import pandas as pd
+
+from benchmarks.executar import orcamentos_de, verificar_orcamentos
+from benchmarks.gerador import COLUNAS, gerar_faturamento, gravar_planilha
+from faturamento_forecast_class import FaturamentoForecast
+
+
+def test_gerador_reprodutivel_e_legivel(tmp_path):
+    """Mesma semente, mesmos dados; o CSV no formato do ERP é lido com o mesmo total"""
+    df = gerar_faturamento(3000, 40, clientes=60, meses=24, semente=7)
+    pd.testing.assert_frame_equal(df, gerar_faturamento(3000, 40, clientes=60, meses=24, semente=7))
+    assert list(df.columns) == list(COLUNAS) and len(df) == 3000
+    assert df['EMISSÃO'].is_monotonic_increasing
+    assert df['EMISSÃO'].min() >= pd.Timestamp('2021-01-01') and df['EMISSÃO'].max() < pd.Timestamp('2023-01-01')
+    vendas = df['DESCRIÇÃO MATERIAL'].value_counts()
+    assert vendas.iloc[0] > 5 * vendas.iloc[len(vendas) // 2]  # cauda longa
+
+    caminho = gravar_planilha(df, str(tmp_path / 'faturamento.csv'))
+    forecast = FaturamentoForecast(caminho, 'EMISSÃO', 'VALOR TOTAL', 'DESCRIÇÃO MATERIAL', 'RAZÃO SOCIAL CLIENTE')
+    lido = forecast.carregar_dados()
+    assert len(lido) == 3000 and abs(lido['VALOR TOTAL'].sum() - df['VALOR TOTAL'].sum()) < 0.01
+
+
+def test_orcamentos():
+    """Passos acima do orçamento são apontados; orçamentos novos levam a margem e um piso de tempo"""
+    resultado = {'cenario': 'pequeno', 'passos': {
+        'carregar_dados': {'segundos': 2.0, 'pico_rss_bytes': 100 * 2 ** 20},
+        'agregar_dados': {'segundos': 0.001, 'pico_rss_bytes': 300 * 2 ** 20}}}
+    orcamentos = {'pequeno': {'carregar_dados': {'segundos': 1.5, 'pico_rss_mb': 200},
+                              'agregar_dados': {'segundos': 0.1, 'pico_rss_mb': 200}}}
+    violacoes = verificar_orcamentos(resultado, orcamentos)
+    assert len(violacoes) == 2
+    assert 'carregar_dados: 2.00 s' in violacoes[0] and 'agregar_dados: 300 MB' in violacoes[1]
+    assert verificar_orcamentos(dict(resultado, cenario='grande'), orcamentos) == []
+
+    novos = orcamentos_de([resultado], margem=1.5, orcamentos={'medio': {}})
+    assert novos['pequeno']['carregar_dados'] == {'segundos': 3.0, 'pico_rss_mb': 150}
+    assert novos['pequeno']['agregar_dados']['segundos'] == 0.1 and 'medio' in novos
+
+
+def test_carga_em_processo():
+    """Usuários simultâneos passam pela mistura de rotas sem erros e o app volta à configuração original"""
+    import app as app_module
+    from benchmarks.carga import ClienteTeste, app_em_processo, executar_carga, joelho, planilhas_de_carga
+
+    db_original, uploads_original = app_module.db, app_module.app.config['UPLOAD_FOLDER']
+    planilhas, produtos = planilhas_de_carga(2, linhas=600, produtos=6, meses=24)
+    with app_em_processo() as app:
+        resumo = executar_carga(lambda: ClienteTeste(app), 3, duracao=None, iteracoes=6, planilhas=planilhas,
+                                produtos=produtos, formulario={'modelo_tipo': 'holt_winters', 'periodos_forecast': '3'})
+    assert app_module.db is db_original and app_module.app.config['UPLOAD_FOLDER'] == uploads_original
+    assert resumo['POST /login']['requisicoes'] == 3 and resumo['POST /api/analises']['requisicoes'] >= 3
+    assert resumo['total']['erros'] == 0 and resumo['total']['p95_ms'] >= resumo['total']['p50_ms']
+
+    def ponto(usuarios, vazao, p95):
+        return {'usuarios': usuarios, 'resumo': {'total': {'vazao': vazao, 'p95_ms': p95}}}
+    assert joelho([ponto(1, 10, 100), ponto(2, 19, 110), ponto(4, 20, 300)]) == 4
+    assert joelho([ponto(1, 10, 100), ponto(2, 19, 110)]) is None
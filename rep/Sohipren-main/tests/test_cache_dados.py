@@ -0,0 +1,117 @@
+import os
+import time
+import pandas as pd
+import numpy as np
+import pytest
+
+from cache_dados import CacheDados
+from faturamento_forecast_class import FaturamentoForecast
+
+
+@pytest.fixture
+def planilha(tmp_path):
+    df = pd.DataFrame({
+        'EMISSÃO': pd.date_range(start='2023-01-01', periods=12, freq='M'),
+        'VALOR TOTAL': [1000, 1200, 'x', 1300, 1400, 1500, 1600, 1700, 1800, 1900, 2000, 2100],
+        'DESCRIÇÃO MATERIAL': ['Produto A'] * 6 + ['Produto B'] * 6,
+        'RAZÃO SOCIAL CLIENTE': ['Cliente 1'] * 12
+    })
+    caminho = tmp_path / 'dados.xlsx'
+    df.to_excel(caminho, index=False)
+    return str(caminho)
+
+
+def _instancia(caminho, cache):
+    return FaturamentoForecast(caminho, 'emissão', 'VALOR TOTAL', 'DESCRIÇÃO MATERIAL', 'RAZÃO SOCIAL CLIENTE',
+                               file_id='dados.xlsx', cache_dados=cache)
+
+
+def test_segunda_carga_usa_cache(planilha, tmp_path, monkeypatch):
+    """A segunda carga deve vir do cache colunar, sem chamar read_excel"""
+    cache = CacheDados(str(tmp_path / 'cache'))
+    df1 = _instancia(planilha, cache).carregar_dados()
+
+    def falhar(*args, **kwargs):
+        raise AssertionError('read_excel não deveria ser chamado')
+    monkeypatch.setattr(pd, 'read_excel', falhar)
+
+    instancia = _instancia(planilha, cache)
+    df2 = instancia.carregar_dados()
+    assert instancia.coluna_data == 'EMISSÃO'
+    assert df2['EMISSÃO'].dtype == 'datetime64[ns]'
+    assert df2['VALOR TOTAL'].tolist() == df1['VALOR TOTAL'].tolist()
+    assert df2['VALOR TOTAL'].iloc[2] == 0
+    assert (df2['DESCRIÇÃO MATERIAL'] == 'Produto B').sum() == 6
+
+
+def test_limpeza_por_tamanho_e_idade(tmp_path):
+    """Entradas antigas ou que excedem o limite de bytes são removidas"""
+    cache = CacheDados(str(tmp_path / 'cache'), max_bytes=10 ** 9, max_idade=60)
+    df = pd.DataFrame({'d': pd.date_range('2023-01-01', periods=100), 'v': np.arange(100.0)})
+    cache.salvar('antiga', df, {'data': 'd', 'valor': 'v'})
+    cache.salvar('recente', df, {'data': 'd', 'valor': 'v'})
+    meta_antiga = os.path.join(cache.diretorio, 'antiga', 'meta.json')
+    os.utime(meta_antiga, (time.time() - 120, time.time() - 120))
+    cache.limpar()
+    assert cache.carregar('antiga') is None
+    assert cache.carregar('recente') is not None
+
+    cache.max_bytes = 1
+    cache.limpar()
+    assert cache.carregar('recente') is None
+
+
+def _mapeado(arr):
+    while arr is not None and not isinstance(arr, np.memmap):
+        arr = arr.base
+    return arr is not None
+
+
+def test_populacao_unica_entre_concorrentes(planilha, tmp_path, monkeypatch):
+    """Cargas simultâneas da mesma planilha decodificam uma vez só e mapeiam a mesma entrada"""
+    from concurrent.futures import ThreadPoolExecutor
+    cache = CacheDados(str(tmp_path / 'cache'))
+    decodificacoes = []
+    original = FaturamentoForecast._decodificar
+
+    def contar(self, chave):
+        decodificacoes.append(chave)
+        time.sleep(0.2)
+        return original(self, chave)
+    monkeypatch.setattr(FaturamentoForecast, '_decodificar', contar)
+
+    with ThreadPoolExecutor(4) as executor:
+        dfs = list(executor.map(lambda _: _instancia(planilha, cache).carregar_dados(), range(4)))
+    assert len(decodificacoes) == 1
+    for df in dfs:
+        assert len(df) == 12
+        # Colunas mapeadas do disco, inclusive os códigos das categorias
+        assert _mapeado(df['VALOR TOTAL'].to_numpy())
+        assert _mapeado(df['DESCRIÇÃO MATERIAL'].array.codes)
+
+
+def test_trava_sem_espera(tmp_path):
+    """Com a trava ocupada por outro, espera=0 retorna sem obtê-la"""
+    cache = CacheDados(str(tmp_path / 'cache'))
+    with cache.trava('chave') as primeira:
+        with cache.trava('chave', espera=0) as segunda:
+            assert primeira and not segunda
+    with cache.trava('chave', espera=0) as obtida:
+        assert obtida
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requer fork')
+def test_trava_nao_fica_com_processo_filho(tmp_path):
+    """Um processo criado por fork enquanto a trava está ocupada não a mantém depois"""
+    cache = CacheDados(str(tmp_path / 'cache'))
+    with cache.trava('chave'):
+        pid = os.fork()
+        if pid == 0:
+            time.sleep(2)
+            os._exit(0)
+    try:
+        # O filho ainda vive (dorme 2 s); a espera curta só cobre o fechamento da cópia dele
+        with cache.trava('chave', espera=1) as obtida:
+            assert obtida
+    finally:
+        os.waitpid(pid, 0)
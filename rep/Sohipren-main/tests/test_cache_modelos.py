@@ -0,0 +1,75 @@
+import os
+import numpy as np
+import pandas as pd
+from prophet import Prophet
+
+from cache_modelos import CacheModelos
+
+
+def _serie(n=24, deslocamento=0.0):
+    return pd.DataFrame({
+        'ds': pd.date_range('2021-01-01', periods=n, freq='MS'),
+        'y': np.linspace(100, 200, n) + deslocamento
+    })
+
+
+def test_acerto_pula_ajuste(tmp_path, monkeypatch):
+    """Com a mesma série e parâmetros, o segundo ajuste vem do cache sem rodar o Stan"""
+    cache = CacheModelos(str(tmp_path / 'modelos'))
+    parametros = {'seasonality_mode': 'additive', 'changepoint_prior_scale': 0.5}
+    modelo = cache.ajustar(_serie(), parametros)
+    previsao = modelo.predict(_serie()[['ds']])
+
+    def falhar(*args, **kwargs):
+        raise AssertionError('fit não deveria ser chamado')
+    monkeypatch.setattr(Prophet, 'fit', falhar)
+
+    modelo_cache = cache.ajustar(_serie(), parametros)
+    previsao_cache = modelo_cache.predict(_serie()[['ds']])
+    np.testing.assert_allclose(previsao['yhat'], previsao_cache['yhat'])
+
+    estatisticas = cache.estatisticas()
+    assert estatisticas['hits'] == 1
+    assert estatisticas['misses'] == 1
+    assert estatisticas['modelos'] == 1
+
+
+def test_chave_depende_de_dados_e_parametros():
+    """Mudar a série ou qualquer parâmetro gera outra chave"""
+    base = CacheModelos.gerar_chave(_serie(), {'changepoint_prior_scale': 0.5})
+    assert base == CacheModelos.gerar_chave(_serie(), {'changepoint_prior_scale': 0.5})
+    assert base != CacheModelos.gerar_chave(_serie(deslocamento=1.0), {'changepoint_prior_scale': 0.5})
+    assert base != CacheModelos.gerar_chave(_serie(), {'changepoint_prior_scale': 0.6})
+
+
+def test_remocao_lru_por_bytes(tmp_path):
+    """Ao exceder o limite de bytes, os modelos usados há mais tempo saem primeiro"""
+    cache = CacheModelos(str(tmp_path / 'modelos'))
+    modelo = Prophet().fit(_serie())
+    cache.salvar('antigo', modelo)
+    os.utime(cache._caminho('antigo'), (1, 1))
+    cache.salvar('recente', modelo)
+    cache.max_bytes = os.path.getsize(cache._caminho('recente'))
+    cache.limpar()
+    assert not os.path.exists(cache._caminho('antigo'))
+    assert os.path.exists(cache._caminho('recente'))
+
+
+def test_warm_start_da_mesma_serie(tmp_path, monkeypatch):
+    """Quando a série ganha meses novos, o ajuste parte dos parâmetros do último modelo dela"""
+    cache = CacheModelos(str(tmp_path / 'modelos'))
+    parametros = {'seasonality_mode': 'additive'}
+    cache.ajustar(_serie(24), parametros, serie='Produto A')
+    inits = []
+    fit_original = Prophet.fit
+
+    def fit(self, df, **kwargs):
+        inits.append(kwargs.get('init'))
+        return fit_original(self, df, **kwargs)
+    monkeypatch.setattr(Prophet, 'fit', fit)
+
+    cache.ajustar(_serie(25), parametros, serie='Produto A')
+    cache.ajustar(_serie(25, deslocamento=1.0), parametros, serie='Produto B')
+    assert inits[0] is not None and set(inits[0]) == {'k', 'm', 'sigma_obs', 'delta', 'beta'}
+    assert inits[1] is None
+    assert cache.estatisticas()['warm_starts'] == 1
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cubo_agregacao import CuboAgregacao
+
+
+@pytest.fixture
+def vendas():
+    rng = np.random.default_rng(42)
+    n = 2000
+    df = pd.DataFrame({
+        'EMISSÃO': pd.Timestamp('2021-01-01') + pd.to_timedelta(rng.integers(0, 900, n), unit='D'),
+        'VALOR TOTAL': rng.random(n) * 1000,
+        'DESCRIÇÃO MATERIAL': rng.choice(['A', 'B', 'C', 'D'], n),
+        'RAZÃO SOCIAL CLIENTE': rng.choice(['X', 'Y', 'Z'], n)
+    })
+    # Produto vendido só em um intervalo curto, para testar o recorte da série
+    df.loc[df['DESCRIÇÃO MATERIAL'] == 'D', 'EMISSÃO'] = pd.Timestamp('2022-03-10')
+    return df
+
+
+def _cubo(df):
+    return CuboAgregacao.construir(df, 'EMISSÃO', 'VALOR TOTAL', 'DESCRIÇÃO MATERIAL', 'RAZÃO SOCIAL CLIENTE')
+
+
+def _resample(df):
+    return df.set_index('EMISSÃO').resample('M')['VALOR TOTAL'].sum()
+
+
+def test_series_iguais_ao_resample(vendas):
+    """Total, produto, cliente e produto x cliente batem com o filtro + resample do pandas"""
+    cubo = _cubo(vendas)
+    pd.testing.assert_series_equal(cubo.serie_total(), _resample(vendas), check_freq=False, check_names=False)
+    for produto in ['A', 'D']:
+        esperado = _resample(vendas[vendas['DESCRIÇÃO MATERIAL'] == produto])
+        pd.testing.assert_series_equal(cubo.serie_produto(produto), esperado, check_freq=False, check_names=False)
+    esperado = _resample(vendas[vendas['RAZÃO SOCIAL CLIENTE'] == 'Y'])
+    pd.testing.assert_series_equal(cubo.serie_cliente('Y'), esperado, check_freq=False, check_names=False)
+    recorte = vendas[(vendas['DESCRIÇÃO MATERIAL'] == 'B') & (vendas['RAZÃO SOCIAL CLIENTE'] == 'Z')]
+    pd.testing.assert_series_equal(cubo.serie_produto_cliente('B', 'Z'), _resample(recorte), check_freq=False, check_names=False)
+    assert cubo.serie_produto('inexistente') is None
+
+
+def test_persistencia(vendas, tmp_path):
+    """O cubo salvo e recarregado devolve as mesmas séries e codificações"""
+    cubo = _cubo(vendas)
+    caminho = str(tmp_path / 'cubo.npz')
+    cubo.salvar(caminho)
+    recarregado = CuboAgregacao.carregar(caminho)
+    assert recarregado.produtos == cubo.produtos
+    assert recarregado.clientes == cubo.clientes
+    pd.testing.assert_series_equal(recarregado.serie_produto_cliente('A', 'X'), cubo.serie_produto_cliente('A', 'X'))
+    pd.testing.assert_frame_equal(recarregado.matriz_produtos(), cubo.matriz_produtos())
+
+
+def test_mesclar_e_diferenca(vendas):
+    """Base + delta dá o mesmo cubo que o arquivo completo; a diferença aponta produtos e meses novos"""
+    corte = pd.Timestamp('2023-02-01')
+    base = _cubo(vendas[vendas['EMISSÃO'] < corte])
+    delta = vendas[vendas['EMISSÃO'] >= corte].copy()
+    delta.loc[delta.index[:5], 'DESCRIÇÃO MATERIAL'] = 'E'
+    completo_df = pd.concat([vendas[vendas['EMISSÃO'] < corte], delta])
+    mesclado, completo = base.mesclar(_cubo(delta)), _cubo(completo_df)
+    pd.testing.assert_frame_equal(mesclado.matriz_produtos().sort_index(), completo.matriz_produtos().sort_index())
+    for produto in completo.produtos:
+        for cliente in completo.clientes:
+            esperado = completo.serie_produto_cliente(produto, cliente)
+            obtido = mesclado.serie_produto_cliente(produto, cliente)
+            assert (obtido is None) == (esperado is None)
+            if esperado is not None:
+                pd.testing.assert_series_equal(obtido, esperado)
+    produtos, meses = mesclado.diferenca(base)
+    assert sorted(produtos) == sorted(set(delta['DESCRIÇÃO MATERIAL']))
+    assert meses.min() == pd.Timestamp('2023-02-28') and meses.max() == completo.periodos[-1]
+
+    alterado = completo_df.copy()
+    alterado.loc[alterado['DESCRIÇÃO MATERIAL'] == 'B', 'VALOR TOTAL'] += 1
+    assert _cubo(alterado).diferenca(completo)[0] == ['B']
+    assert completo.diferenca(completo)[0] == []
@@ -0,0 +1,128 @@
+import os
+import sqlite3
+import threading
+
+import pytest
+
+from database import Database, MIGRACOES
+
+
+def _comparacao(produto1, arquivo_id='arq1'):
+    return dict(produto1=produto1, produto2='B', arquivo_id=arquivo_id, coluna_data='Data',
+                coluna_valor='Valor', coluna_produto='Produto', coluna_cliente='Cliente')
+
+
+def test_wal_e_versao_do_esquema(tmp_path):
+    """O banco abre em WAL, fica na última versão e tem os índices das listagens"""
+    caminho = str(tmp_path / 'historico.db')
+    db = Database(caminho)
+    assert not os.path.exists(caminho)  # o esquema só é conferido no primeiro acesso
+    db.obter_historico_previsoes()
+    conn = sqlite3.connect(caminho)
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == len(MIGRACOES)
+    indices = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    assert {'idx_previsoes_data', 'idx_comparacoes_data', 'idx_previsoes_arquivo'} <= indices
+    conn.close()
+
+
+def test_migracao_de_banco_antigo(tmp_path):
+    """Banco sem versão e sem as colunas novas é migrado e ganha as referências"""
+    caminho = str(tmp_path / 'antigo.db')
+    conn = sqlite3.connect(caminho)
+    conn.execute('CREATE TABLE previsoes (id INTEGER PRIMARY KEY AUTOINCREMENT, data_criacao TIMESTAMP, nome_arquivo TEXT)')
+    conn.execute('CREATE TABLE comparacoes (id INTEGER PRIMARY KEY AUTOINCREMENT, data_criacao TIMESTAMP, produto1 TEXT, produto2 TEXT, arquivo_id TEXT)')
+    conn.execute("INSERT INTO comparacoes (data_criacao, produto1, produto2, arquivo_id) VALUES ('2024-01-01', 'A', 'B', 'arq1')")
+    conn.commit()
+    conn.close()
+
+    db = Database(caminho)
+    assert db.obter_comparacao_por_id(1)['coluna_data'] is None
+    assert db.deletar_comparacao(1) == ([], ['arq1'])
+
+
+def test_em_lote_desfaz_tudo_em_caso_de_erro(tmp_path):
+    """Gravações dentro de em_lote são confirmadas juntas ou descartadas juntas"""
+    db = Database(str(tmp_path / 'historico.db'))
+    ids = db.salvar_comparacoes([_comparacao('A'), _comparacao('C')])
+    assert [db.obter_comparacao_por_id(i)['produto1'] for i in ids] == ['A', 'C']
+
+    with pytest.raises(RuntimeError):
+        with db.em_lote():
+            db.salvar_comparacao(**_comparacao('D'))
+            raise RuntimeError('falha no meio do lote')
+    assert len(db.obter_historico_comparacoes(limite=10)) == 2
+
+
+def test_acesso_concorrente(tmp_path):
+    """Várias threads gravando e lendo ao mesmo tempo pelo pool"""
+    db = Database(str(tmp_path / 'historico.db'))
+    erros = []
+
+    def trabalhar(n):
+        try:
+            for i in range(20):
+                db.salvar_comparacao(**_comparacao(f'P{n}-{i}'))
+                db.obter_historico_comparacoes(limite=5)
+        except Exception as e:
+            erros.append(e)
+
+    threads = [threading.Thread(target=trabalhar, args=(n,)) for n in range(4)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert not erros
+    assert len(db.obter_historico_comparacoes(limite=100)) == 80
+
+
+def test_paginacao_por_chave_com_datas_iguais(tmp_path):
+    """Linhas com a mesma data de criação não se repetem nem somem entre as páginas"""
+    caminho = str(tmp_path / 'historico.db')
+    db = Database(caminho)
+    db.salvar_comparacoes([_comparacao(f'P{i}', arquivo_id=f'arq{i % 2}') for i in range(7)])
+    conn = sqlite3.connect(caminho)
+    conn.execute("UPDATE comparacoes SET data_criacao = '2024-05-01 10:00:00'")
+    conn.commit()
+    conn.close()
+
+    vistos, apos = [], None
+    while True:
+        pagina = db.listar_historico('comparacoes', limite=3, apos=apos)
+        vistos += [linha[0] for linha in pagina['linhas']]
+        apos = pagina['proximo']
+        if not apos:
+            break
+    assert vistos == [7, 6, 5, 4, 3, 2, 1]
+
+    filtrada = db.listar_historico('comparacoes', filtros={'produto': 'B', 'arquivo_id': 'arq1',
+                                                           'data_inicio': '2024-05-01', 'data_fim': '2024-05-01'})
+    assert [linha[0] for linha in filtrada['linhas']] == [6, 4, 2]
+    assert db.listar_historico('comparacoes', filtros={'data_fim': '2024-04-30'})['linhas'] == []
+
+
+def test_selecoes_de_modelos(tmp_path):
+    """Escolhas reaproveitadas não são regravadas; as demais substituem a anterior da série"""
+    db = Database(str(tmp_path / 'historico.db'))
+    registro = {'classe': 'sazonal', 'modelo': 'holt_winters', 'erros': {'holt_winters': 1.5}, 'tempos': {}, 'n': 36,
+                'assinatura': 'abc'}
+    db.salvar_selecoes('arq1', {'V|A': dict(registro, reaproveitada=False), 'V|B': dict(registro, reaproveitada=True)})
+    assert set(db.obter_selecoes()) == {'V|A'}
+    db.salvar_selecoes('arq2', {'V|A': dict(registro, modelo='prophet', reaproveitada=False)})
+    selecoes = db.obter_selecoes(['V|A', 'V|C'])
+    assert selecoes['V|A']['modelo'] == 'prophet' and selecoes['V|A']['erros'] == {'holt_winters': 1.5}
+    assert selecoes['V|A']['assinatura'] == 'abc'
+    assert db.obter_selecoes(arquivo_id='arq1') == {}
+
+
+def test_resultado_parcial_do_job(tmp_path):
+    """O resultado parcial é publicado com o progresso e lido por chave, sem decodificar o restante"""
+    db = Database(str(tmp_path / 'historico.db'))
+    db.criar_job('j1', 'analise', {'file_id': 'a.xlsx'}, pid_servidor=1)
+    db.atualizar_job('j1', status='executando')
+    assert db.obter_campos_resultado_job('j1', ('kpis_gerais',))['campos'] == {}
+    assert db.registrar_progresso_job('j1', {'etapa': 'kpis', 'segundos': 0.01},
+                                      {'kpis_gerais': {'total': 'R$ 10'}, 'ajuste': None, 'top_produtos_list': ['A']}) == 'executando'
+    job = db.obter_campos_resultado_job('j1', ('kpis_gerais', 'ajuste', 'top_produtos_list', 'forecast_id'))
+    assert job['status'] == 'executando' and job['tipo'] == 'analise'
+    assert job['campos'] == {'kpis_gerais': {'total': 'R$ 10'}, 'ajuste': None, 'top_produtos_list': ['A']}
+    assert db.obter_progresso_job('j1')['progresso'] == [{'etapa': 'kpis', 'segundos': 0.01}]
+    assert db.obter_campos_resultado_job('inexistente', ('kpis_gerais',)) is None
@@ -0,0 +1,75 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from faturamento_forecast_class import FaturamentoForecast
+
+
+def _planilha(n_meses=24):
+    datas = pd.date_range('2022-01-01', periods=n_meses, freq='M')
+    df = pd.DataFrame({
+        'EMISSÃO': datas,
+        'VALOR TOTAL': 1000 + 50 * np.arange(n_meses) + 200 * np.sin(np.arange(n_meses) / 2),
+        'DESCRIÇÃO MATERIAL': ['Produto A'] * n_meses,
+        'RAZÃO SOCIAL CLIENTE': ['Cliente 1'] * n_meses
+    })
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False)
+    buffer.seek(0)
+    return buffer
+
+
+def test_previsao_final_usa_serie_completa():
+    """A validação usa só o treino; a previsão final é ajustada na série toda e traz apenas datas futuras"""
+    forecast = FaturamentoForecast(_planilha(), 'EMISSÃO', 'VALOR TOTAL', 'DESCRIÇÃO MATERIAL', 'RAZÃO SOCIAL CLIENTE')
+    results = forecast.executar_pipeline_completo(test_ratio=0.25, periodos_forecast=6, prophet_uncertainty_samples=0)
+
+    assert len(forecast.modelo_validacao.history) == 18
+    assert len(forecast.modelo_prophet.history) == 24
+    assert results['modelo'] is forecast.modelo_prophet
+
+    previsao = results['previsao_futura_df_interno']
+    assert len(previsao) == 6
+    assert previsao.index.min() > forecast.df_agregado.index.max()
+    assert list(previsao.index) == list(pd.date_range('2024-01-31', periods=6, freq='M'))
+    # Sem amostragem, o intervalo colapsa na própria previsão
+    assert (previsao['IC_Inferior'] == previsao['Previsao']).all()
+
+
+def test_modelo_estatistico_sem_prophet(monkeypatch):
+    """Com modelo_tipo estatístico o pipeline não ajusta o Prophet e usa as mesmas métricas"""
+    from prophet import Prophet
+
+    def falhar(*args, **kwargs):
+        raise AssertionError('Prophet não deveria ser ajustado')
+    monkeypatch.setattr(Prophet, 'fit', falhar)
+
+    forecast = FaturamentoForecast(_planilha(36), 'EMISSÃO', 'VALOR TOTAL', 'DESCRIÇÃO MATERIAL', 'RAZÃO SOCIAL CLIENTE')
+    results = forecast.executar_pipeline_completo(test_ratio=0.25, periodos_forecast=6, modelo_tipo='holt_winters')
+    assert results['modelo'] == 'holt_winters'
+    assert set(results['metricas']) == {'MAE', 'RMSE', 'R²'}
+    previsao = results['previsao_futura_df_interno']
+    assert list(previsao.index) == list(pd.date_range('2025-01-31', periods=6, freq='M'))
+    assert (previsao['IC_Inferior'] < previsao['Previsao']).all() and (previsao['Previsao'] < previsao['IC_Superior']).all()
+
+
+def test_comparacao_com_produto_de_um_mes():
+    """Um produto vendido em um único mês entra na comparação com o naive sazonal"""
+    datas = list(pd.date_range('2022-01-01', periods=24, freq='M'))
+    df = pd.DataFrame({
+        'EMISSÃO': datas + [datas[-1]],
+        'VALOR TOTAL': list(1000 + 50 * np.arange(24)) + [300],
+        'DESCRIÇÃO MATERIAL': ['Produto A'] * 24 + ['Produto B'],
+        'RAZÃO SOCIAL CLIENTE': ['Cliente 1'] * 25
+    })
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False)
+    buffer.seek(0)
+    forecast = FaturamentoForecast(buffer, 'EMISSÃO', 'VALOR TOTAL', 'DESCRIÇÃO MATERIAL', 'RAZÃO SOCIAL CLIENTE')
+    assert forecast.carregar_dados() is not None
+    plot_1, plot_2 = forecast.comparar_previsao_produtos('Produto A', 'Produto B', periodos=3)
+    assert plot_1 is not None and plot_2 is not None
+    assert forecast._serie_id('Produto B') not in forecast.selecoes
@@ -0,0 +1,36 @@
+import json
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from figuras import compactar_figura, decodificar_array, template_plotly
+
+
+def _figura():
+    datas = pd.date_range('2023-01-01', periods=500, freq='D')
+    valores = np.linspace(1000, 5000, 500) + np.sin(np.arange(500)) * 37.5
+    fig = go.Figure(go.Scatter(x=datas, y=valores, mode='lines', name='Previsão'))
+    fig.update_layout(title='Teste', template='plotly_dark')
+    return fig, datas, valores
+
+
+def test_compactar_figura_typed_arrays():
+    """x/y viram base64 (datas em ms e eixo de data) e decodificam para os valores originais"""
+    fig, datas, valores = _figura()
+    spec = compactar_figura(fig, template='plotly_dark', config={'displayModeBar': False})
+    trace = spec['data'][0]
+    assert trace['y']['dtype'] == 'f4' and trace['x']['dtype'] == 'f8'
+    np.testing.assert_allclose(decodificar_array(trace['y']), valores, rtol=1e-6)
+    assert (decodificar_array(trace['x']) == datas.asi8 // 10 ** 6).all()
+    assert spec['layout']['xaxis']['type'] == 'date'
+    assert spec['template'] == 'plotly_dark' and 'template' not in spec['layout']
+    assert spec['config'] == {'displayModeBar': False}
+    assert len(json.dumps(spec)) * 3 < len(pio.to_json(fig))
+
+
+def test_template_plotly():
+    """O template é servido à parte; nomes desconhecidos retornam None"""
+    assert 'layout' in template_plotly('plotly_dark')
+    assert template_plotly('inexistente') is None
@@ -0,0 +1,78 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from imagens import ResolvedorImagens
+
+
+class _Buscador(BaseHTTPRequestHandler):
+    """Página de busca falsa: produtos com 'lento' demoram, com 'sem' não têm imagem."""
+    consultas = []
+
+    def do_GET(self):
+        consulta = parse_qs(urlparse(self.path).query)['q'][0]
+        self.consultas.append(consulta)
+        if 'lento' in consulta:
+            time.sleep(1)
+        src = '' if 'sem' in consulta else f'http://img.exemplo/{consulta.split()[-1]}.jpg'
+        corpo = f'<html><body><img src="/logo.png"><img src="{src}"></body></html>'.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def servidor():
+    _Buscador.consultas = []
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), _Buscador)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_port}/buscar'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_cache_de_imagens(servidor, tmp_path):
+    """A segunda busca do mesmo produto vem do cache, inclusive em outra instância"""
+    resolvedor = ResolvedorImagens(str(tmp_path / 'imagens.db'), url_busca=servidor)
+    assert resolvedor.buscar('P1') == 'http://img.exemplo/P1.jpg'
+    assert resolvedor.buscar('P1') == 'http://img.exemplo/P1.jpg'
+    outro = ResolvedorImagens(str(tmp_path / 'imagens.db'), url_busca=servidor)
+    assert outro.buscar('P1') == 'http://img.exemplo/P1.jpg'
+    assert _Buscador.consultas == ['SOHIPREN P1']
+
+
+def test_cache_negativo_e_validade(servidor, tmp_path):
+    """Busca sem imagem também é guardada, mas vale só por ttl_negativo"""
+    resolvedor = ResolvedorImagens(str(tmp_path / 'imagens.db'), url_busca=servidor, ttl_negativo=3600)
+    assert resolvedor.buscar('sem') is None
+    assert resolvedor.buscar('sem') is None
+    assert len(_Buscador.consultas) == 1
+    resolvedor.ttl_negativo = 0
+    assert resolvedor.consultar_cache('sem') == (False, None)
+
+
+def test_timeout_nao_bloqueia(servidor, tmp_path):
+    """Servidor lento estoura o timeout de leitura e o produto fica sem imagem"""
+    resolvedor = ResolvedorImagens(str(tmp_path / 'imagens.db'), url_busca=servidor, timeout=(1, 0.2))
+    inicio = time.time()
+    assert resolvedor.buscar('lento') is None
+    assert time.time() - inicio < 1
+
+
+def test_agendar_e_coletar(servidor, tmp_path):
+    """As buscas rodam em paralelo; coletar sem espera devolve None para as não concluídas"""
+    resolvedor = ResolvedorImagens(str(tmp_path / 'imagens.db'), url_busca=servidor)
+    futures = resolvedor.agendar(['A', 'lento', 'A'])
+    assert list(futures) == ['A', 'lento']
+    assert ResolvedorImagens.coletar(futures)['lento'] is None
+    assert ResolvedorImagens.coletar(futures, espera=5) == {'A': 'http://img.exemplo/A.jpg',
+                                                            'lento': 'http://img.exemplo/lento.jpg'}
@@ -0,0 +1,100 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cache_dados import CacheDados
+from cubo_agregacao import AcumuladorCubo, CuboAgregacao
+from faturamento_forecast_class import FaturamentoForecast
+from ingestao import LeitorPlanilha
+
+
+@pytest.fixture
+def vendas():
+    rng = np.random.default_rng(7)
+    n = 500
+    df = pd.DataFrame({
+        'Emissão': pd.Timestamp('2022-01-01') + pd.to_timedelta(rng.integers(0, 700, n), unit='D'),
+        'VALOR TOTAL': np.round(rng.random(n) * 1000, 2),
+        'OUTRA COLUNA': ['ignorada'] * n,
+        'DESCRIÇÃO MATERIAL': rng.choice(['A', 'B', 'C'], n),
+        'RAZÃO SOCIAL CLIENTE': rng.choice(['X', 'Y'], n)
+    })
+    df['VALOR TOTAL'] = df['VALOR TOTAL'].astype(object)
+    df.loc[3, 'VALOR TOTAL'] = 'inválido'
+    df['Emissão'] = df['Emissão'].astype(object)
+    df.loc[5, 'Emissão'] = None
+    return df
+
+
+COLUNAS = {'data': 'EMISSÃO', 'valor': 'valor total', 'produto': 'DESCRIÇÃO MATERIAL', 'cliente': 'RAZÃO SOCIAL CLIENTE'}
+
+
+def test_xlsx_em_blocos(vendas, tmp_path):
+    """A leitura em blocos do XLSX tipa as colunas como a leitura completa e descarta linhas sem data"""
+    caminho = str(tmp_path / 'vendas.xlsx')
+    vendas.to_excel(caminho, index=False)
+    leitor = LeitorPlanilha(caminho, COLUNAS, tamanho_bloco=64)
+
+    blocos = list(leitor.blocos())
+
+    assert len(blocos) == 8
+    assert leitor.colunas == {'data': 'Emissão', 'valor': 'VALOR TOTAL', 'produto': 'DESCRIÇÃO MATERIAL', 'cliente': 'RAZÃO SOCIAL CLIENTE'}
+    valores = np.concatenate([b['valor'] for b in blocos])
+    assert len(valores) == 499
+    esperado = pd.to_numeric(vendas['VALOR TOTAL'].drop(index=5), errors='coerce').fillna(0)
+    assert np.allclose(valores, esperado.to_numpy())
+    produtos = np.concatenate([b['produto'] for b in blocos])
+    assert [leitor.categorias['produto'][c] for c in produtos] == vendas['DESCRIÇÃO MATERIAL'].drop(index=5).tolist()
+
+
+def test_csv_com_virgula_decimal(tmp_path):
+    """CSV com ';' usa vírgula decimal e datas no formato dia/mês"""
+    caminho = tmp_path / 'vendas.csv'
+    caminho.write_text('EMISSÃO;VALOR TOTAL;DESCRIÇÃO MATERIAL\n'
+                       '05/02/2023;1.234,50;A\n'
+                       '20/03/2023;10,00;B\n'
+                       'sem data;5,00;B\n', encoding='utf-8')
+    blocos = list(LeitorPlanilha(str(caminho), COLUNAS).blocos())
+    assert blocos[0]['valor'].tolist() == [1234.5, 10.0]
+    assert blocos[0]['data'].tolist() == [pd.Timestamp('2023-02-05').value, pd.Timestamp('2023-03-20').value]
+    assert 'cliente' not in blocos[0]
+
+
+def test_acumulador_igual_ao_cubo(vendas, tmp_path):
+    """O cubo montado bloco a bloco é igual ao construído sobre o DataFrame inteiro"""
+    caminho = str(tmp_path / 'vendas.xlsx')
+    vendas.to_excel(caminho, index=False)
+    leitor = LeitorPlanilha(caminho, COLUNAS, tamanho_bloco=50)
+    acumulador = AcumuladorCubo(limite_compactacao=100)
+    for bloco in leitor.blocos():
+        acumulador.adicionar(bloco)
+    cubo = acumulador.finalizar(leitor.categorias['produto'], leitor.categorias['cliente'], dict(leitor.colunas))
+
+    df = vendas.drop(index=5).copy()
+    df['Emissão'] = pd.to_datetime(df['Emissão'])
+    df['VALOR TOTAL'] = pd.to_numeric(df['VALOR TOTAL'], errors='coerce').fillna(0)
+    referencia = CuboAgregacao.construir(df, 'Emissão', 'VALOR TOTAL', 'DESCRIÇÃO MATERIAL', 'RAZÃO SOCIAL CLIENTE')
+    pd.testing.assert_series_equal(cubo.serie_total(), referencia.serie_total())
+    pd.testing.assert_series_equal(cubo.serie_produto_cliente('B', 'Y'), referencia.serie_produto_cliente('B', 'Y'))
+    assert cubo.contagem_produto.sum() == 499
+
+
+def test_carga_em_blocos_no_cache_colunar(vendas, tmp_path):
+    """Com cache, os blocos vão direto para o disco e df_raw fica mapeado em memória"""
+    caminho = str(tmp_path / 'vendas.xlsx')
+    vendas.to_excel(caminho, index=False)
+    FaturamentoForecast.TAMANHO_BLOCO_INGESTAO, original = 100, FaturamentoForecast.TAMANHO_BLOCO_INGESTAO
+    try:
+        instancia = FaturamentoForecast(caminho, *COLUNAS.values(), file_id='vendas.xlsx',
+                                        cache_dados=CacheDados(str(tmp_path / 'cache')), pasta_cubos=str(tmp_path))
+        df = instancia.carregar_dados()
+    finally:
+        FaturamentoForecast.TAMANHO_BLOCO_INGESTAO = original
+    assert list(df.columns) == ['Emissão', 'VALOR TOTAL', 'DESCRIÇÃO MATERIAL', 'RAZÃO SOCIAL CLIENTE']
+    assert len(df) == 499
+    assert isinstance(df['Emissão'].to_numpy(), np.ndarray)
+    assert instancia.cubo is not None
+    assert os.path.exists(instancia._caminho_cubo())
+    assert instancia.calcular_kpis_gerais()['produtos_unicos'] == '3'
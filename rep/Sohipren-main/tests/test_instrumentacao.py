@@ -0,0 +1,59 @@
+import threading
+import time
+import tracemalloc
+
+from instrumentacao import AmostradorPerfil, Registro, etapa, gravar_perfil
+
+
+def test_registro_exporta_e_incorpora():
+    """Histograma cumulativo no formato do Prometheus; medições drenadas de outro processo são somadas"""
+    filho = Registro(limites=(0.1, 1))
+    filho.observar('sohipren_etapa_segundos', {'etapa': 'ajuste_prophet'}, 0.5)
+    filho.registrar_pico('sohipren_etapa_memoria_pico_bytes', {'etapa': 'ajuste_prophet'}, 2048)
+    web = Registro(limites=(0.1, 1))
+    web.observar('sohipren_etapa_segundos', {'etapa': 'ajuste_prophet'}, 0.05)
+    web.incorporar(filho.drenar())
+    assert 'sohipren_etapa_segundos' not in filho.exportar()
+
+    texto = web.exportar()
+    assert 'sohipren_etapa_segundos_bucket{etapa="ajuste_prophet",le="0.1"} 1' in texto
+    assert 'sohipren_etapa_segundos_bucket{etapa="ajuste_prophet",le="1"} 2' in texto
+    assert 'sohipren_etapa_segundos_count{etapa="ajuste_prophet"} 2' in texto
+    assert 'sohipren_etapa_memoria_pico_bytes{etapa="ajuste_prophet"} 2048' in texto
+
+
+def test_pico_de_memoria_de_etapas_aninhadas():
+    """Com tracemalloc, a etapa interna mede só o próprio pico e a externa inclui o da interna"""
+    registro = Registro()
+    tracemalloc.start()
+    try:
+        with etapa('externa', registro):
+            with etapa('interna', registro):
+                bloco = bytearray(20 * 1024 * 1024)
+                del bloco
+            pequeno = bytearray(1024)
+    finally:
+        tracemalloc.stop()
+    picos = {dict(rotulos)['etapa']: valor for (_, rotulos), valor in registro._picos.items()}
+    assert picos['interna'] >= 20 * 1024 * 1024 and picos['externa'] >= picos['interna']
+    del pequeno
+
+
+def test_amostrador_perfil(tmp_path):
+    """As pilhas da thread acompanhada são contadas e gravadas no formato collapsed"""
+    def ocupada_ate(fim):
+        while time.perf_counter() < fim:
+            pass
+
+    amostrador = AmostradorPerfil(intervalo=0.001)
+    amostrador.acompanhar()
+    ocupada_ate(time.perf_counter() + 0.2)
+    pilhas = amostrador.liberar()
+    assert sum(pilhas.values()) > 10
+    assert any(pilha.endswith('test_instrumentacao.py:ocupada_ate') for pilha in pilhas)
+
+    caminho = gravar_perfil(pilhas, str(tmp_path), 'POST_/analyze')
+    linha = open(caminho, encoding='utf-8').readline()
+    assert caminho.endswith('_POST_analyze.txt') and linha.rsplit(' ', 1)[1].strip().isdigit()
+    time.sleep(0.05)
+    assert not any(t.name == 'amostrador-perfil' for t in threading.enumerate())
@@ -0,0 +1,170 @@
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+
+from database import Database
+from jobs import FilaJobs, FilaCheiaError, gravar_ao_concluir, relatar_progresso
+
+
+def tarefa_soma(parametros):
+    return {'soma': parametros['a'] + parametros['b']}
+
+
+@pytest.fixture
+def banco(tmp_path):
+    return Database(str(tmp_path / 'jobs.db'))
+
+
+def _aguardar(fila, job_id):
+    for _ in range(100):
+        job = fila.obter(job_id)
+        if job['status'] in ('concluido', 'erro'):
+            return job
+        time.sleep(0.1)
+    return fila.obter(job_id)
+
+
+def test_submeter_e_obter_resultado(banco):
+    """O job é executado em outro processo e o resultado fica no banco"""
+    fila = FilaJobs(banco, max_workers=1)
+    fila.registrar('soma', tarefa_soma)
+    job_id = fila.submeter('soma', {'a': 2, 'b': 3})
+    job = _aguardar(fila, job_id)
+    fila.encerrar()
+    assert job['status'] == 'concluido'
+    assert job['resultado'] == {'soma': 5}
+
+
+def tarefa_etapas(parametros):
+    for i in range(parametros['etapas']):
+        relatar_progresso(f'etapa_{i}', segundos=0.05)
+        time.sleep(0.05)
+    return {'etapas': parametros['etapas']}
+
+
+def test_cancelar_job_em_execucao(banco):
+    """O job cancelado para na etapa seguinte e o processo fica livre para o próximo"""
+    fila = FilaJobs(banco, max_workers=1)
+    fila.registrar('etapas', tarefa_etapas)
+    fila.registrar('soma', tarefa_soma)
+    job_id = fila.submeter('etapas', {'etapas': 200})
+    for _ in range(100):
+        if fila.obter(job_id)['progresso']:
+            break
+        time.sleep(0.1)
+    assert fila.cancelar(job_id)
+    assert banco.contar_jobs_ativos() == 0
+    seguinte = _aguardar(fila, fila.submeter('soma', {'a': 1, 'b': 2}))
+    fila.encerrar()
+    job = fila.obter(job_id)
+    assert job['status'] == 'cancelado'
+    assert 0 < len(job['progresso']) < 200
+    assert job['progresso'][0] == {'etapa': 'etapa_0', 'segundos': 0.05}
+    assert seguinte['status'] == 'concluido'
+    assert not fila.cancelar(seguinte['id'])
+
+
+def tarefa_sem_etapas(parametros):
+    # Termina sem relatar progresso: o cancelamento só é percebido ao gravar a conclusão
+    gravar_ao_concluir(lambda: open(parametros['gravado'], 'w').close())
+    while not os.path.exists(parametros['liberar']):
+        time.sleep(0.02)
+    return {'ok': True}
+
+
+def test_cancelamento_prevalece_sobre_a_conclusao(banco, tmp_path):
+    """Cancelado enquanto rodava, o job continua cancelado ao terminar e não grava o resultado"""
+    fila = FilaJobs(banco, max_workers=1)
+    fila.registrar('sem_etapas', tarefa_sem_etapas)
+    fila.registrar('soma', tarefa_soma)
+    parametros = {'gravado': str(tmp_path / 'gravado'), 'liberar': str(tmp_path / 'liberar')}
+    job_id = fila.submeter('sem_etapas', parametros)
+    for _ in range(100):
+        if fila.obter(job_id)['status'] == 'executando':
+            break
+        time.sleep(0.1)
+    assert fila.cancelar(job_id)
+    open(parametros['liberar'], 'w').close()
+    # Com um único processo, o próximo job só roda depois que o cancelado terminou
+    assert _aguardar(fila, fila.submeter('soma', {'a': 1, 'b': 1}))['status'] == 'concluido'
+    fila.encerrar()
+    job = fila.obter(job_id)
+    assert job['status'] == 'cancelado' and job['resultado'] is None
+    assert not os.path.exists(parametros['gravado'])
+
+
+def _dormir(marcador):
+    open(marcador, 'w').close()
+    time.sleep(60)
+
+
+def tarefa_bloqueada(parametros):
+    # Fica um minuto sem relatar progresso, como um ajuste do Stan ou um pool interno
+    if parametros['modo'] == 'pool':
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            list(executor.map(_dormir, [parametros['marcador']] * 2))
+    else:
+        open(parametros['marcador'], 'w').close()
+        subprocess.run([sys.executable, '-c', 'import time; time.sleep(60)'])
+    return {'ok': True}
+
+
+@pytest.mark.parametrize('modo', ['subprocesso', 'pool'])
+def test_cancelar_interrompe_etapa_longa(banco, tmp_path, modo):
+    """Cancelar interrompe o job no meio de uma etapa longa e libera o processo para o próximo"""
+    fila = FilaJobs(banco, max_workers=1)
+    fila.registrar('bloqueada', tarefa_bloqueada)
+    fila.registrar('soma', tarefa_soma)
+    marcador = str(tmp_path / 'iniciado')
+    job_id = fila.submeter('bloqueada', {'modo': modo, 'marcador': marcador})
+    for _ in range(100):
+        if os.path.exists(marcador):
+            break
+        time.sleep(0.1)
+    assert fila.cancelar(job_id)
+    inicio = time.perf_counter()
+    assert _aguardar(fila, fila.submeter('soma', {'a': 1, 'b': 1}))['status'] == 'concluido'
+    assert time.perf_counter() - inicio < 10
+    fila.encerrar()
+    job = fila.obter(job_id)
+    assert job['status'] == 'cancelado' and job['resultado'] is None
+
+
+def test_limite_de_pendentes(banco):
+    """Novos jobs são recusados quando o limite de pendentes é atingido"""
+    fila = FilaJobs(banco, max_workers=1, max_pendentes=0)
+    fila.registrar('soma', tarefa_soma)
+    with pytest.raises(FilaCheiaError):
+        fila.submeter('soma', {'a': 1, 'b': 1})
+
+
+def test_retoma_jobs_de_processo_encerrado(banco):
+    """Jobs que estavam em execução em um processo que caiu são retomados"""
+    banco.criar_job('interrompido', 'soma', {'a': 1, 'b': 1}, pid_servidor=2 ** 22 + 1)
+    banco.atualizar_job('interrompido', status='executando')
+    fila = FilaJobs(banco, max_workers=1)
+    fila.registrar('soma', tarefa_soma)
+    assert fila.retomar_interrompidos() == ['interrompido']
+    job = _aguardar(fila, 'interrompido')
+    fila.encerrar()
+    assert job['status'] == 'concluido'
+    assert job['tentativas'] == 1
+    assert job['pid_servidor'] == os.getpid()
+
+
+def tarefa_modulos_carregados(parametros):
+    import sys
+    return {modulo: modulo in sys.modules for modulo in parametros['modulos']}
+
+
+def test_precarregar_no_processo(banco):
+    """Os módulos de precarregar já estão importados quando o primeiro job roda; falhas não impedem o job"""
+    fila = FilaJobs(banco, max_workers=1, precarregar=('colorsys', 'modulo_inexistente:funcao'))
+    fila.registrar('modulos', tarefa_modulos_carregados)
+    job = _aguardar(fila, fila.submeter('modulos', {'modulos': ['colorsys']}))
+    fila.encerrar()
+    assert job['status'] == 'concluido'
+    assert job['resultado'] == {'colorsys': True}
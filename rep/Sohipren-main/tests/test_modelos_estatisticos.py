@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from modelos_estatisticos import prever
+
+
+def _sazonal(n, inicio=0, ruido=0.0, semente=0):
+    t = np.arange(inicio, inicio + n)
+    return 500 + 3 * t + 40 * np.sin(2 * np.pi * t / 12) + np.random.default_rng(semente).normal(0, ruido, n)
+
+
+def test_naive_sazonal_e_drift_exatos():
+    """Naive sazonal repete o último ciclo e o drift prolonga a reta entre o primeiro e o último valor"""
+    y = _sazonal(36)
+    previsao, inferior, superior = prever(y, 'naive_sazonal', 14)
+    np.testing.assert_allclose(previsao, np.concatenate([y[-12:], y[-12:-10]]))
+    assert ((superior - inferior)[12:] > (superior - inferior)[:2]).all()
+
+    reta = 10 + 2.5 * np.arange(20)
+    previsao, inferior, superior = prever(reta, 'drift', 3)
+    np.testing.assert_allclose(previsao, 10 + 2.5 * np.arange(20, 23))
+    np.testing.assert_allclose(inferior, previsao)
+
+
+def test_holt_winters_em_lote():
+    """Várias séries (com inícios diferentes) em uma chamada dão o mesmo que uma a uma"""
+    series = [_sazonal(48, ruido=2, semente=1), _sazonal(30, inicio=18, ruido=2, semente=2), _sazonal(8, inicio=40)]
+    Y = np.full((3, 48), np.nan)
+    for i, serie in enumerate(series):
+        Y[i, 48 - len(serie):] = serie
+    previsao, inferior, superior = prever(Y, 'holt_winters', 12)
+    for i, serie in enumerate(series):
+        np.testing.assert_allclose(previsao[i], prever(serie, 'holt_winters', 12)[0])
+    esperado = _sazonal(12, inicio=48)
+    assert np.abs(previsao[0] - esperado).mean() < 10
+    assert ((superior - inferior)[:, -1] >= (superior - inferior)[:, 0]).all()
+    with pytest.raises(ValueError):
+        prever(Y, 'arima', 12)
+
+
+def test_croston_intermitente():
+    """Croston prevê a taxa média (corrigida) de vendas esporádicas, sem limite inferior negativo"""
+    y = np.tile([0, 0, 0, 6], 12).astype(float)
+    previsao, inferior, superior = prever(y, 'croston', 4)
+    np.testing.assert_allclose(previsao, (1 - 0.05) * 6 / 4, rtol=1e-9)
+    assert (inferior >= 0).all() and (superior > previsao).all()
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from selecao_modelos import classificar_serie, escolher, selecionar_modelos
+
+
+def _serie(valores):
+    return pd.Series(valores, index=pd.date_range('2020-01-31', periods=len(valores), freq='M'))
+
+
+def test_classificar_serie():
+    """Perfis: intermitente, curta, sazonal e tendência"""
+    t = np.arange(48)
+    assert classificar_serie(np.tile([0, 0, 5, 0], 12)) == 'intermitente'
+    assert classificar_serie(np.arange(1, 10)) == 'curta'
+    assert classificar_serie(100 + 30 * np.sin(2 * np.pi * t / 12)) == 'sazonal'
+    assert classificar_serie(100 + 5 * t + np.random.default_rng(0).normal(0, 3, 48)) == 'tendencia'
+
+
+def test_escolher_mais_barato_dentro_da_tolerancia():
+    """Fica o motor mais barato cujo erro está até 10% acima do melhor"""
+    candidatos = ('naive_sazonal', 'holt_winters', 'prophet')
+    assert escolher({'naive_sazonal': 10.5, 'holt_winters': 12, 'prophet': 10}, candidatos, 0.1) == 'naive_sazonal'
+    assert escolher({'naive_sazonal': 20, 'holt_winters': 10.8, 'prophet': 10}, candidatos, 0.1) == 'holt_winters'
+    assert escolher({'naive_sazonal': 20, 'holt_winters': 15, 'prophet': 10}, candidatos, 0.1) == 'prophet'
+
+
+def test_selecao_e_reaproveitamento():
+    """Séries estatísticas são avaliadas no holdout e a escolha anterior vale enquanto os dados não mudam"""
+    series = {'esporadico': _serie(np.tile([0.0, 0.0, 6.0, 0.0], 9)), 'curto': _serie(np.arange(1.0, 11.0))}
+    registros = selecionar_modelos(series)
+    assert registros['esporadico']['classe'] == 'intermitente'
+    assert set(registros['esporadico']['erros']) == {'naive_sazonal', 'croston'}
+    assert registros['curto']['modelo'] == 'drift'
+    assert not any(r['reaproveitada'] for r in registros.values())
+
+    anteriores = {'esporadico': dict(registros['esporadico'], modelo='croston')}
+    novos = selecionar_modelos(series, anteriores=anteriores)
+    assert novos['esporadico']['reaproveitada'] and novos['esporadico']['modelo'] == 'croston'
+    assert not novos['curto']['reaproveitada']
+
+    # Mesmo perfil, outros dados (outro upload): a série é reavaliada
+    alteradas = dict(series, esporadico=_serie(np.tile([0.0, 0.0, 7.0, 0.0], 9)))
+    assert not selecionar_modelos(alteradas, anteriores=anteriores)['esporadico']['reaproveitada']
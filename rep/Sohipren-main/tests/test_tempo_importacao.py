@@ -0,0 +1,24 @@
+import os
+import subprocess
+import sys
+
+from tempo_importacao import medir_importacao, resumir
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_app_nao_importa_modulos_pesados():
+    """Importar o app não carrega Prophet, Plotly, scikit-learn, pandas, requests nem bs4"""
+    pesados = ['prophet', 'plotly', 'sklearn', 'pandas', 'requests', 'bs4', 'deep_translator']
+    codigo = f"import sys, app; print([m for m in {pesados!r} if m in sys.modules])"
+    saida = subprocess.run([sys.executable, '-c', codigo], cwd=RAIZ, capture_output=True, text=True, check=True)
+    assert saida.stdout.strip().splitlines()[-1] == '[]'
+
+
+def test_medir_importacao():
+    """As linhas do -X importtime viram medições; o total é o acumulado do módulo pedido"""
+    medicoes = medir_importacao('json', diretorio=RAIZ)
+    total, maiores = resumir(medicoes, 'json', limite=3)
+    assert any(m['modulo'] == 'json.decoder' for m in medicoes)
+    assert 0 < total and len(maiores) <= 3
+    assert all(m['acumulado'] <= total for m in maiores if m['modulo'].startswith('json.'))
@@ -0,0 +1,40 @@
+import time
+
+from traducao import MemoriaTraducao, TradutorLocal
+
+
+def test_memoria_persistente(tmp_path):
+    """As traduções resolvidas ficam no SQLite e valem para uma nova instância"""
+    backend = TradutorLocal({('Previsão', 'en'): 'Forecast'})
+    memoria = MemoriaTraducao(str(tmp_path / 'traducoes.db'), backend=backend, segundo_plano=False)
+    assert memoria.traduzir('Previsão', 'en') == 'Previsão'
+    assert memoria.traduzir('Histórico', 'es') == 'Histórico'
+    memoria.resolver_pendentes()
+    assert sorted(backend.chamadas) == [('en', ['Previsão']), ('es', ['Histórico'])]
+
+    outra = MemoriaTraducao(str(tmp_path / 'traducoes.db'), backend=TradutorLocal(), segundo_plano=False)
+    assert outra.traduzir('Previsão', 'en') == 'Forecast'
+    assert outra.traduzir('Histórico', 'es') == '[es] Histórico'
+    assert outra.resolver_lote(['Previsão', 'Novo'], 'en') == {'Previsão': 'Forecast', 'Novo': '[en] Novo'}
+    assert outra.backend.chamadas == [('en', ['Novo'])]
+
+
+def test_lru_limitado(tmp_path):
+    """O LRU guarda no máximo tamanho_lru entradas; as demais continuam no SQLite"""
+    memoria = MemoriaTraducao(str(tmp_path / 'traducoes.db'), backend=TradutorLocal(), tamanho_lru=2, segundo_plano=False)
+    memoria.resolver_lote(['a', 'b', 'c'], 'en')
+    assert len(memoria._lru) == 2
+    assert memoria.obter('a', 'en') == '[en] a'
+
+
+def test_resolucao_em_segundo_plano(tmp_path):
+    """Com segundo_plano, as pendências são resolvidas sem chamada explícita"""
+    memoria = MemoriaTraducao(str(tmp_path / 'traducoes.db'), backend=TradutorLocal())
+    memoria.traduzir('Data', 'en')
+    memoria.traduzir('Valor', 'en')
+    for _ in range(50):
+        if memoria.obter('Valor', 'en'):
+            break
+        time.sleep(0.1)
+    assert memoria.traduzir('Data', 'en') == '[en] Data'
+    assert memoria.backend.chamadas == [('en', ['Data', 'Valor'])]
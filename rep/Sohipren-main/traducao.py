@@ -0,0 +1,182 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+
+class TradutorGoogle:
+    """Backend padrão: Google Tradutor (deep_translator), com vários textos por requisição.
+
+    Os textos são enviados juntos, separados por quebra de linha, em lotes de até
+    ``max_caracteres``; se a resposta não trouxer uma linha por texto, o lote é
+    traduzido item a item.
+    """
+
+    def __init__(self, max_caracteres=4500):
+        self.max_caracteres = max_caracteres
+
+    def _lotes(self, textos):
+        lote, tamanho = [], 0
+        for texto in textos:
+            if lote and tamanho + len(texto) + 1 > self.max_caracteres:
+                yield lote
+                lote, tamanho = [], 0
+            lote.append(texto)
+            tamanho += len(texto) + 1
+        if lote:
+            yield lote
+
+    def traduzir_lote(self, textos, idioma):
+        from deep_translator import GoogleTranslator
+        tradutor = GoogleTranslator(source='auto', target=idioma)
+        traducoes = {}
+        for lote in self._lotes(textos):
+            linhas = (tradutor.translate('\n'.join(lote)) or '').split('\n')
+            if len(linhas) != len(lote):
+                linhas = [tradutor.translate(texto) for texto in lote]
+            traducoes.update(zip(lote, linhas))
+        return traducoes
+
+
+class TradutorLocal:
+    """Backend sem rede (testes e desenvolvimento): dicionário fixo ou prefixo com o idioma."""
+
+    def __init__(self, dicionario=None):
+        self.dicionario = dicionario or {}
+        self.chamadas = []
+
+    def traduzir_lote(self, textos, idioma):
+        self.chamadas.append((idioma, list(textos)))
+        return {texto: self.dicionario.get((texto, idioma), f'[{idioma}] {texto}') for texto in textos}
+
+
+class MemoriaTraducao:
+    """Memória de traduções em SQLite, chaveada por (texto original, idioma), com LRU em memória.
+
+    ``traduzir`` nunca espera pela rede: devolve a tradução conhecida ou o próprio texto e
+    deixa o texto pendente. As pendências são resolvidas em lote por ``resolver_pendentes``,
+    chamada por uma thread em segundo plano (ou diretamente, nos testes). Depois de uma falha
+    do backend, novas tentativas esperam ``espera_falha`` segundos.
+    """
+
+    def __init__(self, caminho_db, backend=None, tamanho_lru=4096, segundo_plano=True, espera_falha=60):
+        self.caminho_db = caminho_db
+        self.backend = backend or TradutorGoogle()
+        self.tamanho_lru = tamanho_lru
+        self.segundo_plano = segundo_plano
+        self.espera_falha = espera_falha
+        self._lru = OrderedDict()
+        self._pendentes = {}
+        self._lock = threading.Lock()
+        self._evento = threading.Event()
+        self._thread = None
+        self._ultima_falha = 0
+        diretorio = os.path.dirname(caminho_db)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        conn = self._conectar()
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS traducoes (
+            origem TEXT NOT NULL,
+            idioma TEXT NOT NULL,
+            traducao TEXT NOT NULL,
+            data_criacao TIMESTAMP,
+            PRIMARY KEY (origem, idioma)
+        )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def _conectar(self):
+        return sqlite3.connect(self.caminho_db, timeout=10)
+
+    def _guardar_lru(self, chave, traducao):
+        with self._lock:
+            self._lru[chave] = traducao
+            self._lru.move_to_end(chave)
+            while len(self._lru) > self.tamanho_lru:
+                self._lru.popitem(last=False)
+
+    def obter(self, texto, idioma):
+        """Tradução conhecida (LRU, depois SQLite) ou ``None``."""
+        chave = (texto, idioma)
+        with self._lock:
+            if chave in self._lru:
+                self._lru.move_to_end(chave)
+                return self._lru[chave]
+        conn = self._conectar()
+        row = conn.execute('SELECT traducao FROM traducoes WHERE origem = ? AND idioma = ?', chave).fetchone()
+        conn.close()
+        if row is None:
+            return None
+        self._guardar_lru(chave, row[0])
+        return row[0]
+
+    def traduzir(self, texto, idioma):
+        """Tradução imediata: a conhecida ou o texto original (que fica pendente para o lote)."""
+        if not texto:
+            return texto
+        traducao = self.obter(texto, idioma)
+        if traducao is not None:
+            return traducao
+        with self._lock:
+            self._pendentes.setdefault(idioma, set()).add(texto)
+        if self.segundo_plano:
+            self._acordar_thread()
+        return texto
+
+    def salvar(self, traducoes, idioma):
+        if not traducoes:
+            return
+        agora = datetime.now()
+        conn = self._conectar()
+        conn.executemany('INSERT OR REPLACE INTO traducoes (origem, idioma, traducao, data_criacao) VALUES (?, ?, ?, ?)',
+                         [(origem, idioma, traducao, agora) for origem, traducao in traducoes.items()])
+        conn.commit()
+        conn.close()
+        for origem, traducao in traducoes.items():
+            self._guardar_lru((origem, idioma), traducao)
+
+    def resolver_lote(self, textos, idioma):
+        """Traduz de uma vez os textos ainda desconhecidos e retorna ``texto -> tradução`` de todos."""
+        resultado, faltantes = {}, []
+        for texto in dict.fromkeys(textos):
+            traducao = self.obter(texto, idioma)
+            if traducao is None: faltantes.append(texto)
+            else: resultado[texto] = traducao
+        if faltantes:
+            novas = {k: v for k, v in self.backend.traduzir_lote(faltantes, idioma).items() if v}
+            self.salvar(novas, idioma)
+            resultado.update(novas)
+        return resultado
+
+    def resolver_pendentes(self):
+        """Resolve as pendências acumuladas, uma chamada ao backend por idioma."""
+        with self._lock:
+            pendentes, self._pendentes = self._pendentes, {}
+        for idioma, textos in pendentes.items():
+            try:
+                self.resolver_lote(sorted(textos), idioma)
+            except Exception as e:
+                print(f"   AVISO: tradução automática indisponível ({idioma}): {e}")
+                self._ultima_falha = time.time()
+
+    def _acordar_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._executar, name='memoria-traducao', daemon=True)
+                self._thread.start()
+        self._evento.set()
+
+    def _executar(self):
+        while True:
+            self._evento.wait()
+            # Espera um pouco para juntar no mesmo lote os textos de toda a página
+            time.sleep(0.2)
+            self._evento.clear()
+            espera = self._ultima_falha + self.espera_falha - time.time()
+            if espera > 0:
+                time.sleep(espera)
+            self.resolver_pendentes()
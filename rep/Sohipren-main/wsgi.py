@@ -0,0 +1,8 @@
+"""Ponto de entrada do servidor (``flask run``, que encontra este módulo, ou ``gunicorn wsgi:app``).
+
+Importar o app não inicia nada; aqui a fila de jobs sobe uma vez, na subida do processo,
+e retoma os jobs interrompidos pela última queda.
+"""
+from app import app, iniciar_fila_jobs
+
+iniciar_fila_jobs()